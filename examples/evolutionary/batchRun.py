@@ -46,18 +46,6 @@ def batchEvol(networkType):
 	fitnessFuncArgs['pops'] = pops
 	fitnessFuncArgs['maxFitness'] = 1000
 
-	def fitnessFunc(simData, **kwargs):
-		import numpy as np
-		pops = kwargs['pops']
-		maxFitness = kwargs['maxFitness']
-		popFitness = [None for i in pops.items()]
-		popFitness = [min(np.exp(  abs(v['target'] - simData['popRates'][k])  /  v['width']), maxFitness) 
-				if simData["popRates"][k]>v['min'] else maxFitness for k,v in pops.items()]
-		fitness = np.mean(popFitness)
-		popInfo = '; '.join(['%s rate=%.1f fit=%1.f'%(p,r,f) for p,r,f in zip(list(simData['popRates'].keys()), list(simData['popRates'].values()), popFitness)])
-		print('  '+popInfo)
-		return fitness
-		
 	# create Batch object with paramaters to modify, and specifying files to use
 	b = Batch(params=params)
 	
@@ -80,7 +68,7 @@ def batchEvol(networkType):
 	}
 	b.evolCfg = {
 		'evolAlgorithm': 'custom',
-		'fitnessFunc': fitnessFunc, # fitness expression (should read simData)
+		'fitnessFunc': 'fitness.py:fitnessFunc', # fitness expression (should read simData); evaluated by jobs
 		'fitnessFuncArgs': fitnessFuncArgs,
 		'pop_size': 6,
 		'num_elites': 1, # keep this number of parents for next generation if they are fitter than children
@@ -0,0 +1,12 @@
+import numpy as np
+
+# fitness function evaluated by each job with its gathered simData (set in evolCfg as 'fitness.py:fitnessFunc')
+def fitnessFunc(simData, **kwargs):
+	pops = kwargs['pops']
+	maxFitness = kwargs['maxFitness']
+	popFitness = [min(np.exp(  abs(v['target'] - simData['popRates'][k])  /  v['width']), maxFitness) 
+			if simData["popRates"][k]>v['min'] else maxFitness for k,v in pops.items()]
+	fitness = np.mean(popFitness)
+	popInfo = '; '.join(['%s rate=%.1f fit=%1.f'%(p,r,f) for p,r,f in zip(list(simData['popRates'].keys()), list(simData['popRates'].values()), popFitness)])
+	print('  '+popInfo)
+	return fitness
@@ -1093,12 +1093,13 @@ def calculateDisynaptic(includePost = ['allCells'], includePre = ['allCells'], i
         _, cellsPrePreGids, _ = getCellsInclude(includePrePre)
         cellsPost, _, _ = getCellsInclude(includePost)
 
+        cellsByGid = {cell['gid']: cell for cell in sim.net.allCells}  # allCells not indexed by gid if cfg.gatherInclude
         for postCell in cellsPost:
             print(postCell['gid'])
             preGidsAll = [conn[preGidIndex] for conn in postCell['conns'] if isinstance(conn[preGidIndex], Number) and conn[preGidIndex] in cellsPreGids+cellsPrePreGids]
             preGids = [gid for gid in preGidsAll if gid in cellsPreGids]
             for preGid in preGids:
-                preCell = sim.net.allCells[preGid]
+                preCell = cellsByGid[preGid]
                 prePreGids = [conn[preGidIndex] for conn in preCell['conns'] if conn[preGidIndex] in cellsPrePreGids]
                 totCon += 1
                 if not set(prePreGids).isdisjoint(preGidsAll):
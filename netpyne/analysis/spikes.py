@@ -852,7 +852,9 @@ def plotSpikeStats (include = ['allCells', 'eachPop'], statDataIn = {}, timeRang
                         gids = cellGids
                     else:
                         gids = set(spkinds)
-                    ynorms = [sim.net.allCells[int(gid)]['tags']['ynorm'] for gid in gids]
+                    cellsByGid = {cell['gid']: cell for cell in cells}  # allCells not indexed by gid if cfg.gatherInclude
+                    gids = [gid for gid in gids if int(gid) in cellsByGid]
+                    ynorms = [cellsByGid[int(gid)]['tags']['ynorm'] for gid in gids]
 
                     gidsData.insert(0, gids)
                     ynormsData.insert(0, ynorms)
@@ -1293,16 +1295,21 @@ def popAvgRates (trange = None, show = True):
     spkids = sim.allSimData['spkid']
 
     if not trange:
-        trange = [0, sim.cfg.duration]
+        timeRange = getattr(sim.cfg, 'gatherTimeRange', None)  # only spikes in time range gathered
+        trange = [timeRange[0], min(timeRange[1], sim.cfg.duration)] if timeRange else [0, sim.cfg.duration]
     else:
-        spkids,spkts = list(zip(*[(spkid,spkt) for spkid,spkt in zip(spkids,spkts) if trange[0] <= spkt <= trange[1]]))
+        spkids,spkts = list(zip(*[(spkid,spkt) for spkid,spkt in zip(spkids,spkts) if trange[0] <= spkt <= trange[1]])) or ([], [])
+
+    # pop of each gathered cell (allCells is not indexed by gid if only some cells gathered; see cfg.gatherInclude)
+    gidPops = {gid: pop for pop in sim.net.allPops for gid in sim.net.allPops[pop]['cellGids']}
+    spkPops = [gidPops.get(int(spkid)) for spkid in spkids]
 
     avgRates = Dict()
     for pop in sim.net.allPops:
         numCells = float(len(sim.net.allPops[pop]['cellGids']))
         if numCells > 0:
             tsecs = float((trange[1]-trange[0]))/1000.0
-            avgRates[pop] = len([spkid for spkid in spkids if sim.net.allCells[int(spkid)]['tags']['pop']==pop])/numCells/tsecs
+            avgRates[pop] = spkPops.count(pop)/numCells/tsecs
             print('   %s : %.3f Hz'%(pop, avgRates[pop]))
 
     return avgRates
\ No newline at end of file
@@ -24,6 +24,11 @@ except:
 def plotData ():
     from .. import sim
 
+    # data of each node saved without gathering (cfg.saveDistributed); load shards folder to analyze
+    if getattr(sim.cfg, 'saveDistributed', False) and not getattr(sim, 'allSimData', None):
+        if sim.rank == 0: print('\nSkipping analysis since data was not gathered (cfg.saveDistributed)')
+        return
+
     ## Plotting
     if sim.rank == 0 and __gui__:
         sim.timing('start', 'plotTime')
@@ -4,4 +4,5 @@ from __future__ import division
 from __future__ import absolute_import
 from future import standard_library
 standard_library.install_aliases()
-from .batch import Batch
\ No newline at end of file
+from .batch import Batch
+from .utils import mergeBatchResults, loadBatchResults
\ No newline at end of file
@@ -31,7 +31,8 @@ import datetime
 from neuron import h
 from copy import copy
 from netpyne import specs
-from .utils import bashTemplate
+from .utils import bashTemplate, LocalJobQueue, mergeBatchResults, jobKey, modFiles, reuseCachedJob, registerCachedJob, functionRef, \
+    JOB_RESULT_EXTS
 from random import Random
 from time import sleep, time
 from itertools import product
@@ -64,6 +65,163 @@ def runJob(script, cfgSavePath, netParamsSavePath):
     proc = Popen(command.split(' '), stdout=PIPE, stderr=PIPE)
     print(proc.stdout.read().decode())
 
+# -------------------------------------------------------------------------------
+# functions to run jobs in pool of local worker processes (neuron, netpyne and mechanisms imported once per worker)
+# -------------------------------------------------------------------------------
+def createWorkerPool(workers=None, maxTasksPerChild=None):
+    import sys
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    # workers forked from server process that preloads neuron+netpyne (py3, unix); otherwise default start method
+    kwargs = {'max_workers': workers, 'initializer': initPoolWorker}
+    try:
+        ctx = multiprocessing.get_context('forkserver')
+        ctx.set_forkserver_preload(['neuron', 'netpyne.sim'])
+        kwargs['mp_context'] = ctx
+    except (AttributeError, ValueError):
+        pass
+    if maxTasksPerChild:
+        if sys.version_info >= (3, 11):
+            kwargs['max_tasks_per_child'] = maxTasksPerChild
+        else:
+            print("  Warning: runCfg 'maxTasksPerChild' requires python >= 3.11; ignored")
+    return ProcessPoolExecutor(**kwargs)
+
+def runWorkerPool(jobs, workers=None, maxTasksPerChild=None):
+    import os
+    from concurrent.futures import as_completed
+    from concurrent.futures.process import BrokenProcessPool
+
+    # if a worker dies (eg. segfault or h.quit() in script) pool is broken: jobs not started are run in new pool, 
+    # and jobs that had started are rerun one at a time so the job that kills its worker is identified and skipped
+    remaining, suspects = list(jobs), []
+    while remaining or suspects:
+        if suspects:
+            batchJobs, batchWorkers = [suspects.pop(0)], 1
+        else:
+            batchJobs, batchWorkers, remaining = remaining, workers, []
+        for job in batchJobs:
+            if os.path.exists(job[3]+'.run'): os.remove(job[3]+'.run')  # created when job starts
+        pool = createWorkerPool(batchWorkers, maxTasksPerChild)
+        futures = {pool.submit(runPoolJob, *job): job for job in batchJobs}
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                jobName, success = future.result()
+                if not success:
+                    print('  Warning: job %s failed; see %s.err' % (jobName, jobName))
+            except BrokenProcessPool:
+                if len(batchJobs) == 1:
+                    print('  Warning: worker process died running job %s; see %s.err' % (job[3], job[3]))
+                elif os.path.exists(job[3]+'.run'):
+                    suspects.append(job)
+                else:
+                    remaining.append(job)
+        pool.shutdown(wait=True)
+
+def initPoolWorker():
+    from netpyne import sim  # import once per worker (no-op if preloaded)
+
+# func needs to be outside of class
+def runPoolJob(script, cfgSavePath, netParamsSavePath, jobName):
+    import os
+    import sys
+    import runpy
+    import traceback
+    from netpyne import sim
+
+    # run script in worker process as if called with 'nrniv script simConfig=... netParams=...'; output redirected to .run/.err files
+    with open(jobName+'.run', 'w') as outf, open(jobName+'.err', 'w') as errf:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        stdoutFd, stderrFd = os.dup(1), os.dup(2)
+        os.dup2(outf.fileno(), 1)
+        os.dup2(errf.fileno(), 2)
+        argv = sys.argv
+        success = True
+        try:
+            sys.argv = [script, 'simConfig=%s' % (cfgSavePath), 'netParams=%s' % (netParamsSavePath)]
+            runpy.run_path(script, run_name='__main__')
+        except SystemExit as e:
+            success = e.code in [None, 0]
+        except Exception:
+            traceback.print_exc()
+            success = False
+        finally:
+            sys.argv = argv
+            # clear network and recorded data so worker can run next job
+            if hasattr(sim, 'net'):
+                try:
+                    sim.clearAll()
+                except Exception:
+                    traceback.print_exc()
+                    if hasattr(sim, 'net'): del sim.net
+                    import gc; gc.collect()
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os.dup2(stdoutFd, 1)
+            os.dup2(stderrFd, 2)
+            os.close(stdoutFd)
+            os.close(stderrFd)
+    
+    return jobName, success
+
+# -------------------------------------------------------------------------------
+# functions to receive results (fitness or simData) sent by jobs (see sim.sendSimData)
+# -------------------------------------------------------------------------------
+def createResultsServer(host='localhost'):
+    import os
+    import pickle
+    import binascii
+    import threading
+    from multiprocessing.connection import Listener
+    try:
+        from queue import Queue
+    except ImportError:  # py2
+        from Queue import Queue
+
+    # listener on free port; address 'host:port' and random key set in cfg.resultsAddress/resultsAuthKey of jobs;
+    # connections authenticated (HMAC challenge) before result is unpickled
+    authKey = os.urandom(32)
+    listener = Listener(('' if host != 'localhost' else host, 0), authkey=authKey)
+    results = Queue()
+
+    def acceptResults():
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as e:  # eg. authentication failed
+                print('  Rejected connection to results server: %s' % (e))
+                continue
+            try:
+                results.put(pickle.loads(conn.recv_bytes()))
+            except Exception as e:
+                print('  Error receiving result: %s' % (e))
+            finally:
+                conn.close()
+
+    thread = threading.Thread(target=acceptResults)
+    thread.daemon = True
+    thread.start()
+    return results, '%s:%d' % (host, listener.address[1]), binascii.hexlify(authKey).decode()
+
+def receiveResults(server, timeout=1):
+    try:
+        from queue import Empty
+    except ImportError:  # py2
+        from Queue import Empty
+
+    # block until first job sends result (or timeout), then read all pending
+    results = []
+    try:
+        results.append(server.get(timeout=timeout))
+        while True:
+            results.append(server.get_nowait())
+    except Empty:
+        pass
+    return results
+
 # -------------------------------------------------------------------------------
 # function to create a folder if it does not exist
 # -------------------------------------------------------------------------------
@@ -110,6 +268,7 @@ class Batch(object):
         self.method = 'grid'
         self.runCfg = {}
         self.evolCfg = {}
+        self.optimCfg = {}
         self.params = []
         self.seed = seed
         if params:
@@ -133,6 +292,8 @@ class Batch(object):
         odict = deepcopy(self.__dict__)
         if 'evolCfg' in odict:
             odict['evolCfg']['fitnessFunc'] = 'removed'
+        if 'optimCfg' in odict:
+            odict['optimCfg']['fitnessFunc'] = 'removed'
         odict['initCfg'] = tupleToStr(odict['initCfg'])
         dataSave = {'batch': tupleToStr(odict)} 
         if ext == 'json':
@@ -141,7 +302,7 @@ class Batch(object):
             #encoder.FLOAT_REPR = lambda o: format(o, '.12g')
             print(('Saving batch to %s ... ' % (filename)))
 
-            sim.saveJSON(filename, dataSave)
+            sim.saveJSON(filename, dataSave, indent=4)
 
     def setCfgNestedParam(self, paramLabel, paramVal):
         if isinstance(paramLabel, tuple):
@@ -201,6 +362,34 @@ class Batch(object):
         self.cfg.checkErrors = False  # avoid error checking during batch
 
 
+    def mergeResults(self, include=['params', 'metrics'], filename=None, workers=None):
+        return mergeBatchResults(self.saveFolder, self.batchLabel, include=include, filename=filename, workers=workers)
+
+
+    def cfgKey(self, extraFiles=[]):
+        import os
+
+        # copy of cfg values with tuple keys converted to str (as in saved cfg); specs.Dict can't be deepcopied
+        def strKeys(obj):
+            if isinstance(obj, dict):
+                return {str(k) if isinstance(k, tuple) else k: strKeys(v) for k, v in obj.items()}
+            elif isinstance(obj, (list, tuple)):
+                return [strKeys(v) for v in obj]
+            return obj
+
+        # hash of resolved cfg (without labels/paths of job), netParams file, mod files and extra files
+        cfgDict = {k: v for k, v in self.cfg.__dict__.items() if k not in ['simLabel', 'saveFolder', 'filename', 'resultsAddress', 'resultsAuthKey']}
+        cfgString = json.dumps(strKeys(cfgDict), sort_keys=True, default=str)
+        files = [self.netParamsFile] + modFiles(self.runCfg.get('modFolder', os.path.dirname(os.path.abspath(self.netParamsFile)))) + list(extraFiles)
+        return jobKey(cfgString, files)
+
+
+    def jobCacheFolder(self):
+        import os
+        # default: shared by batches in same parent folder (eg. overlapping grids)
+        return self.runCfg.get('cacheFolder', os.path.join(os.path.dirname(os.path.abspath(self.saveFolder)), '_jobCache'))
+
+
     def openFiles2SaveStats(self):
         stat_file_name = '%s/%s_stats.cvs' %(self.saveFolder, self.batchLabel)
         ind_file_name = '%s/%s_stats_indiv.cvs' %(self.saveFolder, self.batchLabel)
@@ -211,6 +400,246 @@ class Batch(object):
         return stats, individual
 
 
+    def submitJob(self, candidate, jobName, genFolderPath, args):
+        import os
+
+        # options slurm, mpi
+        type = args.get('type', 'mpi_direct')
+
+        # paths to required scripts
+        script = args.get('script', 'init.py')
+        netParamsSavePath =  args.get('netParamsSavePath')
+
+        # mpi command setup
+        nodes = args.get('nodes', 1)
+        paramLabels = args.get('paramLabels', [])
+        coresPerNode = args.get('coresPerNode', 1)
+        mpiCommand = args.get('mpiCommand', 'ibrun')
+        numproc = nodes*coresPerNode
+
+        # slurm setup
+        custom = args.get('custom', '')
+        folder = args.get('folder', '.')
+        email = args.get('email', 'a@b.c')
+        walltime = args.get('walltime', '00:01:00')
+        reservation = args.get('reservation', None)
+        allocation = args.get('allocation', 'csd403') # NSG account
+
+        jobPath = genFolderPath + '/' + jobName
+        pid, jobid = None, None
+
+        # modify cfg instance with candidate values
+        for label, value in zip(paramLabels, candidate):
+            self.setCfgNestedParam(label, value)
+            print('set %s=%s' % (label, value))
+
+        #self.setCfgNestedParam("filename", jobPath)
+        self.cfg.simLabel = jobName
+        self.cfg.saveFolder = genFolderPath
+
+        # reuse outputs of job with same cfg, netParams and mod files (eg. resumed optimization) if result can be loaded from them
+        cfgKey = self.cfgKey(args.get('memoizeFiles', [])) if args.get('memoize', False) else None
+        if cfgKey and reuseCachedJob(self.jobCacheFolder(), cfgKey, jobPath, JOB_RESULT_EXTS):
+            print('Skipping job %s since job with same cfg, netParams and mechanisms already completed...' % (jobName))
+            return pid, jobid
+
+        # save cfg instance to file
+        cfgSavePath = jobPath + '_cfg.json' 
+        self.cfg.save(cfgSavePath)
+        if cfgKey:
+            registerCachedJob(self.jobCacheFolder(), cfgKey, jobPath)
+
+
+        if type=='mpi_bulletin':
+            # ----------------------------------------------------------------------
+            # MPI master-slaves
+            # ----------------------------------------------------------------------
+            pc.submit(runEvolJob, script, cfgSavePath, netParamsSavePath, jobPath)
+            print('-'*80)
+
+        else:
+            # ----------------------------------------------------------------------
+            # MPI job commnand
+            # ----------------------------------------------------------------------
+            command = '%s -np %d nrniv -python -mpi %s simConfig=%s netParams=%s ' % (mpiCommand, numproc, script, cfgSavePath, netParamsSavePath)
+
+            # ----------------------------------------------------------------------
+            # run on local machine with <nodes*coresPerNode> cores
+            # ----------------------------------------------------------------------
+            if type=='mpi_direct':
+                executer = '/bin/bash'
+                jobString = bashTemplate('mpi_direct') %(custom, folder, command)
+
+            # ----------------------------------------------------------------------
+            # run on HPC through slurm
+            # ----------------------------------------------------------------------
+            elif type=='hpc_slurm':
+                executer = 'sbatch'
+                res = '#SBATCH --res=%s' % (reservation) if reservation else ''
+                jobString = bashTemplate('hpc_slurm') % (jobName, allocation, walltime, nodes, coresPerNode, jobPath, jobPath, email, res, custom, folder, command)
+
+            # ----------------------------------------------------------------------
+            # run on HPC through PBS
+            # ----------------------------------------------------------------------
+            elif type=='hpc_torque':
+                executer = 'qsub'
+                queueName = args.get('queueName', 'default')
+                nodesppn = 'nodes=%d:ppn=%d' % (nodes, coresPerNode)
+                jobString = bashTemplate('hpc_torque') % (jobName, walltime, queueName, nodesppn, jobPath, jobPath, custom, command)
+
+            # ----------------------------------------------------------------------
+            # save job and run
+            # ----------------------------------------------------------------------
+            print('Submitting job ', jobName)
+            print(jobString)
+            print('-'*80)
+            # save file 
+            batchfile = '%s.sbatch' % (jobPath)
+            with open(batchfile, 'w') as text_file:
+                text_file.write("%s" % jobString)
+
+            #with open(jobPath+'.run', 'a+') as outf, open(jobPath+'.err', 'w') as errf:
+            with open(jobPath+'.jobid', 'w') as outf, open(jobPath+'.err', 'w') as errf:
+                if type=='mpi_direct':  # wait for free cores
+                    pid = self.jobQueue.submit([executer, batchfile], numproc, stdout=outf,  stderr=errf, preexec_fn=os.setsid).pid
+                else:
+                    pid = Popen([executer, batchfile], stdout=outf,  stderr=errf, preexec_fn=os.setsid).pid
+            #proc = Popen(command.split([executer, batchfile]), stdout=PIPE, stderr=PIPE)
+            sleep(0.1)
+            #read = proc.stdout.read()                            
+            with open(jobPath+'.jobid', 'r') as outf:
+                read=outf.readline()
+            print(read)
+            if len(read) > 0:
+                jobid = int(read.split()[-1])
+
+        return pid, jobid
+
+    def loadJobResult(self, jobPath, receivedResults):
+        import os
+        import pickle
+
+        # result sent by job (fitness, or simData if 'sendSimData'; see sim.sendSimData), else simData of output file
+        simLabel = os.path.basename(jobPath)
+        if simLabel in receivedResults:
+            return receivedResults.pop(simLabel)
+        elif os.path.isfile(jobPath+'_results.pkl'):  # result saved by job if batch not reachable
+            with open('%s_results.pkl' % (jobPath), 'rb') as file:
+                return pickle.load(file)
+        elif os.path.isfile(jobPath+'.pkl'):
+            with open('%s.pkl' % (jobPath), 'rb') as file:
+                return {'simData': pickle.load(file)['simData']}
+        elif os.path.isfile(jobPath+'.json'):
+            with open('%s.json'% (jobPath)) as file:
+                return {'simData': json.load(file)['simData']}
+        return None
+
+
+    def jobFitness(self, jobName, result, args, defaultFitness):
+        from ..sim.save import _loadFunction
+
+        simData = result.get('simData', {})
+        if 'earlyStop' in result or 'earlyStop' in simData:
+            print("Candidate %s stopped at t = %.1f ms (cfg.earlyStopFunc); set to default fitness" % (jobName, result.get('earlyStop', simData.get('earlyStop'))))
+            return defaultFitness
+        elif 'fitnessError' in result:  # exception raised by fitnessFunc in job
+            raise Exception(result['fitnessError'])
+        elif 'fitness' in result:  # evaluated by job (cfg.resultsFitnessFunc)
+            return result['fitness']
+        return _loadFunction(args.get('fitnessFunc'))(simData, **args.get('fitnessFuncArgs', {}))
+
+
+    def initJobs(self, args):
+        import socket
+
+        # jobs send their result after gathering, which is skipped with cfg.saveDistributed (candidates would time out)
+        if getattr(self.cfg, 'saveDistributed', False):
+            raise ValueError("cfg.saveDistributed skips gathering, so jobs can't send their fitness; not supported by batch method '%s'" % (self.method))
+
+        # if using pc bulletin board, initialize all workers
+        if self.runCfg.get('type', None) == 'mpi_bulletin':
+            for iworker in range(int(pc.nhost())):
+                pc.runworker()
+
+        # if running mpi jobs directly, limit number of cores used by jobs running at the same time
+        elif self.runCfg.get('type', 'mpi_direct') == 'mpi_direct':
+            self.jobQueue = LocalJobQueue(self.runCfg.get('totalCores', None))
+
+        # jobs send simData to batch when simulation ends (jobs on compute nodes connect to this host)
+        self.resultsServer, self.cfg.resultsAddress, self.cfg.resultsAuthKey = createResultsServer('localhost' if self.runCfg.get('type', 'mpi_direct') in ['mpi_direct', 'mpi_bulletin'] else socket.gethostname())
+
+        # jobs evaluate fitnessFunc (stored in cfg as 'module:function') and send only fitness;
+        # if 'sendSimData', jobs send full simData and fitnessFunc is evaluated by batch
+        if args.get('sendSimData', False):
+            self.cfg.resultsFitnessFunc = None
+        else:
+            try:
+                self.cfg.resultsFitnessFunc = functionRef(args.get('fitnessFunc'), "fitnessFunc")
+            except ValueError as e:
+                raise ValueError("%s (or set 'sendSimData': True to evaluate it in batch)" % (e))
+            self.cfg.resultsFitnessFuncArgs = args.get('fitnessFuncArgs', {})
+
+
+    def optimArgs(self):
+        # args of jobs of model-based optimization methods (optimCfg and runCfg)
+        args = {'paramLabels': [x['label'] for x in self.params]}
+        args['netParamsSavePath'] = self.saveFolder+'/'+self.batchLabel+'_netParams.py'
+        for key, value in self.optimCfg.items():
+            args[key] = value
+        for key, value in self.runCfg.items():
+            args[key] = value
+        return args
+
+
+    def maxParallelJobs(self, numWorkers, args):
+        # avoid blocking in jobQueue while jobs send results
+        if args.get('type', 'mpi_direct') == 'mpi_direct':
+            numWorkers = min(numWorkers, max(1, self.jobQueue.totalCores // (args.get('nodes', 1) * args.get('coresPerNode', 1))))
+        return numWorkers
+
+
+    def collectJobs(self, running, receivedResults, args):
+        import os
+
+        timeout = args.get('maxiter_wait', 5000) * args.get('time_sleep', 1)
+        defaultFitness = args.get('defaultFitness')
+        if defaultFitness is None:  # worst fitness so failed or timed out jobs are always removed from running
+            defaultFitness = float('-inf') if args.get('maximize', False) else float('inf')
+
+        if args.get('type', 'mpi_direct') == 'mpi_bulletin':
+            while pc.working():  # runEvolJob returns after starting job
+                pass
+
+        # wait for results sent by jobs as soon as they finish (see sim.sendSimData)
+        for result in receiveResults(self.resultsServer, args.get('time_sleep', 1)):
+            receivedResults[result['simLabel']] = result
+
+        # fitness of finished jobs (removed from running)
+        finished = []
+        for jobName, (candidate, jobPath, startTime, jobid) in list(running.items()):
+            fitness = None
+            try: # load result of job (output file may still be being written; retried on next poll until timeout)
+                result = self.loadJobResult(jobPath, receivedResults)
+            except Exception:
+                result = None
+            if result is not None:
+                try: # get fitness (error raised by fitnessFunc is final)
+                    fitness = self.jobFitness(jobName, result, args, defaultFitness)
+                except Exception as e:
+                    print("There was an exception evaluating candidate %s: \n %s" % (jobName, e))
+                    fitness = defaultFitness
+            if fitness is None and time() - startTime > timeout:
+                print("Candidate %s not finished after %d s; set to default fitness" % (jobName, timeout))
+                fitness = defaultFitness
+                if args.get('type') == 'hpc_slurm' and jobid:
+                    os.system('scancel %d' % (jobid))
+            if fitness is not None:
+                del running[jobName]
+                finished.append((jobName, candidate, fitness))
+
+        return finished
+
+
     def run(self):
         # -------------------------------------------------------------------------------
         # Grid Search optimization
@@ -254,6 +683,14 @@ class Batch(object):
                 for paramLabel, paramVal in self.initCfg.items():
                     self.setCfgNestedParam(paramLabel, paramVal)
 
+            # reduce output of each job to metrics (eg. 'module:function'); optionally skip saving full output
+            if self.runCfg.get('reducer', None):
+                self.cfg.resultsReducer = functionRef(self.runCfg['reducer'], "runCfg 'reducer'")
+                self.cfg.resultsCombiner = functionRef(self.runCfg.get('combiner', None), "runCfg 'combiner'")
+                if not self.runCfg.get('saveOutput', True):
+                    for saveFormat in ['savePickle', 'saveJson', 'saveMat', 'saveCSV', 'saveDpk', 'saveHDF5', 'saveDat']:
+                        setattr(self.cfg, saveFormat, False)
+
             # iterate over all param combinations
             if self.method == 'grid':
                 groupedParams = False
@@ -289,6 +726,14 @@ class Batch(object):
                 for iworker in range(int(pc.nhost())):
                     pc.runworker()
 
+            # if running mpi jobs directly, limit number of cores used by jobs running at the same time
+            elif self.runCfg.get('type', None) == 'mpi_direct':
+                jobQueue = LocalJobQueue(self.runCfg.get('totalCores', None))
+
+            # if using local worker pool, jobs run by worker processes
+            elif self.runCfg.get('type', None) == 'pool':
+                poolJobs = []  # run in pool of worker processes once all cfgs are saved
+
             for iCombG, pCombG in zip(indexCombGroups, valueCombGroups):
                 for iCombNG, pCombNG in zip(indexCombinations, valueCombinations):
                     if groupedParams and ungroupedParams: # temporary hack - improve
@@ -318,6 +763,9 @@ class Batch(object):
 
                     sleepInterval = 1
 
+                    # key of resolved cfg + netParams + mod files, to reuse outputs of job run with same key
+                    cfgKey = self.cfgKey(self.runCfg.get('memoizeFiles', [])) if self.runCfg.get('memoize', False) else None
+
                     # skip if output file already exists
                     if self.runCfg.get('skip', False) and glob.glob(jobName+'.json'):
                         print('Skipping job %s since output file already exists...' % (jobName))
@@ -325,12 +773,16 @@ class Batch(object):
                         print('Skipping job %s since cfg file already exists...' % (jobName))
                     elif self.runCfg.get('skipCustom', None) and glob.glob(jobName+self.runCfg['skipCustom']):
                         print('Skipping job %s since %s file already exists...' % (jobName, self.runCfg['skipCustom']))
+                    elif cfgKey and reuseCachedJob(self.jobCacheFolder(), cfgKey, jobName):
+                        print('Skipping job %s since job with same cfg, netParams and mechanisms already completed...' % (jobName))
                     else:
                         # save simConfig json to saveFolder                        
                         self.cfg.simLabel = simLabel
                         self.cfg.saveFolder = self.saveFolder
                         cfgSavePath = self.saveFolder+'/'+simLabel+'_cfg.json'
                         self.cfg.save(cfgSavePath)
+                        if cfgKey:
+                            registerCachedJob(self.jobCacheFolder(), cfgKey, jobName)
 
                         # hpc torque job submission
                         if self.runCfg.get('type',None) == 'hpc_torque':
@@ -439,14 +891,23 @@ wait
                             folder = self.runCfg.get('folder', '.')
                             script = self.runCfg.get('script', 'init.py')
                             mpiCommand = self.runCfg.get('mpiCommand', 'ibrun')
+                            sleepInterval = 0  # jobQueue waits for free cores
 
                             command = '%s -np %d nrniv -python -mpi %s simConfig=%s netParams=%s' % (mpiCommand, cores, script, cfgSavePath, netParamsSavePath) 
                             
                             print(command+'\n')
-                            proc = Popen(command.split(' '), stdout=open(jobName+'.run','w'),  stderr=open(jobName+'.err','w'))
+                            proc = jobQueue.submit(command.split(' '), cores, stdout=open(jobName+'.run','w'),  stderr=open(jobName+'.err','w'))
                             #print proc.stdout.read()
                             
                             
+                        # run jobs in pool of local worker processes (avoids startup time of each job)
+                        # eg. usage: python batch.py
+                        elif self.runCfg.get('type',None) == 'pool':
+                            jobName = self.saveFolder+'/'+simLabel     
+                            print('Submitting job ',jobName)
+                            sleepInterval = 0
+                            poolJobs.append((self.runCfg.get('script', 'init.py'), cfgSavePath, netParamsSavePath, jobName))
+
                         # pc bulletin board job submission (master/slave) via mpi
                         # eg. usage: mpiexec -n 4 nrniv -mpi batch.py
                         elif self.runCfg.get('type',None) == 'mpi_bulletin':
@@ -457,7 +918,7 @@ wait
                             
                         else:
                             print(self.runCfg)
-                            print("Error: invalid runCfg 'type' selected; valid types are 'mpi_bulletin', 'mpi_direct', 'hpc_slurm', 'hpc_torque'")
+                            print("Error: invalid runCfg 'type' selected; valid types are 'mpi_bulletin', 'mpi_direct', 'hpc_slurm', 'hpc_torque', 'pool'")
                             import sys
                             sys.exit(0)
                 
@@ -468,6 +929,18 @@ wait
             while pc.working():
                 sleep(sleepInterval)
 
+            # wait for queued and running mpi_direct jobs
+            if self.runCfg.get('type', None) == 'mpi_direct':
+                jobQueue.wait()
+
+            # wait for jobs in local worker pool
+            elif self.runCfg.get('type', None) == 'pool':
+                runWorkerPool(poolJobs, self.runCfg.get('workers', None), self.runCfg.get('maxTasksPerChild', None))
+
+            # merge params, metrics (and spikes) of all jobs into single file (only if waited for jobs)
+            if self.runCfg.get('mergeResults', False) and self.runCfg.get('type', None) in ['mpi_direct', 'mpi_bulletin', 'pool']:
+                self.mergeResults(**(self.runCfg['mergeResults'] if isinstance(self.runCfg['mergeResults'], dict) else {}))
+
 
 
         # -------------------------------------------------------------------------------
@@ -489,31 +962,12 @@ wait
 
                 # options slurm, mpi
                 type = args.get('type', 'mpi_direct')
-                
-                # paths to required scripts
-                script = args.get('script', 'init.py')
-                netParamsSavePath =  args.get('netParamsSavePath')
                 genFolderPath = self.saveFolder + '/gen_' + str(ngen)
                 
-                # mpi command setup
-                nodes = args.get('nodes', 1)
-                paramLabels = args.get('paramLabels', [])
-                coresPerNode = args.get('coresPerNode', 1)
-                mpiCommand = args.get('mpiCommand', 'ibrun')
-                numproc = nodes*coresPerNode
-                
-                # slurm setup
-                custom = args.get('custom', '')
-                folder = args.get('folder', '.')
-                email = args.get('email', 'a@b.c')
-                walltime = args.get('walltime', '00:01:00')
-                reservation = args.get('reservation', None)
-                allocation = args.get('allocation', 'csd403') # NSG account
-
                 # fitness function
-                fitnessFunc = args.get('fitnessFunc')
-                fitnessFuncArgs = args.get('fitnessFuncArgs')
                 defaultFitness = args.get('defaultFitness')
+                if defaultFitness is None:  # worst fitness for failed, early-stopped or timed out jobs (as in collectJobs)
+                    defaultFitness = float('-inf') if args.get('maximize', False) else float('inf')
                 
                 # read params or set defaults
                 sleepInterval = args.get('sleepInterval', 0.2)
@@ -532,82 +986,11 @@ wait
                     
                     # name and path
                     jobName = "gen_" + str(ngen) + "_cand_" + str(candidate_index)
-                    jobPath = genFolderPath + '/' + jobName
-                    
-                    # modify cfg instance with candidate values
-                    for label, value in zip(paramLabels, candidate):
-                        self.setCfgNestedParam(label, value)
-                        print('set %s=%s' % (label, value))
-                    
-                    #self.setCfgNestedParam("filename", jobPath)
-                    self.cfg.simLabel = jobName
-                    self.cfg.saveFolder = genFolderPath
-
-                    # save cfg instance to file
-                    cfgSavePath = jobPath + '_cfg.json' 
-                    self.cfg.save(cfgSavePath)
-                    
-                    
-                    if type=='mpi_bulletin':
-                        # ----------------------------------------------------------------------
-                        # MPI master-slaves
-                        # ----------------------------------------------------------------------
-                        pc.submit(runEvolJob, script, cfgSavePath, netParamsSavePath, jobPath)
-                        print('-'*80)
-
-                    else:
-                        # ----------------------------------------------------------------------
-                        # MPI job commnand
-                        # ----------------------------------------------------------------------
-                        command = '%s -np %d nrniv -python -mpi %s simConfig=%s netParams=%s ' % (mpiCommand, numproc, script, cfgSavePath, netParamsSavePath)
-                        
-                        # ----------------------------------------------------------------------
-                        # run on local machine with <nodes*coresPerNode> cores
-                        # ----------------------------------------------------------------------
-                        if type=='mpi_direct':
-                            executer = '/bin/bash'
-                            jobString = bashTemplate('mpi_direct') %(custom, folder, command)
-                        
-                        # ----------------------------------------------------------------------
-                        # run on HPC through slurm
-                        # ----------------------------------------------------------------------
-                        elif type=='hpc_slurm':
-                            executer = 'sbatch'
-                            res = '#SBATCH --res=%s' % (reservation) if reservation else ''
-                            jobString = bashTemplate('hpc_slurm') % (jobName, allocation, walltime, nodes, coresPerNode, jobPath, jobPath, email, res, custom, folder, command)
-                        
-                        # ----------------------------------------------------------------------
-                        # run on HPC through PBS
-                        # ----------------------------------------------------------------------
-                        elif type=='hpc_torque':
-                            executer = 'qsub'
-                            queueName = args.get('queueName', 'default')
-                            nodesppn = 'nodes=%d:ppn=%d' % (nodes, coresPerNode)
-                            jobString = bashTemplate('hpc_torque') % (jobName, walltime, queueName, nodesppn, jobPath, jobPath, custom, command)
-                        
-                        # ----------------------------------------------------------------------
-                        # save job and run
-                        # ----------------------------------------------------------------------
-                        print('Submitting job ', jobName)
-                        print(jobString)
-                        print('-'*80)
-                        # save file 
-                        batchfile = '%s.sbatch' % (jobPath)
-                        with open(batchfile, 'w') as text_file:
-                            text_file.write("%s" % jobString)
-                        
-                        #with open(jobPath+'.run', 'a+') as outf, open(jobPath+'.err', 'w') as errf:
-                        with open(jobPath+'.jobid', 'w') as outf, open(jobPath+'.err', 'w') as errf:
-                            pids.append(Popen([executer, batchfile], stdout=outf,  stderr=errf, preexec_fn=os.setsid).pid)
-                        #proc = Popen(command.split([executer, batchfile]), stdout=PIPE, stderr=PIPE)
-                        sleep(0.1)
-                        #read = proc.stdout.read()                            
-                        with open(jobPath+'.jobid', 'r') as outf:
-                            read=outf.readline()
-                        print(read)
-                        if len(read) > 0:
-                            jobid = int(read.split()[-1])
-                            jobids[candidate_index] = jobid
+                    pid, jobid = self.submitJob(candidate, jobName, genFolderPath, args)
+                    if pid: 
+                        pids.append(pid)
+                    if jobid is not None:
+                        jobids[candidate_index] = jobid
                         print('jobids', jobids)
                     total_jobs += 1
                     sleep(0.1)
@@ -628,19 +1011,24 @@ wait
                 num_iters = 0
                 jobs_completed = 0
                 fitness = [None for cand in candidates]
+                receivedResults = {}
                 # print outfilestem
                 print("Waiting for jobs from generation %d/%d ..." %(ngen, args.get('max_generations')))
                 # print "PID's: %r" %(pids)
                 # start fitness calculation
                 while jobs_completed < total_jobs:
                     unfinished = [i for i, x in enumerate(fitness) if x is None ]
+
+                    # wait for results sent by jobs as soon as they finish (see sim.sendSimData)
+                    for result in receiveResults(self.resultsServer, args.get('time_sleep', 1)):
+                        receivedResults[result['simLabel']] = result
+
                     for candidate_index in unfinished:
-                        try: # load simData and evaluate fitness
+                        try: # load result of job and get fitness
                             jobNamePath = genFolderPath + "/gen_" + str(ngen) + "_cand_" + str(candidate_index)
-                            if os.path.isfile(jobNamePath+'.json'):
-                                with open('%s.json'% (jobNamePath)) as file:
-                                    simData = json.load(file)['simData']
-                                fitness[candidate_index] = fitnessFunc(simData, **fitnessFuncArgs)
+                            result = self.loadJobResult(jobNamePath, receivedResults)
+                            if result is not None:
+                                fitness[candidate_index] = self.jobFitness(os.path.basename(jobNamePath), result, args, defaultFitness)
                                 jobs_completed += 1
                                 print('  Candidate %d fitness = %.1f' % (candidate_index, fitness[candidate_index]))
                         except Exception as e:
@@ -660,7 +1048,6 @@ wait
                                 os.system('scancel -u %s'%(kwargs['scancelUser']))
                             else:              
                                 os.system('scancel %d'%(jobids[candidate_index]))  # terminate unfinished job (resubmitted jobs not terminated!)
-                    sleep(args.get('time_sleep', 1))
                 
                 # kill all processes
                 if type=='mpi_bulletin':
@@ -724,6 +1111,66 @@ wait
                 
                 return mutant
             # -------------------------------------------------------------------------------
+            # Asynchronous steady-state evolution: new candidate submitted as soon as a job finishes
+            # -------------------------------------------------------------------------------
+            def asyncSteadyStateEvolution(random, args):
+                import numpy as np
+
+                popSize = args['pop_size']
+                maxEvaluations = args.get('max_evaluations', popSize * args.get('max_generations', 1))
+                numWorkers = self.maxParallelJobs(args.get('num_workers', popSize), args)
+                bounder = EC.Bounder(args['lower_bound'], args['upper_bound'])
+                selectArgs = dict(args, num_selected=2, tournament_size=args.get('tournament_size', 2))
+
+                population = []  # evaluated individuals (at most pop_size)
+                running = {}  # jobName: (candidate, jobPath, startTime, jobid)
+                receivedResults = {}
+                numSubmitted, numEvaluated = 0, 0
+
+                print("Running asynchronous steady-state evolution (%d evaluations, %d jobs at a time) ..." % (maxEvaluations, numWorkers))
+                while numEvaluated < maxEvaluations:
+                    # keep all workers busy; random candidates until population is evaluated, then offspring of current population
+                    while len(running) < numWorkers and numSubmitted < maxEvaluations:
+                        if len(population) < popSize or numSubmitted < popSize:
+                            candidate = generator(random, args)
+                        else:
+                            parents = EC.selectors.tournament_selection(random, population, selectArgs)
+                            offspring = EC.variators.uniform_crossover(random, [parent.candidate for parent in parents], args)
+                            candidate = bounder(nonuniform_bounds_mutation(random, offspring[:1], args)[0], args)
+                        
+                        gen = numSubmitted // popSize
+                        genFolderPath = self.saveFolder + '/gen_' + str(gen)
+                        createFolder(genFolderPath)
+                        jobName = "gen_" + str(gen) + "_cand_" + str(numSubmitted % popSize)
+                        pid, jobid = self.submitJob(candidate, jobName, genFolderPath, args)
+                        running[jobName] = (candidate, genFolderPath + '/' + jobName, time(), jobid)
+                        numSubmitted += 1
+
+                    for jobName, candidate, fitness in self.collectJobs(running, receivedResults, args):
+                        # steady-state replacement: new individual replaces worst one if better
+                        numEvaluated += 1
+                        individual = EC.Individual(candidate, maximize=args['maximize'])
+                        individual.fitness = fitness
+                        if len(population) < popSize:
+                            population.append(individual)
+                        else:
+                            worst = min(population)
+                            if worst < individual:
+                                population[population.index(worst)] = individual
+                        print('  Candidate %s fitness = %.1f (%d/%d evaluated)' % (jobName, fitness, numEvaluated, maxEvaluations))
+
+                        # same format as inspyred file_observer (generation = evaluations / pop_size)
+                        gen = (numEvaluated - 1) // popSize
+                        args['individuals_file'].write('{0}, {1}, {2}, {3}\n'.format(gen, int(jobName.split('_cand_')[1]), fitness, str(candidate)))
+                        args['individuals_file'].flush()
+                        if numEvaluated % popSize == 0:
+                            fit = sorted([ind.fitness for ind in population])
+                            args['statistics_file'].write('{0}, {1}, {2}, {3}, {4}, {5}, {6}\n'.format(gen, len(population), fit[0], fit[-1], np.median(fit), np.mean(fit), np.std(fit)))
+                            args['statistics_file'].flush()
+
+                return population
+
+            # -------------------------------------------------------------------------------
             # Evolutionary optimization: Main code
             # -------------------------------------------------------------------------------
             import os
@@ -766,10 +1213,8 @@ wait
             for key, value in self.runCfg.items(): 
                 kwargs[key] = value
             
-            # if using pc bulletin board, initialize all workers
-            if self.runCfg.get('type', None) == 'mpi_bulletin':
-                for iworker in range(int(pc.nhost())):
-                    pc.runworker()
+            # start workers, local job queue and server receiving results of jobs
+            self.initJobs(kwargs)
 
             ####################################################################
             #                       Evolution strategy
@@ -816,19 +1261,26 @@ wait
                 ea = swarm.ACS(rand, self.evolCfg['components'])
                 ea.topology = swarm.topologies.ring_topology
             
+            # Asynchronous steady-state (custom operators; new candidate submitted whenever a job finishes)
+            elif self.evolCfg['evolAlgorithm'] == 'asyncSteadyState':
+                ea = None
+            
             else:
                 raise ValueError("%s is not a valid strategy" %(self.evolCfg['evolAlgorithm']))
             ####################################################################
-            ea.terminator = EC.terminators.generation_termination
-            ea.observer = [EC.observers.stats_observer, EC.observers.file_observer]
             # -------------------------------------------------------------------------------
             # Run algorithm
             # ------------------------------------------------------------------------------- 
-            final_pop = ea.evolve(generator=generator, 
-                                evaluator=evaluator,
-                                bounder=EC.Bounder(kwargs['lower_bound'],kwargs['upper_bound']),
-                                logger=logger,
-                                **kwargs)
+            if ea is None:
+                final_pop = asyncSteadyStateEvolution(rand, kwargs)
+            else:
+                ea.terminator = EC.terminators.generation_termination
+                ea.observer = [EC.observers.stats_observer, EC.observers.file_observer]
+                final_pop = ea.evolve(generator=generator, 
+                                    evaluator=evaluator,
+                                    bounder=EC.Bounder(kwargs['lower_bound'],kwargs['upper_bound']),
+                                    logger=logger,
+                                    **kwargs)
 
             # close file
             stats_file.close()
@@ -840,3 +1292,170 @@ wait
             print("   Completed evolutionary algorithm parameter optimization   ")
             print("-"*80)
             sys.exit()
+
+
+        # -------------------------------------------------------------------------------
+        # Bayesian optimization (gaussian process or tree-Parzen surrogate of fitness)
+        # -------------------------------------------------------------------------------
+        elif self.method == 'bayesian':
+            import numpy as np
+            from .utils import proposeCandidate
+
+            # create main sim directory and save scripts
+            self.saveScripts()
+            stats_file, ind_stats_file = self.openFiles2SaveStats()
+
+            # gather **kwargs
+            kwargs = self.optimArgs()
+
+            lower = np.array([x['values'][0] for x in self.params], dtype=float)
+            upper = np.array([x['values'][1] for x in self.params], dtype=float)
+            sign = -1 if kwargs.get('maximize', False) else 1  # surrogate minimizes fitness
+            surrogate = kwargs.get('surrogate', 'gp')
+            maxEvaluations = kwargs.get('max_evaluations', 50)
+            numInitial = kwargs.get('num_initial', max(5, 2*len(self.params)))
+            rng = np.random.RandomState(self.seed)
+
+            # start workers, local job queue and server receiving results of jobs
+            self.initJobs(kwargs)
+            numWorkers = self.maxParallelJobs(kwargs.get('num_workers', 1), kwargs)
+
+            X, y = [], []  # evaluated points (normalized to [0,1]) and fitness
+            running = {}  # jobName: (candidate, jobPath, startTime, jobid)
+            pendingX = {}  # jobName: normalized point
+            receivedResults = {}
+            numSubmitted = 0
+
+            print("Running %s bayesian optimization (%d evaluations, %d jobs at a time) ..." % (surrogate, maxEvaluations, numWorkers))
+            while len(y) < maxEvaluations:
+                # propose new candidates from fitness of finished jobs (random until num_initial submitted)
+                while len(running) < numWorkers and numSubmitted < maxEvaluations:
+                    if numSubmitted < numInitial or len(y) < 2:
+                        x = rng.uniform(size=len(self.params))
+                    else:
+                        x = proposeCandidate(X, sign*np.array(y), rng, surrogate, pending=list(pendingX.values()))
+                    candidate = [float(v) for v in lower + x * (upper - lower)]
+
+                    # job labels <batchLabel>_<trial> (same as 1-param grid; see mergeResults)
+                    jobName = self.batchLabel + '_' + str(numSubmitted)
+                    pid, jobid = self.submitJob(candidate, jobName, self.saveFolder, kwargs)
+                    running[jobName] = (candidate, self.saveFolder + '/' + jobName, time(), jobid)
+                    pendingX[jobName] = x
+                    numSubmitted += 1
+
+                for jobName, candidate, fitness in self.collectJobs(running, receivedResults, kwargs):
+                    X.append(pendingX.pop(jobName))
+                    y.append(fitness)
+                    print('  Trial %s fitness = %.1f (%d/%d evaluated)' % (jobName, fitness, len(y), maxEvaluations))
+                    ind_stats_file.write('{0}, {1}, {2}, {3}\n'.format(0, int(jobName.split('_')[-1]), fitness, str(candidate)))
+                    ind_stats_file.flush()
+
+            # close files
+            fit = sorted(y)
+            stats_file.write('{0}, {1}, {2}, {3}, {4}, {5}, {6}\n'.format(0, len(y), fit[-1 if sign > 0 else 0], fit[0 if sign > 0 else -1], np.median(fit), np.mean(fit), np.std(fit)))
+            stats_file.close()
+            ind_stats_file.close()
+
+            # merge params, metrics (and spikes) of all trials into single file
+            if self.runCfg.get('mergeResults', False):
+                self.mergeResults(**(self.runCfg['mergeResults'] if isinstance(self.runCfg['mergeResults'], dict) else {}))
+
+            # print best
+            best = int(np.argmin(sign*np.array(y)))
+            print('Best Solution: \n{0}: {1}'.format(y[best], [float(v) for v in lower + X[best] * (upper - lower)]))
+            print("-"*80)
+            print("   Completed bayesian optimization   ")
+            print("-"*80)
+
+
+        # -------------------------------------------------------------------------------
+        # Hyperband / successive halving (candidates run at increasing fidelity, best fraction promoted)
+        # -------------------------------------------------------------------------------
+        elif self.method == 'hyperband':
+            import numpy as np
+            from .utils import hyperbandFidelities, hyperbandSchedule
+
+            # create main sim directory and save scripts
+            self.saveScripts()
+            stats_file, ind_stats_file = self.openFiles2SaveStats()
+
+            # gather **kwargs
+            kwargs = self.optimArgs()
+
+            lower = np.array([x['values'][0] for x in self.params], dtype=float)
+            upper = np.array([x['values'][1] for x in self.params], dtype=float)
+            sign = -1 if kwargs.get('maximize', False) else 1  # lower is better
+            eta = kwargs.get('eta', 3)
+            numRungs = kwargs.get('num_rungs', 3)
+            rng = np.random.RandomState(self.seed)
+
+            # fidelity of each rung from geometric range (eg. cfg.duration, cfg.scale or coarser to finer cfg.dt)
+            fidelityParam = kwargs.get('fidelityParam', 'duration')
+            fidelities = hyperbandFidelities(fidelityParam, numRungs, eta, kwargs.get('fidelityRange', None), getattr(self.cfg, fidelityParam, None))
+
+            # jobs stopped early if cfg.earlyStopFunc returns True (see sim.earlyStop)
+            if 'earlyStopFunc' in kwargs:
+                if callable(kwargs['earlyStopFunc']):  # saved in cfg of jobs
+                    raise ValueError("optimCfg 'earlyStopFunc' must be 'module:function' or 'path/file.py:function' so it can be loaded by batch jobs")
+                self.cfg.earlyStopFunc = kwargs['earlyStopFunc']
+                self.cfg.earlyStopInterval = kwargs.get('earlyStopInterval', self.cfg.earlyStopInterval)
+
+            # start workers, local job queue and server receiving results of jobs
+            self.initJobs(kwargs)
+            numWorkers = self.maxParallelJobs(kwargs.get('num_workers', 1), kwargs)
+            receivedResults = {}
+            numSubmitted = [0]
+
+            def evaluate(candidates, rung):
+                # run all candidates at fidelity of rung (at most num_workers at a time)
+                self.setCfgNestedParam(fidelityParam, fidelities[rung])
+                fitness = [None] * len(candidates)
+                running, indices = {}, {}  # jobName: (candidate, jobPath, startTime, jobid); jobName: index
+                while None in fitness:
+                    while len(running) < numWorkers and len(indices) < len(candidates):
+                        candidate = candidates[len(indices)]
+                        jobName = self.batchLabel + '_' + str(numSubmitted[0])
+                        pid, jobid = self.submitJob(candidate, jobName, self.saveFolder, kwargs)
+                        running[jobName] = (candidate, self.saveFolder + '/' + jobName, time(), jobid)
+                        indices[jobName] = len(indices)
+                        numSubmitted[0] += 1
+
+                    for jobName, candidate, jobFitness in self.collectJobs(running, receivedResults, kwargs):
+                        fitness[indices[jobName]] = jobFitness
+                        print('  Trial %s (%s=%s) fitness = %.1f' % (jobName, fidelityParam, fidelities[rung], jobFitness))
+                        ind_stats_file.write('{0}, {1}, {2}, {3}\n'.format(rung, int(jobName.split('_')[-1]), jobFitness, str(candidate)))
+                        ind_stats_file.flush()
+
+                fit = sorted(fitness, key=lambda f: sign*f)
+                stats_file.write('{0}, {1}, {2}, {3}, {4}, {5}, {6}\n'.format(rung, len(fit), fit[-1], fit[0], np.median(fit), np.mean(fit), np.std(fit)))
+                stats_file.flush()
+                return fitness
+
+            # brackets with more candidates at lower fidelity first (single bracket = successive halving)
+            results = []  # (fitness, candidate) at full fidelity
+            for bracket, rungs, numCandidates in hyperbandSchedule(numRungs, eta, kwargs.get('hyperband', True), kwargs.get('num_candidates', None)):
+                candidates = [[float(v) for v in lower + rng.uniform(size=len(self.params)) * (upper - lower)] for i in range(numCandidates[0])]
+                print("Hyperband bracket %d: %d candidates, fidelities %s ..." % (bracket, numCandidates[0], [fidelities[rung] for rung in rungs]))
+
+                for i, rung in enumerate(rungs):
+                    fitness = evaluate(candidates, rung)
+                    order = np.argsort([sign*f for f in fitness], kind='stable')
+                    if rung == numRungs-1:
+                        results.extend([(fitness[j], candidates[j]) for j in order])
+                    else:  # promote best 1/eta of candidates to next rung
+                        candidates = [candidates[j] for j in order[:numCandidates[i+1]]]
+
+            # close files
+            stats_file.close()
+            ind_stats_file.close()
+
+            # merge params, metrics (and spikes) of all trials into single file
+            if self.runCfg.get('mergeResults', False):
+                self.mergeResults(**(self.runCfg['mergeResults'] if isinstance(self.runCfg['mergeResults'], dict) else {}))
+
+            # print best
+            best = min(results, key=lambda r: sign*r[0])
+            print('Best Solution: \n{0}: {1}'.format(best[0], best[1]))
+            print("-"*80)
+            print("   Completed hyperband optimization   ")
+            print("-"*80)
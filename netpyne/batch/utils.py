@@ -52,4 +52,388 @@ wait
 cd $PBS_O_WORKDIR
 echo $PBS_O_WORKDIR
 %s
-        """
\ No newline at end of file
+        """
+
+class LocalJobQueue(object):
+    ''' Run local jobs (eg. mpi_direct) without exceeding total number of cores; 
+    each job is started as soon as enough cores are released by jobs that exited'''
+
+    def __init__(self, totalCores=None, pollInterval=0.05):
+        import multiprocessing
+        self.totalCores = totalCores or multiprocessing.cpu_count()
+        self.pollInterval = pollInterval
+        self.running = []  # list of (proc, cores) of running jobs
+
+    def usedCores(self):
+        self.running = [(proc, cores) for proc, cores in self.running if proc.poll() is None]
+        return sum([cores for proc, cores in self.running])
+
+    def submit(self, command, cores=1, **kwargs):
+        from subprocess import Popen
+        from time import sleep
+
+        if cores > self.totalCores:
+            print('  Warning: job requires %d cores but totalCores=%d; job will run without other jobs' % (cores, self.totalCores))
+            cores = self.totalCores
+        while self.usedCores() + cores > self.totalCores:
+            sleep(self.pollInterval)
+        proc = Popen(command, **kwargs)
+        self.running.append((proc, cores))
+        return proc
+
+    def wait(self):
+        from time import sleep
+
+        while self.usedCores() > 0:
+            sleep(self.pollInterval)
+
+
+def _loadJobResults(job):
+    ''' load params, metrics and (optionally) spikes of a batch job (run in pool of processes by mergeBatchResults)'''
+    import os
+    import json
+
+    jobPath, paramLabels, includeSpikes = job
+    with open(jobPath + '_cfg.json', 'r') as fileObj:
+        cfg = json.load(fileObj)['simConfig']
+
+    # value of each param in job cfg (nested labels, eg. ['IClamp1', 'amp'])
+    params = []
+    for label in paramLabels:
+        value = cfg
+        for key in (label if isinstance(label, list) else [label]):
+            value = value.get(key) if isinstance(value, dict) else None
+        params.append(value)
+
+    # metrics saved by job (see sim.reduceResults); nested keys joined with '.'
+    metrics = {}
+    if os.path.isfile(jobPath + '_metrics.json'):
+        with open(jobPath + '_metrics.json', 'r') as fileObj:
+            jobMetrics = json.load(fileObj)['metrics']
+        stack = [('', jobMetrics if isinstance(jobMetrics, dict) else {'metrics': jobMetrics})]
+        while stack:
+            prefix, values = stack.pop()
+            for key, value in values.items():
+                if isinstance(value, dict):
+                    stack.append((prefix + str(key) + '.', value))
+                else:
+                    metrics[prefix + str(key)] = value
+
+    # spikes from output file (only spkt and spkid read from .h5 and indexed .json)
+    spikes = None
+    if includeSpikes:
+        from ..sim.load import _loadH5SimDataFile, _loadJSONIndex, _loadJSONSimDataFile
+        simData = None
+        if os.path.isfile(jobPath + '.h5'):
+            simData = _loadH5SimDataFile(jobPath + '.h5', keys=['spkt', 'spkid'])
+        elif os.path.isfile(jobPath + '.json') and _loadJSONIndex(jobPath + '.json'):
+            simData = _loadJSONSimDataFile(jobPath + '.json', keys=['spkt', 'spkid'])
+        elif os.path.isfile(jobPath + '.pkl'):
+            import pickle
+            with open(jobPath + '.pkl', 'rb') as fileObj:
+                simData = pickle.load(fileObj).get('simData')
+        elif os.path.isfile(jobPath + '.json'):
+            with open(jobPath + '.json', 'r') as fileObj:
+                simData = json.load(fileObj).get('simData')
+        if simData and 'spkt' in simData:
+            spikes = (list(simData['spkt']), list(simData['spkid']))
+
+    return params, metrics, spikes
+
+
+def mergeBatchResults(dataFolder, batchLabel, include=['params', 'metrics'], filename=None, workers=None):
+    ''' merge params, metrics and (optionally) spikes of all jobs of batch into single .h5 file with one row per job, 
+    sorted by grid indices; jobs are loaded in pool of local processes'''
+    import os
+    import json
+    import glob
+    import multiprocessing
+    import numpy as np
+    import h5py
+    from ..sim.save import _saveH5Column, _saveH5Dataset
+
+    # param labels from batch file
+    with open(os.path.join(dataFolder, batchLabel + '_batch.json'), 'r') as fileObj:
+        paramLabels = [p['label'] for p in json.load(fileObj)['batch'].get('params', [])]
+
+    # jobs (simLabel = batchLabel + '_' + grid indices) sorted by grid indices
+    jobs = []
+    for cfgFile in glob.glob(os.path.join(dataFolder, batchLabel + '_*_cfg.json')):
+        simLabel = os.path.basename(cfgFile)[:-len('_cfg.json')]
+        indices = simLabel[len(batchLabel)+1:].split('_')
+        if all([index.isdigit() for index in indices]):
+            jobs.append((tuple(int(index) for index in indices), simLabel))
+    jobs.sort()
+    
+    print('Merging results of %d jobs in %s ...' % (len(jobs), dataFolder))
+    pool = multiprocessing.Pool(workers)
+    try:
+        results = pool.map(_loadJobResults, [(os.path.join(dataFolder, simLabel), paramLabels, 'spikes' in include) for _, simLabel in jobs], 
+                           chunksize=max(1, len(jobs) // (4 * (workers or multiprocessing.cpu_count()))))
+    finally:
+        pool.close()
+        pool.join()
+
+    filename = filename or os.path.join(dataFolder, batchLabel + '_results.h5')
+    with h5py.File(filename, 'w') as hf:
+        hf.attrs['batchLabel'] = batchLabel
+        hf.attrs['paramLabels'] = json.dumps(paramLabels)
+        hf.create_dataset('simLabel', data=np.array([simLabel for _, simLabel in jobs], dtype=object), dtype=h5py.special_dtype(vlen=str))
+        numIndices = max([len(indices) for indices, _ in jobs] + [0])
+        _saveH5Dataset(hf, 'index', np.array([list(indices) + [-1]*(numIndices-len(indices)) for indices, _ in jobs], dtype=np.int32).reshape(len(jobs), numIndices))
+
+        # one column per param and metric (labels joined with '.')
+        if 'params' in include:
+            group = hf.create_group('params')
+            for i, label in enumerate(paramLabels):
+                _saveH5Column(group, '.'.join([str(key) for key in label]) if isinstance(label, list) else str(label), [params[i] for params, _, _ in results])
+        if 'metrics' in include:
+            group = hf.create_group('metrics')
+            for key in sorted(set([key for _, metrics, _ in results for key in metrics])):
+                _saveH5Column(group, key.replace('/', '.'), [metrics.get(key) for _, metrics, _ in results])
+
+        # spikes of each job in CSR format (row = job)
+        if 'spikes' in include:
+            group = hf.create_group('spikes')
+            counts = [len(spikes[0]) if spikes else 0 for _, _, spikes in results]
+            spkt = np.concatenate([np.asarray(spikes[0], dtype=np.float64) for _, _, spikes in results if spikes] + [np.zeros(0)])
+            _saveH5Dataset(group, 'offsets', np.concatenate([[0], np.cumsum(counts)]).astype(np.int64))
+            _saveH5Dataset(group, 'spkt', spkt.astype(np.float32) if len(spkt) == 0 or spkt.max() <= 1e5 else spkt)
+            _saveH5Dataset(group, 'spkid', np.concatenate([np.asarray(spikes[1], dtype=np.int64) for _, _, spikes in results if spikes] + [np.zeros(0, dtype=np.int64)]).astype(np.int32))
+
+    print('  Saved results to %s' % (filename))
+    return filename
+
+
+def loadBatchResults(filename, spikes=False):
+    ''' load results merged with mergeBatchResults; returns dict with simLabel, index (grid indices), params and metrics 
+    (lists of values, one per job) and optionally spikes (spkt, spkid arrays of each job)'''
+    import json
+    import h5py
+    from ..sim.load import _loadH5Column, _h5Str
+
+    with h5py.File(filename, 'r') as hf:
+        results = {'batchLabel': _h5Str(hf.attrs['batchLabel']), 'paramLabels': json.loads(_h5Str(hf.attrs['paramLabels'])),
+                   'simLabel': [_h5Str(simLabel) for simLabel in hf['simLabel'][:]], 'index': hf['index'][:]}
+        for groupName in ['params', 'metrics']:
+            if groupName in hf:
+                results[groupName] = {name: _loadH5Column(hf[groupName], name) for name in hf[groupName] if name != '_categories'}
+        if spikes and 'spikes' in hf:
+            offsets, spkt, spkid = hf['spikes/offsets'][:], hf['spikes/spkt'][:], hf['spikes/spkid'][:]
+            results['spikes'] = [(spkt[offsets[i]:offsets[i+1]].astype(float), spkid[offsets[i]:offsets[i+1]]) for i in range(len(offsets)-1)]
+    return results
+
+
+def functionRef(function, option='function'):
+    ''' 'module:function' string of function to be set in cfg of jobs (saved with cfg and loaded by sim._loadFunction); 
+    functions that can't be imported by name in jobs (eg. lambdas, defined in batch script) raise ValueError'''
+    import importlib
+
+    if not callable(function):
+        return function
+    moduleName, functionName = getattr(function, '__module__', None), getattr(function, '__name__', None)
+    try:
+        if moduleName in [None, '__main__'] or getattr(importlib.import_module(moduleName), functionName) is not function:
+            raise ImportError
+    except (ImportError, AttributeError, TypeError):
+        raise ValueError("%s %r can't be imported by batch jobs; use 'module:function' or 'path/file.py:function'" % (option, function))
+    return moduleName + ':' + functionName
+
+
+# output files of job reused by jobs with same key (see reuseCachedJob)
+JOB_OUTPUT_EXTS = ['.json', '.json.idx', '.pkl', '.dpk', '.h5', '.mat', '_metrics.json', '_results.pkl']
+
+# output files the result (fitness or simData) of optimization jobs can be loaded from (see Batch.loadJobResult)
+JOB_RESULT_EXTS = ['_results.pkl', '.pkl', '.json']
+
+def jobKey(cfgString, files=[]):
+    ''' hash of resolved cfg (json string) and contents of files (eg. netParams, mod files)'''
+    import os
+    import hashlib
+
+    key = hashlib.sha256(cfgString.encode('utf-8'))
+    for filename in sorted(set(files)):
+        key.update(os.path.basename(filename).encode('utf-8'))
+        with open(filename, 'rb') as fileObj:
+            key.update(fileObj.read())
+    return key.hexdigest()
+
+
+def modFiles(folder='.'):
+    ''' mechanism sources (.mod files) in folder and folder/mod'''
+    import os
+    import glob
+
+    return glob.glob(os.path.join(folder, '*.mod')) + glob.glob(os.path.join(folder, 'mod', '*.mod'))
+
+
+def reuseCachedJob(cacheFolder, key, jobPath, requiredExts=None):
+    ''' if job with same key finished, link (or copy) its output files to jobPath and return True; if requiredExts, 
+    only reused if one of these outputs exists (eg. JOB_RESULT_EXTS for jobs of optimization methods)'''
+    import os
+    import json
+    import shutil
+
+    entryFile = os.path.join(cacheFolder, key + '.json')
+    if not os.path.isfile(entryFile):
+        return False
+    with open(entryFile, 'r') as fileObj:
+        cachedPath = json.load(fileObj)['jobPath']
+    
+    # outputs of cached job are only valid if saved (.hash written by job) by job with same key (not overwritten by job with different cfg)
+    try:
+        with open(cachedPath + '.hash', 'r') as fileObj:
+            if fileObj.read().strip() != key:
+                return False
+    except IOError:
+        return False
+    outputs = [ext for ext in JOB_OUTPUT_EXTS if os.path.isfile(cachedPath + ext)]
+    if not outputs or (requiredExts and not set(outputs) & set(requiredExts)):
+        return False
+
+    if os.path.abspath(cachedPath) != os.path.abspath(jobPath):
+        for ext in outputs + ['.hash']:
+            if os.path.lexists(jobPath + ext):
+                os.remove(jobPath + ext)
+            try:
+                os.link(cachedPath + ext, jobPath + ext)
+            except OSError:  # eg. different filesystem
+                shutil.copy2(cachedPath + ext, jobPath + ext)
+    return True
+
+
+def registerCachedJob(cacheFolder, key, jobPath):
+    ''' store path of job under key in cacheFolder and key of job in jobPath.hash.pending, renamed to jobPath.hash by 
+    sim.saveData once job outputs are saved; called when job is submitted, so outputs of a previous job at jobPath 
+    are removed (only complete outputs written by this job are reused)'''
+    import os
+    import json
+
+    if not os.path.exists(cacheFolder):
+        os.makedirs(cacheFolder)
+    for ext in JOB_OUTPUT_EXTS + ['.hash']:
+        if os.path.lexists(jobPath + ext):
+            os.remove(jobPath + ext)
+    with open(jobPath + '.hash.pending', 'w') as fileObj:
+        fileObj.write(key)
+    with open(os.path.join(cacheFolder, key + '.json'), 'w') as fileObj:
+        json.dump({'jobPath': os.path.abspath(jobPath)}, fileObj)
+
+
+def _gaussianProcess(X, y, lengthScales=[0.05, 0.1, 0.2, 0.5, 1.0], noise=1e-6):
+    ''' fit GP with RBF kernel (length scale with max marginal likelihood) to standardized y; return posterior function'''
+    import numpy as np
+
+    def kernel(A, B, lengthScale):
+        sqDist = np.sum(A**2, 1)[:, None] + np.sum(B**2, 1)[None, :] - 2 * np.dot(A, B.T)
+        return np.exp(-0.5 * np.maximum(sqDist, 0) / lengthScale**2)
+
+    best = None
+    for lengthScale in lengthScales:
+        K = kernel(X, X, lengthScale) + (noise + 1e-4) * np.eye(len(X))
+        try:
+            L = np.linalg.cholesky(K)
+        except np.linalg.LinAlgError:
+            continue
+        alpha = np.linalg.solve(L.T, np.linalg.solve(L, y))
+        logLikelihood = -0.5 * np.dot(y, alpha) - np.sum(np.log(np.diag(L)))
+        if best is None or logLikelihood > best[0]:
+            best = (logLikelihood, lengthScale, L, alpha)
+    _, lengthScale, L, alpha = best
+
+    def posterior(Xs):
+        Ks = kernel(X, Xs, lengthScale)
+        v = np.linalg.solve(L, Ks)
+        return np.dot(Ks.T, alpha), np.sqrt(np.maximum(1.0 - np.sum(v**2, 0), 1e-12))
+    return posterior
+
+
+def _parzenLogDensity(points, samples, prior=1.0):
+    ''' log density at samples of Parzen estimator (gaussian kernels at points, mixed with uniform prior in [0,1])'''
+    import numpy as np
+
+    n, d = points.shape
+    bandwidth = np.clip(np.std(points, 0) * n**(-1.0 / (d + 4)), 0.05, 1.0) if n > 1 else np.full(d, 0.5)
+    z = (samples[:, None, :] - points[None, :, :]) / bandwidth
+    logKernels = np.sum(-0.5 * z**2 - np.log(bandwidth * np.sqrt(2 * np.pi)), 2)
+    density = (np.sum(np.exp(logKernels), 1) + prior) / (n + prior)
+    return np.log(density + 1e-300)
+
+
+def proposeCandidate(X, y, rng, surrogate='gp', pending=[], numSamples=1000, gamma=0.25):
+    ''' next point in [0,1]^d to evaluate given evaluated points X and fitness y (lower is better)
+        - 'gp': max expected improvement of gaussian process (pending points set to worst fitness)
+        - 'tpe': max ratio of Parzen densities of best (gamma fraction) and remaining points'''
+    import numpy as np
+    from math import erf
+
+    X, y = np.atleast_2d(np.asarray(X, dtype=float)), np.asarray(y, dtype=float)
+    d = X.shape[1]
+    finite = np.isfinite(y)  # failed jobs (infinite default fitness) set to worst finite fitness
+    y = np.where(finite, y, np.max(y[finite]) if finite.any() else 0.0)
+
+    if surrogate == 'tpe':
+        numGood = max(1, int(np.ceil(gamma * len(y))))
+        order = np.argsort(y)
+        good, bad = X[order[:numGood]], X[order[numGood:]]
+        # samples from good density (random good point plus gaussian noise) and uniform
+        samples = good[rng.randint(len(good), size=numSamples)] + rng.normal(0, 0.1, (numSamples, d))
+        samples = np.clip(np.vstack([samples, rng.uniform(size=(numSamples // 10, d))]), 0, 1)
+        score = _parzenLogDensity(good, samples)
+        if len(bad) > 0:
+            score -= _parzenLogDensity(bad, samples)
+        return samples[np.argmax(score)]
+
+    elif surrogate == 'gp':
+        # pending points (jobs still running) set to worst fitness so proposals are spread out
+        if len(pending) > 0:
+            X = np.vstack([X, np.atleast_2d(pending)])
+            y = np.concatenate([y, np.full(len(pending), np.max(y))])
+        yStd = np.std(y) if np.std(y) > 0 else 1.0
+        yNorm = (y - np.mean(y)) / yStd
+        posterior = _gaussianProcess(X, yNorm)
+
+        # random samples plus local perturbations of best point
+        best = X[np.argmin(yNorm)]
+        samples = np.vstack([rng.uniform(size=(numSamples, d)), np.clip(best + rng.normal(0, 0.05, (numSamples // 4, d)), 0, 1)])
+        mu, sigma = posterior(samples)
+        improvement = np.min(yNorm) - mu - 0.01
+        z = improvement / sigma
+        cdf = 0.5 * (1 + np.array([erf(v / np.sqrt(2)) for v in z]))
+        pdf = np.exp(-0.5 * z**2) / np.sqrt(2 * np.pi)
+        expectedImprovement = improvement * cdf + sigma * pdf
+        return samples[np.argmax(expectedImprovement)]
+
+    else:
+        raise ValueError("%s is not a valid surrogate ('gp' or 'tpe')" % (surrogate))
+
+
+def hyperbandFidelities(fidelityParam, numRungs, eta, fidelityRange=None, value=None):
+    ''' fidelity of each rung (geometric range); default range up to value (eg. of cfg) from value/eta**(numRungs-1), 
+    or from coarser value*eta**(numRungs-1) if fidelityParam is 'dt' (low fidelity = larger time step)'''
+    if fidelityRange:
+        low, high = fidelityRange
+    else:
+        high = value
+        low = high * float(eta**(numRungs-1)) if fidelityParam == 'dt' else high / float(eta**(numRungs-1))
+    fidelities = [low * (high / float(low))**(rung / float(max(numRungs-1, 1))) for rung in range(numRungs)]
+    if isinstance(high, int):
+        fidelities = [int(round(f)) for f in fidelities]
+    return fidelities
+
+
+def hyperbandSchedule(numRungs, eta, hyperband=True, numCandidates=None):
+    ''' list of (bracket, rungs, number of candidates at each rung) of hyperband brackets, with more candidates at lower 
+    fidelity first (best 1/eta promoted to next rung); only bracket starting at rung 0 (successive halving) if not hyperband; 
+    numCandidates sets candidates of that bracket'''
+    import numpy as np
+
+    schedule = []
+    for bracket in (range(numRungs-1, -1, -1) if hyperband else [numRungs-1]):
+        rungCandidates = [int(np.ceil(numRungs / float(bracket+1) * eta**bracket))]
+        if bracket == numRungs-1 and numCandidates:
+            rungCandidates = [numCandidates]
+        for i in range(bracket):
+            rungCandidates.append(max(1, int(rungCandidates[-1] / eta)))
+        schedule.append((bracket, list(range(numRungs-1-bracket, numRungs)), rungCandidates))
+    return schedule
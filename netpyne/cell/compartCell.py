@@ -1286,20 +1286,26 @@ class CompartCell (Cell):
         self._segCoords['p0'] = p3dsoma + morphSegCoords['p0']
         self._segCoords['p1'] = p3dsoma + morphSegCoords['p1']
 
-    def setImembPtr(self): 
-        """Set PtrVector to point to the i_membrane_"""
-        jseg = 0
+    def setImembPtr(self, ptrVec=None, offset=None): 
+        """Set PtrVector to point to the i_membrane_ (by default PtrVector shared by all cells in node, starting at segment range of cell)"""
+        from .. import sim
+        if ptrVec is None: ptrVec = sim.net.imembPtr
+        if offset is None: offset = sim.net.recXElectrode.segRanges[self.gid][0]
+        jseg = offset
         for sec in list(self.secs.values()):
             hSec = sec['hObj']
             for iseg, seg in enumerate(hSec):
-                self.imembPtr.pset(jseg, seg._ref_i_membrane_)  # notice the underscore at the end (in nA)
+                ptrVec.pset(jseg, seg._ref_i_membrane_)  # notice the underscore at the end (in nA)
                 jseg += 1
+        return jseg
                 
 
     def getImemb(self):
-        """Gather membrane currents from PtrVector into imVec (does not need a loop!)"""
-        self.imembPtr.gather(self.imembVec)
-        return self.imembVec.as_numpy()  # (nA)
+        """Gather membrane currents of node from PtrVector and return those of cell segments (does not need a loop!)"""
+        from .. import sim
+        segStart, segEnd = sim.net.recXElectrode.segRanges[self.gid]
+        sim.net.imembPtr.gather(sim.net.imembVec)
+        return sim.net.imembVec.as_numpy()[segStart:segEnd]  # (nA)
 
 
     def updateShape(self):
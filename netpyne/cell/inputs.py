@@ -22,6 +22,8 @@ except NameError:
 from neuron import h
 import numpy as np
 
+_spkTimesFiles = {}  # spike time files open while creating cells (each file opened once per node; see closeSpkTimesFiles)
+
 def createRhythmicPattern(params, rand):
     ''' creates the ongoing external inputs (rhythmic)
     input params:
@@ -182,3 +184,50 @@ def createGaussPattern(params, rand):
     val_gauss = np.sort(val_gauss)
     
     return val_gauss
+
+
+def loadSpkTimesFromFile(filename, gid, tstop):
+    ''' loads the spike times of a single cell from a file with precomputed spike trains
+    stored in CSR format, so only the requested row is read from disk
+    input params:
+    - filename: HDF5 file (.h5/.hdf5) with 'offsets' and 'times' datasets, or .npy file with spike times
+      and a '<name>_offsets.npy' file with offsets in the same folder
+    - gid: cell gid used as row index (spike times of gid are times[offsets[gid]:offsets[gid+1]])
+    - tstop: only spike times <= tstop are returned (ms)
+    '''
+    import os
+
+    # failures cached (as None) so the error is only printed once per file
+    if filename not in _spkTimesFiles:
+        _spkTimesFiles[filename] = None
+        ext = os.path.splitext(filename)[1]
+        try:
+            if ext in ['.h5', '.hdf5']:
+                import h5py
+                fileObj = h5py.File(filename, 'r')
+                _spkTimesFiles[filename] = (fileObj['offsets'][:], fileObj['times'], fileObj)
+            elif ext == '.npy':
+                offsetsFilename = filename[:-len(ext)] + '_offsets.npy'
+                _spkTimesFiles[filename] = (np.load(offsetsFilename), np.load(filename, mmap_mode='r'), None)
+            else:
+                print('\nError: VecStim "spkTimesFile" format not recognized for file %s' % (filename))
+        except Exception as e:
+            print('\nError: could not read VecStim "spkTimesFile" %s: %s' % (filename, e))
+
+    if _spkTimesFiles[filename] is None:
+        return None
+    offsets, times, fileObj = _spkTimesFiles[filename]
+    if gid + 1 >= len(offsets):
+        print('  Warning: gid %d not in VecStim "spkTimesFile" %s (%d rows); no spikes' % (gid, filename, max(len(offsets)-1, 0)))
+        return np.array([])
+
+    spkTimes = np.array(times[int(offsets[gid]):int(offsets[gid+1])], dtype=float)  # copy so file data is not modified
+    return spkTimes[:np.searchsorted(spkTimes, tstop, side='right')]  # spike times of each cell are sorted
+
+
+def closeSpkTimesFiles():
+    ''' closes spike time files opened by loadSpkTimesFromFile (called once cells of node are created and by sim.clearAll)'''
+    for spkTimesFile in _spkTimesFiles.values():
+        if spkTimesFile is not None and spkTimesFile[2] is not None:
+            spkTimesFile[2].close()
+    _spkTimesFiles.clear()
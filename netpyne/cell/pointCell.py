@@ -190,6 +190,14 @@ class PointCell (Cell):
                 
                 vec = h.Vector(len(spkTimes))
 
+            # if spkTimesFile, load only the spike times of this cell within the simulated time window
+            elif 'spkTimesFile' in self.params:
+                from .inputs import loadSpkTimesFromFile
+                spkTimes = loadSpkTimesFromFile(self.params['spkTimesFile'], self.gid, sim.cfg.duration)
+                if spkTimes is None:
+                    return
+                vec = h.Vector(len(spkTimes))
+
             # if spkTimess
             elif 'spkTimes' in self.params:
                 spkTimes = self.params['spkTimes']
@@ -210,7 +218,7 @@ class PointCell (Cell):
             
             # missing params
             else:
-                print('\nError: VecStim requires interval, rate or spkTimes')
+                print('\nError: VecStim requires interval, rate, spkTimes or spkTimesFile')
                 return
 
             # pulse list: start, end, rate, noise
@@ -1253,7 +1253,7 @@ metadata = {
             },
             "saveHDF5": {
                 "label": "Save as HDF5",
-                "help": "Save data to save to HDF5 file (under development) (default: False).",
+                "help": "Save data to HDF5 (.h5) file using h5py, with compressed columnar cell tags and connections in CSR format; cell sections are recreated from cellParams rules when loading (default: False).",
                 "suggestions": "",
                 "type": "bool"
             },
@@ -1263,6 +1263,66 @@ metadata = {
                 "suggestions": "",
                 "type": "bool"
             },
+            "saveDpkCodec": {
+                "label": "DPK compression codec",
+                "help": "Compression codec used for .dpk file: 'gzip' (single stream), or 'zlib', 'lz4' or 'zstd' (blocks compressed in parallel threads; lz4/zstd fall back to zlib if module not installed) (default: 'gzip').",
+                "suggestions": ["gzip", "zlib", "lz4", "zstd"],
+                "type": "str"
+            },
+            "saveDpkLevel": {
+                "label": "DPK compression level",
+                "help": "Compression level used for .dpk file; None uses codec default (default: None).",
+                "suggestions": "",
+                "type": "int"
+            },
+            "saveDpkThreads": {
+                "label": "DPK compression threads",
+                "help": "Number of threads used to compress .dpk blocks; None uses number of cpus (default: None).",
+                "suggestions": "",
+                "type": "int"
+            },
+            "saveDistributed": {
+                "label": "Save data of each node without gathering",
+                "help": "Skip gathering; each node saves its cells and recorded data to a separate file in folder '<filename>_shards', and rank 0 saves a manifest.json with gid ranges and offsets. The folder can be loaded with sim.loadAll. If saveHDF5 is also set, all nodes write to a single .h5 file instead. Not supported by batch optimization methods, since jobs send their fitness after gathering (default: False).",
+                "suggestions": "",
+                "type": "bool"
+            },
+            "resultsReducer": {
+                "label": "Function to reduce simData to metrics",
+                "help": "Function or 'module:function' (module can be path to .py file) called after gathering with the gathered simData, returning compact metrics (eg. dict of rates) saved to '<filename>_metrics.json'. If gather is skipped (saveDistributed), called in each node with its simData and the list of metrics of nodes is combined with resultsCombiner (default: None).",
+                "suggestions": "",
+                "type": "str"
+            },
+            "resultsCombiner": {
+                "label": "Function to combine metrics of nodes",
+                "help": "Function or 'module:function' (module can be path to .py file) called in rank 0 with the list of metrics returned by resultsReducer in each node if gather is skipped (saveDistributed), returning the combined metrics; if not set the list of node metrics is saved unchanged (default: None).",
+                "suggestions": "",
+                "type": "str"
+            },
+            "resultsAddress": {
+                "label": "Address to send results to",
+                "help": "Address ('host:port') to send fitness (evaluated with resultsFitnessFunc) or gathered simData to after the simulation (set by evolutionary batch to receive results without polling output files); if address not reachable, result is saved to '<saveFolder>/<simLabel>_results.pkl' (default: None).",
+                "suggestions": "",
+                "type": "str"
+            },
+            "resultsFitnessFunc": {
+                "label": "Fitness function evaluated by job",
+                "help": "'module:function' (module can be path to .py file) called with the gathered simData and resultsFitnessFuncArgs; only the returned fitness is sent to resultsAddress instead of simData (set by evolutionary batch from fitnessFunc unless 'sendSimData' is True) (default: None).",
+                "suggestions": "",
+                "type": "str"
+            },
+            "resultsFitnessFuncArgs": {
+                "label": "Arguments of fitness function evaluated by job",
+                "help": "Dictionary of keyword arguments passed to resultsFitnessFunc (set by evolutionary batch from fitnessFuncArgs) (default: {}).",
+                "suggestions": "",
+                "type": "dict"
+            },
+            "resultsAuthKey": {
+                "label": "Key to authenticate results connection",
+                "help": "Hex key used to authenticate the connection to resultsAddress (random key set by batch) (default: None).",
+                "suggestions": "",
+                "type": "str"
+            },
             "checkErrors": {
                 "label": "Check parameter errors",
                 "help": "check for errors (default: False).",
@@ -1335,6 +1395,20 @@ metadata = {
                 "suggestions": "",
                 "type": "bool"
             },
+            "recordLFPWindow": {
+                "label": "Number of LFP recording steps per window",
+                "help": "Number of recording steps buffered before calculating the LFP with a single matrix product; larger values reduce overhead but require more memory (default: 1).",
+                "suggestions": "",
+                "default": "1",
+                "type": "int"
+            },
+            "recordLFPSparseTol": {
+                "label": "Tolerance to store LFP transfer resistances as sparse matrix",
+                "help": "Transfer resistances below this fraction of the maximum value are dropped and stored in a sparse matrix; 0 keeps a dense matrix (default: 0).",
+                "suggestions": "",
+                "default": "0",
+                "type": "float"
+            },
             "recordStep": {
                 "label": "Time step for data recording (ms)",
                 "help": "Step size in ms for data recording (default: 0.1).",
@@ -1348,6 +1422,18 @@ metadata = {
                 "suggestions": "",
                 "type": "float"
             },
+            "earlyStopFunc": {
+                "label": "Early stop function",
+                "help": "Function or 'module:function' called with simData of each node and time every earlyStopInterval; simulation stopped if it returns True in any node (default: None).",
+                "suggestions": "",
+                "type": "str"
+            },
+            "earlyStopInterval": {
+                "label": "Early stop interval (ms)",
+                "help": "Interval (in ms) to call earlyStopFunc (default: 100).",
+                "suggestions": "",
+                "type": "float"
+            },
             "printSynsAfterRule": {
                 "label": "Print total connections",
                 "help": "Print total connections after each conn rule is applied.",
@@ -1378,6 +1464,24 @@ metadata = {
                 "suggestions": "",
                 "type": "bool"
             },
+            "gatherInclude": {
+                "label": "Cells to gather",
+                "help": "List of cells to gather from each node, eg. ['allCells'] or list of pop labels and/or gids. Cells and recorded data are selected in each node before gathering (default: ['allCells']).",
+                "suggestions": "",
+                "type": "list"
+            },
+            "gatherTimeRange": {
+                "label": "Time range to gather",
+                "help": "Time range [start, end] in ms of spikes, traces and LFP to gather; data is selected in each node before gathering (default: None, ie. full simulation).",
+                "suggestions": "",
+                "type": "list(float)"
+            },
+            "gatherFloat32": {
+                "label": "Gather traces and LFP as float32",
+                "help": "Store gathered traces and LFP as float32 numpy arrays to halve memory and file size; spike times are always float64 (default: False).",
+                "suggestions": "",
+                "type": "bool"
+            },
             "createPyStruct": {
                 "label": "Create Python structure",
                 "help": "Create Python structure (simulator-independent) when instantiating network (default: True).",
@@ -67,6 +67,7 @@ class Network (object):
     # -----------------------------------------------------------------------------
     def createCells (self):
         from .. import sim
+        from ..cell.inputs import closeSpkTimesFiles
 
         sim.pc.barrier()
         sim.timing('start', 'createTime')
@@ -78,6 +79,7 @@ class Network (object):
             self.cells.extend(newCells)  # add to list of cells
             sim.pc.barrier()
             if sim.rank==0 and sim.cfg.verbose: print(('Instantiated %d cells of population %s'%(len(newCells), ipop.tags['pop'])))  
+        closeSpkTimesFiles()  # spike times of VecStims of this node already read
 
         if self.params.defineCellShapes: self.defineCellShapes()
   
@@ -32,13 +32,13 @@ from .setup import initialize, setNet, setNetParams, setSimCfg, createParallelCo
 	readCmdLineArgs, setupRecording, setupRecordLFP, setGlobals
 
 # import run functions
-from .run import preRun, runSim, runSimWithIntervalFunc, loadBalance, calculateLFP
+from .run import preRun, runSim, runSimWithIntervalFunc, earlyStop, loadBalance, calculateLFP
 
 # import gather functions
 from .gather import gatherData, _gatherAllCellTags, _gatherAllCellConnPreGids, _gatherCells, fileGather
 
 # import saving functions
-from .save import saveJSON, saveData, distributedSaveHDF5, compactConnFormat, intervalSave, saveInNode
+from .save import saveJSON, saveH5, saveDpk, saveData, distributedSaveHDF5, distributedSave, sendSimData, reduceResults, compactConnFormat, intervalSave, saveInNode
 
 # import loading functions
 from .load import loadSimCfg, loadNetParams, loadNet, loadSimData, loadAll, loadHDF5, ijsonLoad
@@ -11,6 +11,10 @@ from __future__ import unicode_literals
 from __future__ import absolute_import
 
 from builtins import zip
+try:
+    basestring
+except NameError:
+    basestring = str
 from future import standard_library
 standard_library.install_aliases()
 import numpy as np
@@ -23,6 +27,15 @@ from ..specs import Dict, ODict
 def gatherData (gatherLFP = True):
     from .. import sim
         
+    # skip gather; each node saves its own data (see sim.distributedSave)
+    if getattr(sim.cfg, 'saveDistributed', False):
+        if sim.rank==0:
+            print('\nSkipping gather (cfg.saveDistributed); data will be saved by each node')
+        if getattr(sim.cfg, 'resultsReducer', None):
+            sim.reduceResults(local=True)
+        sim.allSimData = Dict()  # not gathered (analysis functions skipped; see plotData)
+        return
+
     sim.timing('start', 'gatherTime')
     ## Pack data from all hosts
     if sim.rank==0:
@@ -47,11 +60,14 @@ def gatherData (gatherLFP = True):
     if gatherLFP and sim.cfg.recordLFP and hasattr(sim.net, 'compartCells') and sim.cfg.createNEURONObj:
         for cell in sim.net.compartCells:
             try:
-                del cell.imembVec
-                del cell.imembPtr
                 del cell._segCoords
             except:
                 pass
+        for attr in ['imembVec', 'imembPtr', 'imembBuffer', 'imembBufferSteps']:
+            try:
+                delattr(sim.net, attr)
+            except:
+                pass
         for pop in list(sim.net.pops.values()):
             try:
                 del pop._morphSegCoords
@@ -60,63 +76,33 @@ def gatherData (gatherLFP = True):
     simDataVecs = ['spkt', 'spkid', 'stims'] + list(sim.cfg.recordTraces.keys())
     if sim.cfg.recordDipoles: simDataVecs.append('dipole')
     singleNodeVecs = ['t']
+    # cells to gather (cfg.gatherInclude)
+    gatherGids, _ = _gatherSelection()
+    gatherCells = [cell for cell in sim.net.cells if gatherGids is None or cell.gid in gatherGids]
+    numGatherCells = int(sim.pc.allreduce(len(gatherCells), 1))  # in all nodes (allCells only has cells of rank 0 if gatherOnlySimData)
+
     if sim.nhosts > 1:  # only gather if >1 nodes
-        netPopsCellGids = {popLabel: list(pop.cellGids) for popLabel,pop in sim.net.pops.items()}
+        netPopsCellGids = {popLabel: [gid for gid in pop.cellGids if gatherGids is None or gid in gatherGids] for popLabel,pop in sim.net.pops.items()}
 
         # gather only sim data
         if getattr(sim.cfg, 'gatherOnlySimData', False):
-            nodeData = {'simData': sim.simData}
-            data = [None]*sim.nhosts
-            data[0] = {}
-            for k,v in nodeData.items():
-                data[0][k] = v
-            gather = sim.pc.py_alltoall(data)
-            sim.pc.barrier()
+            nodesSimData = _gatherSimData(simDataVecs, singleNodeVecs)
+            gather, data = [], []
 
             if sim.rank == 0: # simData
                 print('  Gathering only sim data...')
-                sim.allSimData = Dict()
-                for k in list(gather[0]['simData'].keys()):  # initialize all keys of allSimData dict
-                    if gatherLFP and k == 'LFP':
-                        sim.allSimData[k] = np.zeros((gather[0]['simData']['LFP'].shape))
-                    else:
-                        sim.allSimData[k] = {}
-
-                for key in singleNodeVecs: # store single node vectors (eg. 't')
-                    sim.allSimData[key] = list(nodeData['simData'][key])
-
-                # fill in allSimData taking into account if data is dict of h.Vector (code needs improvement to be more generic)
-                for node in gather:  # concatenate data from each node
-                    for key,val in node['simData'].items():  # update simData dics of dics of h.Vector
-                        if key in simDataVecs:          # simData dicts that contain Vectors
-                            if isinstance(val, dict):
-                                for cell,val2 in val.items():
-                                    if isinstance(val2,dict):
-                                        sim.allSimData[key].update(Dict({cell:Dict()}))
-                                        for stim,val3 in val2.items():
-                                            sim.allSimData[key][cell].update({stim:list(val3)}) # udpate simData dicts which are dicts of dicts of Vectors (eg. ['stim']['cell_1']['backgrounsd']=h.Vector)
-                                    else:
-                                        sim.allSimData[key].update({cell:list(val2)})  # udpate simData dicts which are dicts of Vectors (eg. ['v']['cell_1']=h.Vector)
-                            else:
-                                sim.allSimData[key] = list(sim.allSimData[key])+list(val) # udpate simData dicts which are Vectors
-                        elif gatherLFP and key == 'LFP':
-                            sim.allSimData[key] += np.array(val)
-                        elif key not in singleNodeVecs:
-                            sim.allSimData[key].update(val)           # update simData dicts which are not Vectors
-    
-                
-                if len(sim.allSimData['spkt']) > 0:
-                    sim.allSimData['spkt'], sim.allSimData['spkid'] = zip(*sorted(zip(sim.allSimData['spkt'], sim.allSimData['spkid']))) # sort spks
-                    sim.allSimData['spkt'], sim.allSimData['spkid'] = list(sim.allSimData['spkt']), list(sim.allSimData['spkid'])
+                sim.allSimData = _mergeSimData(nodesSimData, simDataVecs, singleNodeVecs, gatherLFP)
 
                 sim.net.allPops = ODict() # pops
                 for popLabel,pop in sim.net.pops.items(): sim.net.allPops[popLabel] = pop.__getstate__() # can't use dict comprehension for OrderedDict
+                for popLabel,pop in sim.net.allPops.items(): pop['cellGids'] = netPopsCellGids[popLabel]
 
-                sim.net.allCells = [c.__dict__ for c in sim.net.cells]
+                sim.net.allCells = [c.__dict__ for c in gatherCells]
 
         # gather cells, pops and sim data
         else:
-            nodeData = {'netCells': [c.__getstate__() for c in sim.net.cells], 'netPopsCellGids': netPopsCellGids, 'simData': sim.simData}
+            nodesSimData = _gatherSimData(simDataVecs, singleNodeVecs)
+            nodeData = {'netCells': [c.__getstate__() for c in gatherCells], 'netPopsCellGids': netPopsCellGids}
             data = [None]*sim.nhosts
             data[0] = {}
             for k,v in nodeData.items():
@@ -130,43 +116,14 @@ def gatherData (gatherLFP = True):
                 allPops = ODict()
                 for popLabel,pop in sim.net.pops.items(): allPops[popLabel] = pop.__getstate__() # can't use dict comprehension for OrderedDict
                 allPopsCellGids = {popLabel: [] for popLabel in netPopsCellGids}
-                sim.allSimData = Dict()
-
-                for k in list(gather[0]['simData'].keys()):  # initialize all keys of allSimData dict
-                    if gatherLFP and k == 'LFP':
-                        sim.allSimData[k] = np.zeros((gather[0]['simData']['LFP'].shape))
-                    else:
-                        sim.allSimData[k] = {}
 
-                for key in singleNodeVecs:  # store single node vectors (eg. 't')
-                    sim.allSimData[key] = list(nodeData['simData'][key])
-
-                # fill in allSimData taking into account if data is dict of h.Vector (code needs improvement to be more generic)
-                for node in gather:  # concatenate data from each node
+                # concatenate cells and pop gids from each node
+                for node in gather:
                     allCells.extend(node['netCells'])  # extend allCells list
                     for popLabel,popCellGids in node['netPopsCellGids'].items():
                         allPopsCellGids[popLabel].extend(popCellGids)
 
-                    for key,val in node['simData'].items():  # update simData dics of dics of h.Vector
-                        if key in simDataVecs:          # simData dicts that contain Vectors
-                            if isinstance(val,dict):
-                                for cell,val2 in val.items():
-                                    if isinstance(val2,dict):
-                                        sim.allSimData[key].update(Dict({cell:Dict()}))
-                                        for stim,val3 in val2.items():
-                                            sim.allSimData[key][cell].update({stim:list(val3)}) # udpate simData dicts which are dicts of dicts of Vectors (eg. ['stim']['cell_1']['backgrounsd']=h.Vector)
-                                    else:
-                                        sim.allSimData[key].update({cell:list(val2)})  # udpate simData dicts which are dicts of Vectors (eg. ['v']['cell_1']=h.Vector)
-                            else:
-                                sim.allSimData[key] = list(sim.allSimData[key])+list(val) # udpate simData dicts which are Vectors
-                        elif gatherLFP and key == 'LFP':
-                            sim.allSimData[key] += np.array(val)
-                        elif key not in singleNodeVecs:
-                            sim.allSimData[key].update(val)           # update simData dicts which are not Vectors
-
-                if len(sim.allSimData['spkt']) > 0:
-                    sim.allSimData['spkt'], sim.allSimData['spkid'] = zip(*sorted(zip(sim.allSimData['spkt'], sim.allSimData['spkid']))) # sort spks
-                    sim.allSimData['spkt'], sim.allSimData['spkid'] = list(sim.allSimData['spkt']), list(sim.allSimData['spkid'])
+                sim.allSimData = _mergeSimData(nodesSimData, simDataVecs, singleNodeVecs, gatherLFP)
 
                 sim.net.allCells =  sorted(allCells, key=lambda k: k['gid'])
 
@@ -187,28 +144,15 @@ def gatherData (gatherLFP = True):
 
     else:  # if single node, save data in same format as for multiple nodes for consistency
         if sim.cfg.createNEURONObj:
-            sim.net.allCells = [Dict(c.__getstate__()) for c in sim.net.cells]
+            sim.net.allCells = [Dict(c.__getstate__()) for c in gatherCells]
         else:
-            sim.net.allCells = [c.__dict__ for c in sim.net.cells]
+            sim.net.allCells = [c.__dict__ for c in gatherCells]
         sim.net.allPops = ODict()
         for popLabel,pop in sim.net.pops.items(): sim.net.allPops[popLabel] = pop.__getstate__() # can't use dict comprehension for OrderedDict
-        sim.allSimData = Dict()
-        for k in list(sim.simData.keys()):  # initialize all keys of allSimData dict
-            sim.allSimData[k] = Dict()
-        for key,val in sim.simData.items():  # update simData dics of dics of h.Vector
-                if key in simDataVecs+singleNodeVecs:          # simData dicts that contain Vectors
-                    if isinstance(val,dict):
-                        for cell,val2 in val.items():
-                            if isinstance(val2,dict):
-                                sim.allSimData[key].update(Dict({cell:Dict()}))
-                                for stim,val3 in val2.items():
-                                    sim.allSimData[key][cell].update({stim:list(val3)}) # udpate simData dicts which are dicts of dicts of Vectors (eg. ['stim']['cell_1']['backgrounsd']=h.Vector)
-                            else:
-                                sim.allSimData[key].update({cell:list(val2)})  # udpate simData dicts which are dicts of Vectors (eg. ['v']['cell_1']=h.Vector)
-                    else:
-                        sim.allSimData[key] = list(sim.allSimData[key])+list(val) # udpate simData dicts which are Vectors
-                else:
-                    sim.allSimData[key] = val           # update simData dicts which are not Vectors
+        if gatherGids is not None:
+            for pop in sim.net.allPops.values():
+                pop['cellGids'] = [gid for gid in pop['cellGids'] if gid in gatherGids]
+        sim.allSimData = _mergeSimData([_filterSimData(sim.simData, simDataVecs, singleNodeVecs)], simDataVecs, singleNodeVecs)
     
     ## Print statistics
     sim.pc.barrier()
@@ -227,10 +171,10 @@ def gatherData (gatherLFP = True):
                 sim.totalConnections = sum([len(set([conn['preGid'] for conn in cell['conns']])) for cell in sim.net.allCells])
         else:
             sim.totalConnections = sim.totalSynapses
-        sim.numCells = len(sim.net.allCells)
+        sim.numCells = numGatherCells
 
         if sim.totalSpikes > 0:
-            sim.firingRate = float(sim.totalSpikes)/sim.numCells/sim.cfg.duration*1e3 # Calculate firing rate
+            sim.firingRate = float(sim.totalSpikes)/sim.numCells/_gatherDuration()*1e3 # Calculate firing rate
         else:
             sim.firingRate = 0
         if sim.numCells > 0:
@@ -253,46 +197,267 @@ def gatherData (gatherLFP = True):
             print(('  Run time: %0.2f s' % (sim.timingData['runTime'])))
 
             sim.allSimData['avgRate'] = sim.firingRate  # save firing rate
+            if getattr(sim, 'earlyStopTime', None) is not None:
+                sim.allSimData['earlyStop'] = sim.earlyStopTime  # time when stopped by cfg.earlyStopFunc
+
+        if getattr(sim.cfg, 'resultsReducer', None):
+            sim.reduceResults()
+
+        if getattr(sim.cfg, 'resultsAddress', None): 
+            sim.sendSimData()
 
         return sim.allSimData
 
 
 #------------------------------------------------------------------------------
-#  Gathers simData from filess
+# Convert recorded h.Vector to numpy array 
 #------------------------------------------------------------------------------
-def fileGather (gatherLFP = True):
-    import os, pickle
+def _toArray (vec, dtype=np.float64, copy=True):
+    if hasattr(vec, 'as_numpy'):
+        # view of h.Vector memory, which is reallocated when the vector grows or is resized (eg. recording continues, 
+        # intervalSave); copied unless a copy is made afterwards anyway (eg. concatenated spikes)
+        return np.array(vec.as_numpy(), dtype=dtype) if copy else np.asarray(vec.as_numpy(), dtype=dtype)
+    return np.asarray(vec, dtype=dtype)  # no copy if already array of same type (eg. views of gathered buffer)
+
+
+#------------------------------------------------------------------------------
+# Gather h.Vector from all nodes to master using typed MPI collective (no pickling)
+#------------------------------------------------------------------------------
+def _gatherVector (vec):
     from .. import sim
-    
-    sim.timing('start', 'gatherTime')
+    from neuron import h
+
+    # number of values sent from each node (all sent to node 0)
+    sizes = h.Vector()
+    cnts = h.Vector(sim.nhosts)
+    cnts.x[0] = 1
+    sim.pc.alltoall(h.Vector(1, vec.size()), cnts, sizes)
+
+    # values (concatenated in rank order in node 0)
+    dest = h.Vector()
+    cnts.x[0] = vec.size()
+    sim.pc.alltoall(vec, cnts, dest)
 
-    # iterate through the saved files and concat their data
-    fileData = Dict()
     if sim.rank == 0:
-        for f in os.listdir('temp'):
-            with open('temp/' + f, 'rb') as data:
-                temp = pickle.load(data)
-                for k in temp.keys():
-                    if k in fileData:
-                        if isinstance(temp[k], list):
-                            fileData[k] = fileData[k] + temp[k]
-                        elif isinstance(temp[k], dict):
-                            fileData[k].update(temp[k])
-                    else:
-                        fileData[k] = temp[k] 
+        offsets = np.cumsum([0] + [int(n) for n in sizes])
+        values = np.array(dest.as_numpy())
+        return [values[offsets[i]:offsets[i+1]] for i in range(sim.nhosts)]
+
+
+#------------------------------------------------------------------------------
+# Gids and time range to gather (cfg.gatherInclude and cfg.gatherTimeRange; None = all)
+#------------------------------------------------------------------------------
+def _gatherSelection (allNodes = False):
+    from .. import sim
+
+    include = getattr(sim.cfg, 'gatherInclude', ['allCells'])
+    if include is None or 'all' in include or 'allCells' in include:
+        gids = None
+    else:
+        gids = set([cell.gid for cell in sim.net.cells if cell.gid in include or cell.tags.get('pop') in include])
+        if allNodes and sim.nhosts > 1:  # selected gids of all nodes (eg. to filter data merged in rank 0; must be called by all nodes)
+            gids = set().union(*sim.pc.py_alltoall([gids]*sim.nhosts))
+            sim.pc.barrier()
+    timeRange = getattr(sim.cfg, 'gatherTimeRange', None)
+    return gids, timeRange
+
+
+#------------------------------------------------------------------------------
+# Duration of gathered data (ms; cfg.gatherTimeRange)
+#------------------------------------------------------------------------------
+def _gatherDuration ():
+    from .. import sim
+
+    timeRange = getattr(sim.cfg, 'gatherTimeRange', None)
+    return min(timeRange[1], sim.cfg.duration) - timeRange[0] if timeRange else sim.cfg.duration
+
 
+#------------------------------------------------------------------------------
+# Select recorded data of gathered cells and time range in this node (before communication)
+#------------------------------------------------------------------------------
+def _filterSimData (simData, simDataVecs, singleNodeVecs, selection = None):
+    from .. import sim
+
+    gids, timeRange = selection or _gatherSelection()
+    if gids is None and timeRange is None:
+        return simData
+
+    def _asArray(vec):
+        return vec.as_numpy() if hasattr(vec, 'as_numpy') else np.asarray(vec)
     
-    simDataVecs = ['spkt','spkid','stims']+list(sim.cfg.recordTraces.keys())
-    singleNodeVecs = ['t']
+    def _includeCell(cellKey):  # traces and stims keys are 'cell_<gid>'; LFPCells keys are gids
+        if gids is None: return True
+        gid = int(cellKey.split('_')[-1]) if isinstance(cellKey, basestring) else cellKey
+        return gid in gids
+
+    # index range of traces recorded every cfg.recordStep (LFP rows shifted by one step)
+    from .load import _timeRangeSteps
+    steps = _timeRangeSteps(timeRange, sim.cfg.recordStep)
+    lfpSteps = _timeRangeSteps(timeRange, sim.cfg.recordStep, lfp=True)
+
+    filtered = Dict()
+    for key, val in simData.items():
+        if key == 'spkt':
+            spkt, spkid = _asArray(simData['spkt']), _asArray(simData['spkid'])
+            mask = np.ones(len(spkt), dtype=bool)
+            if gids is not None: mask &= np.isin(spkid, list(gids))
+            if timeRange: mask &= (spkt >= timeRange[0]) & (spkt <= timeRange[1])
+            filtered['spkt'], filtered['spkid'] = spkt[mask], spkid[mask]
+        elif key == 'spkid':
+            continue
+        elif key == 'stims':  # spike times of stims of each cell
+            filtered[key] = Dict()
+            for cellKey, stims in val.items():
+                if _includeCell(cellKey):
+                    filtered[key][cellKey] = Dict()
+                    for stimLabel, vec in stims.items():
+                        times = _asArray(vec)
+                        if timeRange: times = times[(times >= timeRange[0]) & (times <= timeRange[1])]
+                        filtered[key][cellKey][stimLabel] = times
+        elif key in simDataVecs or key == 'LFPCells':  # traces of each cell
+            keySteps = lfpSteps if key == 'LFPCells' else steps
+            if isinstance(val, dict):
+                filtered[key] = Dict()
+                for cellKey, trace in val.items():
+                    if _includeCell(cellKey):
+                        if isinstance(trace, dict):  # eg. traces of multiple sections
+                            filtered[key][cellKey] = Dict({k: _asArray(v)[keySteps] for k, v in trace.items()})
+                        else:
+                            filtered[key][cellKey] = _asArray(trace)[keySteps]
+            else:
+                filtered[key] = _asArray(val)[keySteps]
+        elif key in singleNodeVecs or key == 'LFP':
+            filtered[key] = _asArray(val)[lfpSteps if key == 'LFP' else steps]
+        else:
+            filtered[key] = val
+    
+    return filtered
+
 
+#------------------------------------------------------------------------------
+# Gather simData from all nodes; spikes and traces sent as single packed float64 buffer per node
+#------------------------------------------------------------------------------
+def _gatherSimData (simDataVecs, singleNodeVecs):
+    from .. import sim
+    from neuron import h
+
+    def _iterVectors(data, path):
+        if isinstance(data, dict):
+            if len(data) == 0:
+                yield path, None  # keep empty dicts (eg. cell without stims)
+            for k, v in data.items():
+                for item in _iterVectors(v, path + (k,)):
+                    yield item
+        else:
+            yield path, data
+
+    # pack all vectors of this node in single buffer; only keys and sizes are pickled
+    simData = _filterSimData(sim.simData, simDataVecs, singleNodeVecs)
+    buffer = h.Vector()
+    vecPaths = []
+    for key in simDataVecs + singleNodeVecs:
+        if key in simData:
+            for path, vec in _iterVectors(simData[key], (key,)):
+                if vec is None:
+                    vecPaths.append((path, None))
+                else:
+                    vecPaths.append((path, len(vec)))
+                    buffer.append(vec if hasattr(vec, 'as_numpy') else h.Vector(vec))  # filtered data are numpy arrays
+    nodeSimData = {k: v for k, v in simData.items() if k not in simDataVecs + singleNodeVecs}  # eg. LFP
+    nodeSimData['_vecPaths'] = vecPaths
+
+    data = [None]*sim.nhosts
+    data[0] = nodeSimData
+    gather = sim.pc.py_alltoall(data)
+    buffers = _gatherVector(buffer)
+    sim.pc.barrier()
+    
     if sim.rank == 0:
-        sim.allSimData = Dict()
-        sim.allSimData.update(fileData)
+        # unpack buffer of each node into dicts of arrays (views of buffer; no copy)
+        nodesSimData = []
+        for nodeSimData, nodeBuffer in zip(gather, buffers):
+            offset = 0
+            for path, size in nodeSimData.pop('_vecPaths'):
+                d = nodeSimData
+                for k in path[:-1]:
+                    d = d.setdefault(k, Dict())
+                if size is None:
+                    d.setdefault(path[-1], Dict())
+                else:
+                    d[path[-1]] = nodeBuffer[offset:offset+size]
+                    offset += size
+            nodesSimData.append(nodeSimData)
+        return nodesSimData
+
+
+#------------------------------------------------------------------------------
+# Merge simData from each node into a single dict of numpy arrays
+#------------------------------------------------------------------------------
+def _mergeSimData (nodesSimData, simDataVecs, singleNodeVecs, gatherLFP=True):
+    from .. import sim
+
+    dtype = np.float32 if getattr(sim.cfg, 'gatherFloat32', False) else np.float64  # used for traces and LFP
+    float64Vecs = ['spkt', 'spkid', 'stims'] + list(singleNodeVecs)  # spike times and 't' always stored as float64
     
+    allSimData = Dict()
+    vecChunks = {}  # vectors from each node (concatenated at the end)
+    for inode, nodeSimData in enumerate(nodesSimData):
+        for key, val in nodeSimData.items():
+            keyDtype = np.float64 if key in float64Vecs else dtype
+            if key in singleNodeVecs:  # store single node vectors (eg. 't')
+                if inode == 0:
+                    allSimData[key] = _toArray(val, keyDtype)
+            elif key in simDataVecs:  # simData dicts that contain Vectors
+                if isinstance(val, dict):
+                    if key not in allSimData:
+                        allSimData[key] = Dict()
+                    for cell, val2 in val.items():
+                        if isinstance(val2, dict):  # dicts of dicts of Vectors (eg. ['stim']['cell_1']['backgrounsd']=h.Vector)
+                            allSimData[key][cell] = Dict({stim: _toArray(val3, keyDtype) for stim, val3 in val2.items()})
+                        else:  # dicts of Vectors (eg. ['v']['cell_1']=h.Vector)
+                            allSimData[key][cell] = _toArray(val2, keyDtype)
+                else:  # Vectors (eg. spkt)
+                    vecChunks.setdefault(key, []).append(_toArray(val, keyDtype, copy=False))  # copied by concatenate
+            elif key == 'LFP':
+                if gatherLFP:
+                    if key not in allSimData:
+                        allSimData[key] = np.zeros(val.shape, dtype=dtype)
+                    allSimData[key] += val  # sum of all nodes
+            elif isinstance(val, dict):
+                if key not in allSimData:
+                    allSimData[key] = Dict()
+                allSimData[key].update(val)  # update simData dicts which are not Vectors
+            else:
+                allSimData[key] = val
+
+    for key, chunks in vecChunks.items():
+        allSimData[key] = np.concatenate(chunks)
+
+    # sort spikes by time (and gid for spikes with same time)
+    if 'spkt' in allSimData and len(allSimData['spkt']) > 0:
+        order = np.lexsort((allSimData['spkid'], allSimData['spkt']))
+        allSimData['spkt'], allSimData['spkid'] = allSimData['spkt'][order], allSimData['spkid'][order]
+
+    return allSimData
+
+
+#------------------------------------------------------------------------------
+#  Gathers simData from filess
+#------------------------------------------------------------------------------
+def fileGather (gatherLFP = True, folder = 'temp'):
+    from .. import sim
     
-        if len(sim.allSimData['spkt']) > 0:
-            sim.allSimData['spkt'], sim.allSimData['spkid'] = zip(*sorted(zip(sim.allSimData['spkt'], sim.allSimData['spkid']))) # sort spks
-            sim.allSimData['spkt'], sim.allSimData['spkid'] = list(sim.allSimData['spkt']), list(sim.allSimData['spkid'])
+    sim.timing('start', 'gatherTime')
+
+    # merge the data saved by each node during the simulation (see sim.intervalSave)
+    selection = _gatherSelection(allNodes=True)  # files of all nodes filtered in rank 0 (cells selected in any node)
+    if sim.rank == 0:
+        sim.allSimData = _loadNodeFiles(folder, gatherLFP)
+
+        # select cells and time range (cfg.gatherInclude, cfg.gatherTimeRange) as in gatherData
+        simDataVecs = ['spkt', 'spkid', 'stims'] + list(sim.cfg.recordTraces.keys())
+        if sim.cfg.recordDipoles: simDataVecs.append('dipole')
+        sim.allSimData = _filterSimData(sim.allSimData, simDataVecs, ['t'], selection)
     
                         
     # 1 get the right data, now check that we have right amount
@@ -320,11 +485,14 @@ def fileGather (gatherLFP = True):
     if gatherLFP and sim.cfg.recordLFP and hasattr(sim.net, 'compartCells') and sim.cfg.createNEURONObj:
         for cell in sim.net.compartCells:
             try:
-                del cell.imembVec
-                del cell.imembPtr
                 del cell._segCoords
             except:
                 pass
+        for attr in ['imembVec', 'imembPtr', 'imembBuffer', 'imembBufferSteps']:
+            try:
+                delattr(sim.net, attr)
+            except:
+                pass
         for pop in list(sim.net.pops.values()):
             try:
                 del pop._morphSegCoords
@@ -333,8 +501,13 @@ def fileGather (gatherLFP = True):
 
     # simDataVecs = ['spkt','spkid','stims']+list(sim.cfg.recordTraces.keys())
     # singleNodeVecs = ['t']
+    # cells to gather (cfg.gatherInclude)
+    gatherGids, _ = _gatherSelection()
+    gatherCells = [cell for cell in sim.net.cells if gatherGids is None or cell.gid in gatherGids]
+    numGatherCells = int(sim.pc.allreduce(len(gatherCells), 1))  # in all nodes (allCells only has cells of rank 0 if gatherOnlySimData)
+
     if sim.nhosts > 1:  # only gather if >1 nodes
-        netPopsCellGids = {popLabel: list(pop.cellGids) for popLabel,pop in sim.net.pops.items()}
+        netPopsCellGids = {popLabel: [gid for gid in pop.cellGids if gatherGids is None or gid in gatherGids] for popLabel,pop in sim.net.pops.items()}
 
         # gather only sim data
         if getattr(sim.cfg, 'gatherOnlySimData', False):
@@ -342,7 +515,7 @@ def fileGather (gatherLFP = True):
         # gather the non-simData
         else:
             # nodeData = {'netCells': [c.__getstate__() for c in sim.net.cells], 'netPopsCellGids': netPopsCellGids, 'simData': sim.simData}
-            nodeData = {'netCells': [c.__getstate__() for c in sim.net.cells], 'netPopsCellGids': netPopsCellGids}
+            nodeData = {'netCells': [c.__getstate__() for c in gatherCells], 'netPopsCellGids': netPopsCellGids}
             data = [None]*sim.nhosts
             data[0] = {}
             for k,v in nodeData.items():
@@ -364,10 +537,6 @@ def fileGather (gatherLFP = True):
                     for popLabel,popCellGids in node['netPopsCellGids'].items():
                         allPopsCellGids[popLabel].extend(popCellGids) 
 
-                if len(sim.allSimData['spkt']) > 0:
-                    sim.allSimData['spkt'], sim.allSimData['spkid'] = zip(*sorted(zip(sim.allSimData['spkt'], sim.allSimData['spkid']))) # sort spks
-                    sim.allSimData['spkt'], sim.allSimData['spkid'] = list(sim.allSimData['spkt']), list(sim.allSimData['spkid'])
-
                 sim.net.allCells =  sorted(allCells, key=lambda k: k['gid'])
 
                 for popLabel,pop in allPops.items():
@@ -401,10 +570,10 @@ def fileGather (gatherLFP = True):
                 sim.totalConnections = sum([len(set([conn['preGid'] for conn in cell['conns']])) for cell in sim.net.allCells])
         else:
             sim.totalConnections = sim.totalSynapses
-        sim.numCells = len(sim.net.allCells)
+        sim.numCells = numGatherCells
 
         if sim.totalSpikes > 0:
-            sim.firingRate = float(sim.totalSpikes)/sim.numCells/sim.cfg.duration*1e3 # Calculate firing rate
+            sim.firingRate = float(sim.totalSpikes)/sim.numCells/_gatherDuration()*1e3 # Calculate firing rate
         else:
             sim.firingRate = 0
         if sim.numCells > 0:
@@ -427,10 +596,86 @@ def fileGather (gatherLFP = True):
             print(('  Run time: %0.2f s' % (sim.timingData['runTime'])))
 
             sim.allSimData['avgRate'] = sim.firingRate  # save firing rate
+            if getattr(sim, 'earlyStopTime', None) is not None:
+                sim.allSimData['earlyStop'] = sim.earlyStopTime  # time when stopped by cfg.earlyStopFunc
+
+        if getattr(sim.cfg, 'resultsReducer', None):
+            sim.reduceResults()
+
+        if getattr(sim.cfg, 'resultsAddress', None): 
+            sim.sendSimData()
 
         return sim.allSimData
 
 
+#------------------------------------------------------------------------------
+#  Load and merge simData saved by each node in binary files (see sim.intervalSave)
+#------------------------------------------------------------------------------
+def _loadNodeFiles (folder = 'temp', gatherLFP = True):
+    import os, json
+    from glob import glob
+
+    allSimData = Dict()
+    spkt, spkid = [], []
+
+    for indexFilename in sorted(glob(os.path.join(folder, 'node_*.idx'))):
+        dataFilename = indexFilename[:-len('.idx')] + '.dat'
+        if not os.path.getsize(dataFilename):
+            continue
+        fileData = np.memmap(dataFilename, dtype=np.float64, mode='r')
+        isNode0 = os.path.basename(indexFilename) == 'node_0.idx'
+
+        with open(indexFilename, 'r') as indexFile:
+            for line in indexFile:
+                entry = json.loads(line)
+                key = entry['key']
+                start = entry['offset'] // 8  # offset in bytes of float64 values
+                array = np.array(fileData[start:start+int(np.prod(entry['shape']))]).reshape(entry['shape'])
+
+                if key[0] == 'spkt':
+                    spkt.append(array)
+                elif key[0] == 'spkid':
+                    spkid.append(array)
+                elif key[0] in ['LFP', 'LFPCells']:
+                    if not gatherLFP: 
+                        continue
+                    if key[0] == 'LFP':
+                        if 'LFP' not in allSimData:
+                            allSimData['LFP'] = np.zeros(entry['fullShape'])
+                        lfp = allSimData['LFP']
+                    else:
+                        lfp = allSimData.setdefault('LFPCells', Dict()).setdefault(key[1], np.zeros(entry['fullShape']))
+                    lfp[entry['row']:entry['row']+array.shape[0], :] += array  # sum contribution of each node
+                elif key[0] == 't':
+                    if isNode0:  # single node vector
+                        allSimData.setdefault('t', []).append(array)
+                else:  # traces and stims (dicts of dicts of vectors)
+                    data = allSimData
+                    for k in key[:-1]:
+                        data = data.setdefault(k, Dict())
+                    data.setdefault(key[-1], []).append(array)
+        del fileData
+
+    # concatenate chunks of each vector (LFP arrays already merged)
+    def _concatChunks(data, exclude=[]):
+        for k, v in data.items():
+            if k in exclude:
+                continue
+            if isinstance(v, list):
+                data[k] = np.concatenate(v)
+            elif isinstance(v, dict):
+                _concatChunks(v)
+    _concatChunks(allSimData, ['LFP', 'LFPCells'])
+
+    # sort spikes by time (stable sort keeps order of spikes with same time)
+    spkt = np.concatenate(spkt) if spkt else np.array([])
+    spkid = np.concatenate(spkid) if spkid else np.array([])
+    order = np.argsort(spkt, kind='stable')
+    allSimData['spkt'], allSimData['spkid'] = spkt[order], spkid[order]
+
+    return allSimData
+
+
 #------------------------------------------------------------------------------
 # Gather tags from cells
 #------------------------------------------------------------------------------
@@ -59,8 +59,13 @@ def _loadFile (filename):
     if hasattr(sim, 'cfg') and sim.cfg.timing: sim.timing('start', 'loadFileTime')
     ext = os.path.basename(filename).split('.')[-1]
 
+    # load folder with data saved by each node (see sim.distributedSave)
+    if os.path.isdir(filename) and os.path.exists(os.path.join(filename, 'manifest.json')):
+        print(('Loading node files in %s ... ' % (filename)))
+        data = _loadShards(filename)
+
     # load pickle file
-    if ext == 'pkl':
+    elif ext == 'pkl':
         import pickle
         print(('Loading file %s ... ' % (filename)))
         with open(filename, 'rb') as fileObj:
@@ -69,13 +74,10 @@ def _loadFile (filename):
             else:
                 data = pickle.load(fileObj, encoding='latin1')
 
-    # load dpk file
+    # load dpk file (compressed pickle)
     elif ext == 'dpk':
-        import gzip
         print(('Loading file %s ... ' % (filename)))
-        #fn=sim.cfg.filename #.split('.')
-        #gzip.open(fn, 'wb').write(pk.dumps(dataSave)) # write compressed string
-        print('NOT IMPLEMENTED!')
+        data = _loadDpk(filename)
 
     # load json file
     elif ext == 'json':
@@ -92,13 +94,10 @@ def _loadFile (filename):
         #savemat(sim.cfg.filename+'.mat', replaceNoneObj(dataSave))  # replace None and {} with [] so can save in .mat format
         print('Finished saving!')
 
-    # load HDF5 file (uses very inefficient hdf5storage module which supports dicts)
-    elif ext == 'saveHDF5':
-        #dataSaveUTF8 = _dict2utf8(replaceNoneObj(dataSave)) # replace None and {} with [], and convert to utf
-        import hdf5storage
+    # load HDF5 file (h5py; see sim.saveH5)
+    elif ext == 'h5':
         print(('Loading file %s ... ' % (filename)))
-        #hdf5storage.writes(dataSaveUTF8, filename=sim.cfg.filename+'.hdf5')
-        print('NOT IMPLEMENTED!')
+        data = _loadH5(filename)
 
     # load CSV file (currently only saves spikes)
     elif ext == 'csv':
@@ -136,6 +135,374 @@ def _loadFile (filename):
     return data
 
 
+#------------------------------------------------------------------------------
+# Load compressed pickle (.dpk) saved with sim.saveDpk
+#------------------------------------------------------------------------------
+def _loadDpk (filename, threads=None):
+    import pickle
+    import json
+    import struct
+    from .save import DPK_MAGIC, _dpkCodec, _mapThreads
+
+    with open(filename, 'rb') as fileObj:
+        magic = fileObj.read(len(DPK_MAGIC))
+        
+        # single gzip stream
+        if magic != DPK_MAGIC:
+            import gzip
+            with gzip.open(filename, 'rb') as gzipObj:
+                dataBytes = gzipObj.read()
+        
+        # blocks decompressed in parallel
+        else:
+            header = json.loads(fileObj.readline().decode('utf-8'))
+            _, _, decompress = _dpkCodec(header['codec'], fallback=False)
+            blocks = []
+            for i in range(header['numBlocks']):
+                size, = struct.unpack('<Q', fileObj.read(8))
+                blocks.append(fileObj.read(size))
+            dataBytes = b''.join(_mapThreads(decompress, blocks, threads))
+    
+    if sys.version_info[0] == 2:
+        return pickle.loads(dataBytes)
+    else:
+        return pickle.loads(dataBytes, encoding='latin1')
+
+
+#------------------------------------------------------------------------------
+# Load HDF5 file saved with sim.saveH5 
+#------------------------------------------------------------------------------
+def _loadH5 (filename, loadCells=True):
+    import h5py
+    import json
+
+    data = {}
+    with h5py.File(filename, 'r') as hf:
+        for key in ['netpyne_version', 'netpyne_changeset', 'netParams_version']:
+            if key in hf.attrs: data[key] = _h5Str(hf.attrs[key])
+        if 'simConfig' in hf: 
+            data['simConfig'] = json.loads(_h5Str(hf['simConfig'][()]))
+        net = {}
+        if 'netParams' in hf: 
+            net['params'] = json.loads(_h5Str(hf['netParams'][()]))
+        if 'net/pops' in hf: 
+            net['pops'] = json.loads(_h5Str(hf['net/pops'][()]))
+        if 'net/cells' in hf and loadCells:
+            net['cells'] = sorted(_loadH5Cells(hf['net/cells']), key=lambda k: k['gid'])  # rows in node order if saved with distributedSaveHDF5
+        if net: data['net'] = net
+        if 'simData' in hf:
+            data['simData'] = _loadH5SimData(hf['simData'])
+    
+    return data
+
+
+def _h5Str(val):
+    return val.decode('utf-8') if isinstance(val, bytes) else str(val)
+
+
+def _loadH5Column(group, name, rows=slice(None)):
+    import json
+    import numpy as np
+
+    dataset = group[name]
+    kind = _h5Str(dataset.attrs.get('kind', 'float'))
+    values = dataset[rows]
+    if kind == 'category':
+        categories = [json.loads(_h5Str(c)) for c in group['_categories'][name][:]]
+        return [categories[code] if code >= 0 else None for code in values]
+    elif kind == 'int':
+        return [int(v) for v in values]
+    else:
+        return [None if np.isnan(v) else float(v) for v in values]
+
+
+def _loadH5Table(group, rows=slice(None)):
+    offsets = group['offsets'][:]
+    first, last = rows.indices(len(offsets)-1)[:2]
+    start, end = offsets[first], offsets[last]
+    columns = {key: _loadH5Column(group, key, slice(start, end)) for key in group if key not in ['offsets', '_categories']}
+    items = [{key: col[i] for key, col in columns.items() if col[i] is not None} for i in range(end-start)]
+    rowOffsets = offsets[first:last+1] - start
+    return [items[rowOffsets[i]:rowOffsets[i+1]] for i in range(len(rowOffsets)-1)]
+
+
+def _loadH5Cells(group, rows=slice(None), tagsOnly=False):
+    import json
+
+    gids = group['gid'][rows]
+    tags = {key: _loadH5Column(group['tags'], key, rows) for key in group['tags'] if key != '_categories'}
+    if tagsOnly:  # eg. pops and locations of all cells without reading conns
+        return [{'gid': int(gid), 'tags': {key: values[i] for key, values in tags.items() if values[i] is not None}} for i, gid in enumerate(gids)]
+    attrs = {key: _loadH5Column(group['attrs'], key, rows) for key in group.get('attrs', {}) if key != '_categories'}
+    conns = _loadH5Table(group['conns'], rows)
+    stims = _loadH5Table(group['stims'], rows)
+
+    # conns in compact list format if saved in that format
+    connFormat = json.loads(_h5Str(group['conns'].attrs.get('compactConnFormat', 'false')))
+    if connFormat:
+        conns = [[[conn.get(key) for key in connFormat] for conn in cellConns] for cellConns in conns]
+    
+    cells = []
+    for i, gid in enumerate(gids):
+        cell = {key: values[i] for key, values in attrs.items() if values[i] is not None}
+        cell.update({'gid': int(gid), 
+                     'tags': {key: values[i] for key, values in tags.items() if values[i] is not None},
+                     'conns': conns[i],
+                     'stims': stims[i]})
+        cells.append(cell)
+    return cells
+
+
+def _loadH5Dict(group):
+    data = Dict()
+    for key, val in group.items():
+        data[int(key) if key.isdigit() else key] = _loadH5Item(val)
+    return data
+
+
+def _loadH5Item(item):
+    import json
+    
+    if hasattr(item, 'keys'):  # h5py.Group
+        return _loadH5Dict(item)
+    elif _h5Str(item.attrs.get('kind', '')) == 'json':
+        return json.loads(_h5Str(item[()]))
+    else:
+        return item[()] if item.ndim > 0 else item[()].item()
+
+
+def _loadH5SimData(group, gids=None, timeRange=None, keys=None):
+    import numpy as np
+
+    steps = _timeRangeSteps(timeRange, group.attrs.get('recordStep', None))
+    lfpSteps = _timeRangeSteps(timeRange, group.attrs.get('recordStep', None), lfp=True)
+
+    data = Dict()
+    for key, val in group.items():
+        kind = _h5Str(val.attrs.get('kind', ''))
+        if keys and not (key in keys or kind in ['spikes', 'traces']):
+            continue
+
+        # spikes (time-sorted view if all gids; otherwise CSR rows of selected gids)
+        if key == 'spikes' and kind == 'spikes':
+            if keys and not ('spkt' in keys or 'spkid' in keys):
+                continue
+            if gids is None and 'spkt' in val:
+                spkt = val['spkt'][:]
+                start, end = 0, len(spkt)
+                if timeRange:
+                    start, end = np.searchsorted(spkt, timeRange[0], 'left'), np.searchsorted(spkt, timeRange[1], 'right')
+                spkt, spkid = spkt[start:end], val['spkid'][start:end]
+            else:
+                spikeGids, offsets = val['gids'][:], val['offsets'][:]
+                if gids is None:
+                    spkt, spkid = val['times'][:], np.repeat(spikeGids, np.diff(offsets))
+                else:
+                    rows = np.nonzero(np.isin(spikeGids, list(gids)))[0]
+                    spkt = np.concatenate([val['times'][offsets[row]:offsets[row+1]] for row in rows] + [np.zeros(0)])
+                    spkid = np.concatenate([np.full(offsets[row+1]-offsets[row], spikeGids[row]) for row in rows] + [np.zeros(0)])
+                if timeRange:
+                    mask = (spkt >= timeRange[0]) & (spkt <= timeRange[1])
+                    spkt, spkid = spkt[mask], spkid[mask]
+                order = np.lexsort((spkid, spkt))
+                spkt, spkid = spkt[order], spkid[order]
+            data['spkt'] = spkt.astype(np.float64)
+            data['spkid'] = spkid.astype(np.float64)
+
+        # traces (only rows of selected gids and columns of time range are read)
+        elif key == 'traces' and kind == 'traces':
+            for var, varGroup in val.items():
+                if keys and var not in keys:
+                    continue
+                traceGids = varGroup['gids'][:]
+                data[var] = Dict()
+                if gids is None:
+                    rows = np.arange(len(traceGids))
+                    traces = varGroup['data'][:, steps]
+                else:
+                    rows = np.nonzero(np.isin(traceGids, list(gids)))[0]
+                    traces = varGroup['data'][list(rows), steps] if len(rows) > 0 else []
+                for row, trace in zip(rows, traces):
+                    data[var]['cell_%d' % traceGids[row]] = trace
+
+        # time and LFP (only time range is read)
+        elif key in ['t', 'LFP'] and not hasattr(val, 'keys'):
+            data[key] = val[lfpSteps if key == 'LFP' else steps]
+
+        else:
+            data[int(key) if key.isdigit() else key] = _loadH5Item(val)
+
+    return data
+
+
+def _loadH5SimDataFile(filename, include=None, timeRange=None, keys=None):
+    import h5py
+
+    with h5py.File(filename, 'r') as hf:
+        # gids of selected pops and/or gids (eg. ['PYR', 5])
+        gids = None
+        if include and not ('all' in include or 'allCells' in include):
+            gids = set([gid for gid in include if not isinstance(gid, basestring)])
+            pops = [pop for pop in include if isinstance(pop, basestring)]
+            if pops and 'net/cells/tags/pop' in hf:
+                cellPops = _loadH5Column(hf['net/cells/tags'], 'pop')
+                gids.update([int(gid) for gid, pop in zip(hf['net/cells/gid'][:], cellPops) if pop in pops])
+        
+        return _loadH5SimData(hf['simData'], gids, timeRange, keys)
+
+
+def _timeRangeSteps(timeRange, recordStep, lfp=False):
+    import numpy as np
+
+    # slice of recorded steps (eg. traces, t) within time range
+    if timeRange and recordStep:
+        start, stop = int(np.ceil(timeRange[0] / recordStep)), int(np.floor(timeRange[1] / recordStep)) + 1
+        if lfp:  # LFP row k recorded at t=(k+1)*recordStep (see calculateLFP)
+            start, stop = max(start-1, 0), max(stop-1, 0)
+        return slice(start, stop)
+    else:
+        return slice(None)
+
+
+#------------------------------------------------------------------------------
+# Read compact json files using sidecar index of byte offsets (see sim.saveJSON)
+#------------------------------------------------------------------------------
+def _loadJSONIndex(filename):
+    import os
+    import json
+
+    indexFilename = filename + '.idx'
+    if not os.path.exists(indexFilename):
+        return None
+    with open(indexFilename, 'rb') as fileObj:
+        index = json.loads(fileObj.read().decode('utf-8'))
+    if index.get('size') != os.path.getsize(filename):
+        print('  Warning: index %s does not match %s; ignoring index' % (indexFilename, filename))
+        return None
+    return index
+
+
+def _readJSONRange(fileObj, offsets):
+    import json
+
+    fileObj.seek(offsets[0])
+    return json.loads(fileObj.read(offsets[1] - offsets[0]).decode('utf-8'))
+
+
+def _jsonIndexGids(index, include=None):
+    # gids of selected pops and/or gids (eg. ['PYR', 5]); None if all cells
+    if not include or 'all' in include or 'allCells' in include:
+        return None
+    gids = set([gid for gid in include if not isinstance(gid, basestring)])
+    for pop in include:
+        if isinstance(pop, basestring):
+            for start, end in index['popGids'].get(pop, []):
+                gids.update(range(start, end + 1))
+    return gids
+
+
+def _loadJSONCells(filename, gids=None, index=None):
+    import json
+    import numpy as np
+
+    index = index or _loadJSONIndex(filename)
+    sortedGids = np.array(sorted(gids)) if gids is not None else None
+
+    # only read blocks of cells with gids in range of requested gids
+    cells = []
+    with open(filename, 'rb') as fileObj:
+        for gidMin, gidMax, start, end in index['cells']:
+            if sortedGids is not None and np.searchsorted(sortedGids, gidMin, 'left') == np.searchsorted(sortedGids, gidMax, 'right'):
+                continue
+            fileObj.seek(start)
+            block = json.loads('[' + fileObj.read(end - start).decode('utf-8') + ']')
+            cells.extend([cell for cell in block if gids is None or cell['gid'] in gids])
+    return cells
+
+
+def _loadJSONSimDataFile(filename, include=None, timeRange=None, keys=None, index=None):
+    index = index or _loadJSONIndex(filename)
+    gids = _jsonIndexGids(index, include)
+    if keys and ('spkt' in keys or 'spkid' in keys):
+        keys = list(keys) + ['spkt', 'spkid']  # both required to select spikes
+
+    data = Dict()
+    with open(filename, 'rb') as fileObj:
+        recordStep = None
+        if timeRange and 'simConfig' in index['keys']:
+            recordStep = _readJSONRange(fileObj, index['keys']['simConfig']).get('recordStep')
+        steps = _timeRangeSteps(timeRange, recordStep)
+        lfpSteps = _timeRangeSteps(timeRange, recordStep, lfp=True)
+
+        for key, offsets in index['simData'].items():
+            if keys and key not in keys:
+                continue
+            # only seek to keys of selected cells (eg. traces)
+            if gids is not None and key in index['simDataCells']:
+                cellOffsets = index['simDataCells'][key]
+                data[key] = Dict({'cell_%d' % gid: _readJSONRange(fileObj, cellOffsets['cell_%d' % gid]) 
+                                  for gid in sorted(gids) if 'cell_%d' % gid in cellOffsets})
+            else:
+                data[key] = _readJSONRange(fileObj, offsets)
+
+    # select spikes of cells and time range
+    if (gids is not None or timeRange) and 'spkt' in data and 'spkid' in data:
+        spikes = [(spkt, spkid) for spkt, spkid in zip(data['spkt'], data['spkid'])
+                  if (gids is None or int(spkid) in gids) and (not timeRange or timeRange[0] <= spkt <= timeRange[1])]
+        data['spkt'], data['spkid'] = [spike[0] for spike in spikes], [spike[1] for spike in spikes]
+
+    # select time range of traces, t and LFP
+    if steps != slice(None):
+        for key in list(data.keys()):
+            if key in ['t', 'LFP'] and isinstance(data[key], list):
+                data[key] = data[key][lfpSteps if key == 'LFP' else steps]
+            elif key in index['simDataCells']:
+                for cellKey, trace in data[key].items():
+                    if isinstance(trace, list):
+                        data[key][cellKey] = trace[lfpSteps if key == 'LFPCells' else steps]
+
+    return data
+
+
+#------------------------------------------------------------------------------
+# Merge data saved by each node in folder (manifest + shard files) 
+#------------------------------------------------------------------------------
+def _loadShards (folder, nodes=None):
+    import os
+    import json
+    import pickle
+    from .gather import _mergeSimData
+
+    with open(os.path.join(folder, 'manifest.json'), 'r') as fileObj:
+        manifest = json.load(fileObj)
+    
+    data = {key: manifest[key] for key in ['netpyne_version', 'netpyne_changeset', 'simConfig'] if key in manifest}
+    net = {}
+    if 'netParams' in manifest: net['params'] = manifest['netParams']
+    if 'netPops' in manifest: net['pops'] = manifest['netPops']
+
+    # load shards (optionally only from some nodes)
+    cells, nodesSimData = [], []
+    for inode, info in enumerate(manifest['nodes']):
+        if nodes is not None and inode not in nodes:
+            continue
+        with open(os.path.join(folder, info['file']), 'rb') as fileObj:
+            shard = pickle.load(fileObj)
+        cells.extend(shard.get('cells', []))
+        if 'simData' in shard:
+            nodesSimData.append(shard['simData'])
+
+    if cells:
+        net['cells'] = sorted(cells, key=lambda k: k['gid'])
+    if net: data['net'] = net
+    if nodesSimData:
+        recordTraces = manifest.get('simConfig', {}).get('recordTraces', {})
+        simDataVecs = ['spkt', 'spkid', 'stims', 'dipole'] + list(recordTraces.keys())
+        data['simData'] = _mergeSimData(nodesSimData, simDataVecs, ['t'])
+
+    return data
+
+
 #------------------------------------------------------------------------------
 # Load simulation config from file
 #------------------------------------------------------------------------------
@@ -175,19 +542,33 @@ def loadNetParams (filename, data=None, setLoaded=True):
 #------------------------------------------------------------------------------
 def loadNet (filename, data=None, instantiate=True, compactConnFormat=False):
     from .. import sim
+    from ..cell.inputs import closeSpkTimesFiles
+
+    # .h5 files: if instantiating cells across nodes, each node (including rank 0) only reads the rows of its cells 
+    # (gid and conns offsets datasets used as index); sim.net.allCells of rank 0 then only has gid and tags of each cell
+    # (full cells gathered after simulation)
+    readH5 = filename.endswith('.h5') and not (data and 'cells' in data.get('net', {}))
+    nodeOnly = readH5 and instantiate and sim.nhosts > 1
+    if readH5: 
+        data = {'net': _loadH5NetNode(filename, allCells=not nodeOnly, allCellsTags=(sim.rank == 0))}
+        if not nodeOnly: data['net']['cells'] = data['net']['allCells']
+    elif not data: 
+        data = _loadFile(filename)
 
-    if not data: data = _loadFile(filename)
     if 'net' in data and 'cells' in data['net'] and 'pops' in data['net']:
+        if compactConnFormat: 
+            compactToLongConnFormat(data['net']['cells'], compactConnFormat) # convert loaded data to long format
         if sim.rank == 0:
             sim.timing('start', 'loadNetTime')
             print('Loading net...')
-            if compactConnFormat: 
-                compactToLongConnFormat(data['net']['cells'], compactConnFormat) # convert loaded data to long format 
             sim.net.allPops = data['net']['pops']
-            sim.net.allCells = data['net']['cells']
+            sim.net.allCells = data['net']['allCells'] if nodeOnly else data['net']['cells']
         if instantiate:
             # calculate cells to instantiate in this node
-            if isinstance(instantiate, list):
+            if nodeOnly:
+                rows = data['net']['rows']
+                cellsNode = [cell for row, cell in zip(rows, data['net']['cells']) if not isinstance(instantiate, list) or row in instantiate]
+            elif isinstance(instantiate, list):
                 cellsNode = [data['net']['cells'][i] for i in range(int(sim.rank), len(data['net']['cells']), sim.nhosts) if i in instantiate]
             else:
                 cellsNode = [data['net']['cells'][i] for i in range(int(sim.rank), len(data['net']['cells']), sim.nhosts)]
@@ -197,19 +578,23 @@ def loadNet (filename, data=None, instantiate=True, compactConnFormat=False):
                     pop.cellGids = popLoad['cellGids']
                     sim.net.pops[popLoadLabel] = pop
                 for cellLoad in cellsNode:
-                    # create new CompartCell object and add attributes, but don't create sections or associate gid yet
-                    # TO DO: assumes CompartCell -- add condition to load PointCell
-                    cell = sim.CompartCell(gid=cellLoad['gid'], tags=cellLoad['tags'], create=False, associateGid=False)
-                    try:
-                        if sim.cfg.saveCellSecs:
-                            cell.secs = Dict(cellLoad['secs'])
-                        else:
-                            createNEURONObjorig = sim.cfg.createNEURONObj
-                            sim.cfg.createNEURONObj = False  # avoid creating NEURON Objs now; just needpy struct
-                            cell.create()
-                            sim.cfg.createNEURONObj = createNEURONObjorig
-                    except:
-                        if sim.cfg.verbose: print(' Unable to load cell secs')
+                    # create new CompartCell or PointCell object and add attributes, but don't create sections or associate gid yet
+                    if _isPointCell(cellLoad):
+                        cell = sim.PointCell(gid=cellLoad['gid'], tags=cellLoad['tags'], create=False, associateGid=False)
+                        if 'params' in cellLoad:
+                            cell.params = Dict(cellLoad['params'])
+                    else:
+                        cell = sim.CompartCell(gid=cellLoad['gid'], tags=cellLoad['tags'], create=False, associateGid=False)
+                        try:
+                            if sim.cfg.saveCellSecs and 'secs' in cellLoad:
+                                cell.secs = Dict(cellLoad['secs'])
+                            else:
+                                createNEURONObjorig = sim.cfg.createNEURONObj
+                                sim.cfg.createNEURONObj = False  # avoid creating NEURON Objs now; just needpy struct
+                                cell.create()
+                                sim.cfg.createNEURONObj = createNEURONObjorig
+                        except:
+                            if sim.cfg.verbose: print(' Unable to load cell secs')
 
                     try:
                         cell.conns = [Dict(conn) for conn in cellLoad['conns']]
@@ -231,9 +616,13 @@ def loadNet (filename, data=None, instantiate=True, compactConnFormat=False):
                     if sim.cfg.verbose: print("  Adding NEURON objects...")
                     # create NEURON sections, mechs, syns, etc; and associate gid
                     for cell in sim.net.cells:
-                        prop = {'secs': cell.secs}
-                        cell.createNEURONObj(prop)  # use same syntax as when creating based on high-level specs
+                        if isinstance(cell, sim.PointCell):
+                            cell.createNEURONObj()
+                        else:
+                            prop = {'secs': cell.secs}
+                            cell.createNEURONObj(prop)  # use same syntax as when creating based on high-level specs
                         cell.associateGid()  # can only associate once the hSection obj has been created
+                    closeSpkTimesFiles()  # spike times of VecStims of this node already read
                     # create all NEURON Netcons, NetStims, etc
                     sim.pc.barrier()
                     for cell in sim.net.cells:
@@ -252,13 +641,65 @@ def loadNet (filename, data=None, instantiate=True, compactConnFormat=False):
         print(('  netCells and/or netPops not found in file %s'%(filename)))
 
 
+#------------------------------------------------------------------------------
+# Check if loaded cell is a point neuron (PointCell) 
+#------------------------------------------------------------------------------
+def _isPointCell (cellLoad):
+    from neuron import h
+
+    if 'params' in cellLoad:  # PointCell attribute
+        return True
+    try:  # cellModel corresponds to an existing point process mechanism (see Pop._setCellClass)
+        getattr(h, cellLoad['tags']['cellModel'])
+        return True
+    except:
+        return False
+
+
+#------------------------------------------------------------------------------
+# Read pops and cells of this node from .h5 file (blocks of rows distributed round-robin)
+#------------------------------------------------------------------------------
+def _loadH5NetNode (filename, blocksPerNode=16, allCells=False, allCellsTags=False):
+    from .. import sim
+    import h5py
+    import json
+    import numpy as np
+
+    with h5py.File(filename, 'r') as hf:
+        pops = json.loads(_h5Str(hf['net/pops'][()])) if 'net/pops' in hf else {}
+        group = hf['net/cells']
+        numCells = len(group['gid'])
+        blockSize = max(1, int(np.ceil(numCells / float(sim.nhosts * blocksPerNode))))
+        rows, cells = [], []
+        if allCells:  # all cells read (eg. single node); cells of node taken from them
+            allCellsList = _loadH5Cells(group, slice(0, numCells))
+        elif allCellsTags:  # only gid and tags of all cells
+            allCellsList = _loadH5Cells(group, slice(0, numCells), tagsOnly=True)
+        else:
+            allCellsList = None
+        for start in range(sim.rank * blockSize, numCells, sim.nhosts * blockSize):
+            end = min(start + blockSize, numCells)
+            rows.extend(range(start, end))
+            cells.extend(allCellsList[start:end] if allCells else _loadH5Cells(group, slice(start, end)))
+
+    return {'pops': pops, 'cells': cells, 'rows': rows, 'allCells': allCellsList}
+
+
 #------------------------------------------------------------------------------
 # Load netParams from cell
 #------------------------------------------------------------------------------
-def loadSimData (filename, data=None):
+def loadSimData (filename, data=None, include=None, timeRange=None, keys=None):
     from .. import sim
 
-    if not data: data = _loadFile(filename)
+    if not data: 
+        index = _loadJSONIndex(filename) if filename.endswith('.json') else None
+        if filename.endswith('.h5'):  # only read simData (optionally only selected cells, time range and keys) 
+            data = {'simData': _loadH5SimDataFile(filename, include, timeRange, keys)}
+        elif index:  # only read simData keys (and cells) at offsets in sidecar index
+            data = {'simData': _loadJSONSimDataFile(filename, include, timeRange, keys, index)}
+        else:
+            if include or timeRange or keys: print('  Selecting cells, time range or keys only supported for .h5 and indexed .json files; loading all data')
+            data = _loadFile(filename)
     print('Loading simData...')
     if 'simData' in data:
         sim.allSimData = data['simData']
@@ -274,7 +715,11 @@ def loadSimData (filename, data=None):
 def loadAll (filename, data=None, instantiate=True, createNEURONObj=True):
     from .. import sim 
 
-    if not data: data = _loadFile(filename)
+    if not data: 
+        if filename.endswith('.h5'):  # cells read by each node in loadNet
+            data = _loadH5(filename, loadCells=False)
+        else:
+            data = _loadFile(filename)
     loadSimCfg(filename, data=data)
     sim.cfg.createNEURONObj = createNEURONObj  # set based on argument
     loadNetParams(filename, data=data)
@@ -309,14 +754,23 @@ def compactToLongConnFormat(cells, connFormat):
 def loadHDF5(filename):
     from .. import sim
     import h5py
+    import json
 
-    if sim.rank == 0: timing('start', 'loadTimeHDF5')
+    if sim.rank == 0: sim.timing('start', 'loadTimeHDF5')
 
-    connsh5 = h5py.File(filename, 'r')
-    conns = [list(x) for x in connsh5['conns']]
-    connsFormat = list(connsh5['connsFormat'])
+    with h5py.File(filename, 'r') as connsh5:
+        if 'conns' in connsh5:  # conns only (saved by previous versions)
+            conns = [list(x) for x in connsh5['conns']]
+            connsFormat = list(connsh5['connsFormat'])
+        else:  # cells group (see sim.saveH5 and sim.distributedSaveHDF5)
+            group = connsh5['net/cells']
+            keys = json.loads(_h5Str(group['conns'].attrs.get('compactConnFormat', 'false'))) or \
+                sorted([key for key in group['conns'] if key not in ['offsets', '_categories']])
+            cells = _loadH5Cells(group)
+            conns = [[cell['gid']] + (conn if isinstance(conn, list) else [conn.get(key) for key in keys]) for cell in cells for conn in cell['conns']]
+            connsFormat = ['postGid'] + keys
 
-    if sim.rank == 0: timing('stop', 'loadTimeHDF5')
+    if sim.rank == 0: sim.timing('stop', 'loadTimeHDF5')
 
     return conns, connsFormat
 
@@ -326,9 +780,8 @@ def loadHDF5(filename):
 # Load cell tags and conns using ijson (faster!) 
 #------------------------------------------------------------------------------
 def ijsonLoad(filename, tagsGidRange=None, connsGidRange=None, loadTags=True, loadConns=True, tagFormat=None, connFormat=None, saveTags=None, saveConns=None):
-    # requires: 1) pip install ijson, 2) brew install yajl
+    # requires (if no .idx file saved with sim.saveJSON): 1) pip install ijson, 2) brew install yajl
     from .. import sim
-    import ijson.backends.yajl2_cffi as ijson
     import json
     from time import time
 
@@ -339,10 +792,18 @@ def ijsonLoad(filename, tagsGidRange=None, connsGidRange=None, loadTags=True, lo
     if tagFormat:
         tags['format'] = tagFormat
 
+    index = _loadJSONIndex(filename)
+
     with open(filename, 'rb') as fd:
         start = time()
         print('Loading data ...')
-        objs = ijson.items(fd, 'net.cells.item')
+        if index:  # seek to blocks of requested gids using sidecar index
+            gidRanges = ([tagsGidRange] if loadTags else []) + ([connsGidRange] if loadConns else [])
+            gids = None if any([gidRange is None for gidRange in gidRanges]) else set().union(*gidRanges)
+            objs = _loadJSONCells(filename, gids, index)
+        else:
+            import ijson.backends.yajl2_cffi as ijson
+            objs = ijson.items(fd, 'net.cells.item')
         if loadTags and loadConns:
             print('Storing tags and conns ...')
             for cell in objs:
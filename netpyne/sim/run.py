@@ -90,7 +90,6 @@ def preRun ():
     # handler for recording LFP
     if sim.cfg.recordLFP:
         def recordLFPHandler():
-            print(h.t)
             sim.cvode.event(h.t + int(sim.cfg.recordStep), sim.calculateLFP)
             sim.cvode.event(h.t + int(sim.cfg.recordStep), recordLFPHandler)
 
@@ -112,6 +111,10 @@ def runSim ():
         except:
             if sim.cfg.verbose: 'Error Failed to use local dt.'
     sim.pc.barrier()
+    sim.earlyStopTime = None
+    if getattr(sim.cfg, 'earlyStopFunc', None):  # run in intervals until cfg.earlyStopFunc returns True
+        return runSimWithIntervalFunc(sim.cfg.earlyStopInterval, earlyStop)
+
     sim.timing('start', 'runTime') 
     preRun()
     
@@ -119,6 +122,7 @@ def runSim ():
 
     if sim.rank == 0: print('\nRunning simulation for %s ms...'%sim.cfg.duration)
     sim.pc.psolve(sim.cfg.duration)
+    if sim.cfg.recordLFP: _calculateLFPWindow()  # calculate LFP for remaining buffered steps
 
     sim.pc.barrier() # Wait for all hosts to get to this point
     sim.timing('stop', 'runTime')
@@ -133,6 +137,7 @@ def runSim ():
 def runSimWithIntervalFunc (interval, func):
     from .. import sim
     sim.pc.barrier()
+    sim.earlyStopTime = None
     sim.timing('start', 'runTime')
     preRun()
     h.finitialize(float(sim.cfg.hParams['v_init']))
@@ -141,13 +146,31 @@ def runSimWithIntervalFunc (interval, func):
 
     while round(h.t) < sim.cfg.duration:
         sim.pc.psolve(min(sim.cfg.duration, h.t+interval))
-        func(h.t) # function to be called at intervals
+        if sim.cfg.recordLFP: _calculateLFPWindow()  # so LFP is up to date when func is called
+        if func(h.t) and round(h.t) < sim.cfg.duration: # function to be called at intervals (returns True to stop simulation)
+            if sim.rank == 0: print('  Simulation stopped at t = %0.1f ms' % (h.t))
+            break
     
     sim.pc.barrier() # Wait for all hosts to get to this point
     sim.timing('stop', 'runTime')
     if sim.rank==0:
         print(('  Done; run time = %0.2f s; real-time ratio: %0.2f.' %
-            (sim.timingData['runTime'], sim.cfg.duration/1000/sim.timingData['runTime'])))
+            (sim.timingData['runTime'], h.t/1000/sim.timingData['runTime'])))
+
+
+#------------------------------------------------------------------------------
+# Interval function to stop simulation early (eg. poor candidates of batch)
+#------------------------------------------------------------------------------
+def earlyStop (t):
+    ''' call cfg.earlyStopFunc with simData of node at time t; stop if True in any node'''
+    from .. import sim
+    from .save import _loadFunction
+
+    stop = bool(_loadFunction(sim.cfg.earlyStopFunc)(sim.simData, t))
+    stop = sim.pc.allreduce(float(stop), 2) > 0  # max over nodes
+    if stop and round(t) < sim.cfg.duration:  # not stopped early if simulation already finished
+        sim.earlyStopTime = t  # saved in simData['earlyStop'] (see gatherData)
+    return stop
 
 
 #------------------------------------------------------------------------------
@@ -156,24 +179,46 @@ def runSimWithIntervalFunc (interval, func):
 def calculateLFP():
     from .. import sim    
 
-    # Set pointers to i_membrane in each cell (required form LFP calc )        
-    for cell in sim.net.compartCells:
-        cell.setImembPtr()
+    if getattr(sim.net, 'imembPtr', None) is None:  # no compartmental cells in this node
+        return
+
+    # gather i_membrane_ of all segments in node from PtrVector (pointers set up once in setupRecordLFP)
+    sim.net.imembPtr.gather(sim.net.imembVec)
 
-    # compute 
+    # store in buffer; LFP is calculated once the window (cfg.recordLFPWindow) is full 
     saveStep = int(np.floor(h.t / sim.cfg.recordStep))
-    for cell in sim.net.compartCells: # compute ecp only from the biophysical cells
-        gid = cell.gid
-        im = cell.getImemb() # in nA
-        tr = sim.net.recXElectrode.getTransferResistance(gid)  # in MOhm
-        ecp = np.dot(tr, im)  # in mV (= R * I = MOhm * nA)
+    sim.net.imembBuffer[:, len(sim.net.imembBufferSteps)] = sim.net.imembVec.as_numpy()  # in nA
+    sim.net.imembBufferSteps.append(saveStep - 1)
+    
+    if len(sim.net.imembBufferSteps) == sim.net.imembBuffer.shape[1]:
+        _calculateLFPWindow()
+
+
+#------------------------------------------------------------------------------
+# Calculate LFP for all steps buffered in the current window
+#------------------------------------------------------------------------------
+def _calculateLFPWindow():
+    from .. import sim    
+
+    steps = getattr(sim.net, 'imembBufferSteps', None)
+    if not steps:
+        return
+
+    im = sim.net.imembBuffer[:, :len(steps)]  # in nA (segments x steps)
+    tr = sim.net.recXElectrode.transferResistanceMatrix  # in MOhm (sites x segments)
+
+    # compute ecp only from the biophysical cells
+    np.add.at(sim.simData['LFP'], steps, tr.dot(im).T)  # sum of all cells; in mV (= R * I = MOhm * nA); tr can be sparse
+
+    if sim.cfg.saveLFPCells:  # contribution of individual cells (stored optionally)
+        trBlocks = sim.net.recXElectrode.transferResistanceBlocks  # sparse blocks of each gid (precomputed)
+        for gid, (segStart, segEnd) in sim.net.recXElectrode.segRanges.items():
+            trCell = trBlocks[gid] if gid in trBlocks else tr[:, segStart:segEnd]
+            sim.simData['LFPCells'][gid][steps, :] = trCell.dot(im[segStart:segEnd, :]).T
+
+    del steps[:]
 
-        if sim.cfg.saveLFPCells: 
-            sim.simData['LFPCells'][gid][saveStep - 1,:] = ecp  # contribution of individual cells (stored optionally)
-        
-        sim.simData['LFP'][saveStep-1, :] += ecp  # sum of all cells
 
-    
 #------------------------------------------------------------------------------
 # Calculate and print load balance
 #------------------------------------------------------------------------------
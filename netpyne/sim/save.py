@@ -20,6 +20,10 @@ try:
     to_unicode = unicode
 except NameError:
     to_unicode = str
+try:
+    basestring
+except NameError:
+    basestring = str
 
 from time import time
 from datetime import datetime
@@ -31,16 +35,442 @@ from . import utils
 #------------------------------------------------------------------------------
 # Save JSON (Python 2/3 compatible)
 #------------------------------------------------------------------------------
-def saveJSON(fileName, data):
+def saveJSON(fileName, data, indent=None, index=False):
     import json, io
     from .utils import NpSerializer
 
-    with io.open(fileName, 'w', encoding='utf8') as fileObj:
-        str_ = json.dumps(data,
-                          indent=4, sort_keys=True,
-                          separators=(',', ': '), ensure_ascii=False,
-                          cls=NpSerializer)
-        fileObj.write(to_unicode(str_))
+    # indented output (slower, pure python encoder)
+    if indent:
+        with io.open(fileName, 'w', encoding='utf8') as fileObj:
+            str_ = json.dumps(data,
+                              indent=indent, sort_keys=True,
+                              separators=(',', ': '), ensure_ascii=False,
+                              cls=NpSerializer)
+            fileObj.write(to_unicode(str_))
+    
+    # compact output written incrementally (no full string in memory)
+    else:
+        jsonIndex = {'keys': {}, 'cells': [], 'popGids': {}, 'simData': {}, 'simDataCells': {}} if index else None
+        with io.open(fileName, 'wb') as fileObj:
+            _writeJSON(fileObj, data, jsonIndex)
+            size = fileObj.tell()
+
+        # sidecar index with byte offsets of top-level keys, blocks of cells and simData keys (see sim.load._loadJSONIndex)
+        if index:
+            jsonIndex.update({'size': size, 'cellsPerBlock': JSON_CELLS_PER_BLOCK})
+            with io.open(fileName + '.idx', 'wb') as fileObj:
+                fileObj.write(json.dumps(jsonIndex, sort_keys=True, separators=(',', ':')).encode('utf-8'))
+
+
+JSON_CELLS_PER_BLOCK = 256
+
+def _writeJSON(fileObj, data, index=None, path=()):
+    import json
+    import numpy as np
+    from .utils import NpSerializer
+
+    write = lambda str_: fileObj.write(str_.encode('utf-8'))
+    dumps = lambda obj: json.dumps(obj, sort_keys=True, separators=(',', ':'), ensure_ascii=False, cls=NpSerializer)
+    
+    if isinstance(data, dict):
+        write('{')
+        for i, key in enumerate(sorted(data.keys(), key=str)):
+            if i > 0: write(',')
+            write(json.dumps(to_unicode(key), ensure_ascii=False) + ':')
+            if index is None:
+                _writeJSON(fileObj, data[key])
+            else:
+                keyPath = path + (to_unicode(key),)
+                start = fileObj.tell()
+                _writeJSON(fileObj, data[key], index, keyPath)
+                _indexJSONKey(index, keyPath, [start, fileObj.tell()])
+        write('}')
+    
+    elif isinstance(data, np.ndarray) and data.dtype.kind in 'biuf':  # numeric arrays encoded in single call 
+        write(json.dumps(data.tolist()))
+    
+    elif isinstance(data, (list, tuple)) and len(data) > 0 and isinstance(data[0], (dict, list, tuple)):  # eg. list of cells
+        if index is not None and path == ('net', 'cells'):
+            _writeJSONCells(fileObj, data, index, dumps)
+            return
+        write('[')
+        for i, item in enumerate(data):
+            if i > 0: write(',')
+            write(dumps(item))  # each item encoded in single call (C encoder)
+        write(']')
+
+    else:  # lists of numbers/strings and other values encoded in single call
+        write(dumps(data))
+
+
+def _indexJSONKey(index, keyPath, offsets):
+    if len(keyPath) == 1:
+        index['keys'][keyPath[0]] = offsets
+    elif keyPath[0] == 'simData' and len(keyPath) == 2:
+        index['simData'][keyPath[1]] = offsets
+    elif keyPath[0] == 'simData' and len(keyPath) == 3 and keyPath[2].startswith('cell_'):  # eg. traces of each cell
+        index['simDataCells'].setdefault(keyPath[1], {})[keyPath[2]] = offsets
+
+
+def _writeJSONCells(fileObj, cells, index, dumps):
+    # byte offsets tracked from encoded lengths; blocks store [gidMin, gidMax, start, end]
+    fileObj.write(b'[')
+    pos = fileObj.tell()
+    block = None
+    for i, cell in enumerate(cells):
+        if i > 0:
+            fileObj.write(b',')
+            pos += 1
+        cellBytes = dumps(cell).encode('utf-8')
+        fileObj.write(cellBytes)
+        gid = cell.get('gid', i) if isinstance(cell, dict) else i
+        if i % JSON_CELLS_PER_BLOCK == 0:
+            block = [gid, gid, pos, pos]
+            index['cells'].append(block)
+        block[0], block[1] = min(block[0], gid), max(block[1], gid)
+        pos += len(cellBytes)
+        block[3] = pos
+
+        # gid ranges of each pop (used to select cells by pop label)
+        pop = cell.get('tags', {}).get('pop') if isinstance(cell, dict) else None
+        if pop is not None:
+            ranges = index['popGids'].setdefault(pop, [])
+            if ranges and ranges[-1][1] == gid - 1:
+                ranges[-1][1] = gid
+            else:
+                ranges.append([gid, gid])
+    fileObj.write(b']')
+
+
+#------------------------------------------------------------------------------
+# Save compressed pickle (.dpk); gzip stream or blocks compressed in parallel threads (zlib, lz4, zstd)
+#------------------------------------------------------------------------------
+DPK_MAGIC = b'NETPYNE-DPK\n'
+
+def saveDpk(fileName, data, codec='gzip', level=None, threads=None, blockSize=4*1024*1024):
+    import json
+    import struct
+
+    dataBytes = pk.dumps(data, protocol=pk.HIGHEST_PROTOCOL)
+
+    # single gzip stream (compatible with previous versions and gzip tools)
+    if codec == 'gzip':
+        import gzip
+        with gzip.open(fileName, 'wb', compresslevel=level if level is not None else 9) as fileObj:
+            fileObj.write(dataBytes)
+        return
+
+    # blocks compressed in parallel (zlib, lz4 and zstd release the GIL)
+    codec, compress, _ = _dpkCodec(codec, level)
+    blocks = [dataBytes[i:i+blockSize] for i in range(0, len(dataBytes), blockSize)]
+    compressedBlocks = _mapThreads(compress, blocks, threads)
+    with open(fileName, 'wb') as fileObj:
+        fileObj.write(DPK_MAGIC)
+        fileObj.write((json.dumps({'codec': codec, 'blockSize': blockSize, 'numBlocks': len(blocks)}) + '\n').encode('utf-8'))
+        for block in compressedBlocks:
+            fileObj.write(struct.pack('<Q', len(block)))
+            fileObj.write(block)
+
+
+def _dpkCodec(codec, level=None, fallback=True):
+    import zlib
+
+    # returns (codec, compress, decompress); when saving falls back to zlib if lz4/zstd not installed
+    if codec == 'lz4':
+        try:
+            import lz4.frame
+            return codec, lambda b: lz4.frame.compress(b, compression_level=level or 0), lz4.frame.decompress
+        except ImportError:
+            if not fallback: raise ImportError('lz4 module required to read file compressed with lz4 codec (pip install lz4)')
+            print('  Warning: lz4 module not installed; using zlib')
+    elif codec == 'zstd':
+        try:
+            import zstandard
+            return codec, lambda b: zstandard.ZstdCompressor(level=level or 3).compress(b), lambda b: zstandard.ZstdDecompressor().decompress(b)
+        except ImportError:
+            if not fallback: raise ImportError('zstandard module required to read file compressed with zstd codec (pip install zstandard)')
+            print('  Warning: zstandard module not installed; using zlib')
+    elif codec != 'zlib' and not fallback:
+        raise ValueError('codec %s not recognized' % (codec))
+    elif codec != 'zlib':
+        print('  Warning: codec %s not recognized; using zlib' % (codec))
+    return 'zlib', lambda b: zlib.compress(b, level if level is not None else 6), zlib.decompress
+
+
+def _mapThreads(func, items, threads=None):
+    import os
+
+    threads = threads or os.cpu_count() or 1
+    if threads == 1 or len(items) <= 1:
+        return [func(item) for item in items]
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=min(threads, len(items))) as executor:
+        return list(executor.map(func, items))
+
+
+#------------------------------------------------------------------------------
+# Save data to HDF5 file using h5py (columnar cell tags; conns/stims in CSR format keyed by post gid)
+#------------------------------------------------------------------------------
+def saveH5(fileName, data):
+    from .. import sim
+    import h5py
+
+    with h5py.File(fileName, 'w') as hf:
+        _saveH5Specs(hf, data)
+
+        # cells (secs not stored; recreated from netParams.cellParams rules when loading)
+        net = data.get('net', {})
+        if 'cells' in net:
+            _saveH5Cells(hf.create_group('net/cells'), net['cells'], getattr(sim.cfg, 'compactConnFormat', None))
+        
+        if 'simData' in data:
+            _saveH5SimData(hf.create_group('simData'), data['simData'], getattr(sim.cfg, 'recordStep', None))
+
+
+def _saveH5Specs(hf, data):
+    import json
+    from .utils import NpSerializer
+
+    hf.attrs['format'] = 'netpyne'
+    hf.attrs['formatVersion'] = 1
+    for key in ['netpyne_version', 'netpyne_changeset', 'netParams_version']:
+        if key in data: hf.attrs[key] = str(data[key])
+
+    # specs stored as json strings
+    if 'simConfig' in data: 
+        hf.create_dataset('simConfig', data=json.dumps(data['simConfig'], cls=NpSerializer))
+    net = data.get('net', {})
+    if 'params' in net: 
+        hf.create_dataset('netParams', data=json.dumps(net['params'], cls=NpSerializer))
+    if 'pops' in net: 
+        hf.create_dataset('net/pops', data=json.dumps(net['pops'], cls=NpSerializer))
+
+
+def _saveH5Dataset(group, name, data, chunks=True):
+    import numpy as np
+
+    data = np.asarray(data)
+    if data.ndim > 0 and data.size > 0:
+        return group.create_dataset(name, data=data, chunks=chunks, compression='gzip', compression_opts=4, shuffle=True)
+    else:
+        return group.create_dataset(name, data=data)
+
+
+def _saveH5Column(group, name, values):
+    kind = _h5GlobalKind([_h5ColumnKind(values)])
+    categories = sorted(set(_h5JsonValues(values)) - set([None])) if kind == 'category' else None
+    _saveH5Dataset(group, name, _h5EncodeColumn(values, kind, categories)).attrs['kind'] = kind
+    if kind == 'category':
+        _saveH5Categories(group, name, categories)
+
+
+def _h5ColumnKind(values):
+    from numbers import Number, Integral
+
+    notNone = [v for v in values if v is not None]
+    if len(values) == 0: 
+        return None
+    elif len(notNone) == 0:
+        return 'missing'
+    elif all(isinstance(v, Number) and not isinstance(v, bool) for v in notNone):
+        return 'int' if len(notNone) == len(values) and all(isinstance(v, Integral) for v in notNone) else 'float'
+    else:
+        return 'category'
+
+
+def _h5GlobalKind(kinds):
+    # combine column kinds of all nodes (int columns with missing values stored as float)
+    kinds = set(kinds)
+    if 'category' in kinds or not kinds & set(['int', 'float']):
+        return 'category'
+    elif 'float' in kinds or 'missing' in kinds:
+        return 'float'
+    else:
+        return 'int'
+
+
+def _h5JsonValues(values):
+    import json
+    from .utils import NpSerializer
+
+    return [None if v is None else json.dumps(v, cls=NpSerializer, sort_keys=True) for v in values]
+
+
+def _h5EncodeColumn(values, kind, categories=None):
+    import numpy as np
+
+    # integer column (eg. gids) 
+    if kind == 'int':
+        values = np.array(values, dtype=np.int64)
+        if len(values) and values.min() >= np.iinfo(np.int32).min and values.max() <= np.iinfo(np.int32).max: 
+            values = values.astype(np.int32)
+        return values
+    
+    # float column (missing values stored as nan) 
+    elif kind == 'float':
+        return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    
+    # categorical column: codes (-1 = missing) of list of unique values (as json strings)
+    else:
+        codeIndex = {v: i for i, v in enumerate(categories)}
+        return np.array([-1 if v is None else codeIndex[v] for v in _h5JsonValues(values)], dtype=np.int32)
+
+
+def _saveH5Categories(group, name, categories):
+    import numpy as np
+    import h5py
+
+    group.require_group('_categories').create_dataset(name, data=np.array(categories, dtype=object), 
+                                                      dtype=h5py.special_dtype(vlen=str))
+
+
+def _h5TableColumns(rows, listFormat=None):
+    import numpy as np
+
+    # CSR format: items of row i are offsets[i]:offsets[i+1]
+    offsets = np.zeros(len(rows)+1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(row) for row in rows])
+
+    items = [item for row in rows for item in row]
+    if listFormat: 
+        items = [dict(zip(listFormat, item)) if isinstance(item, (list, tuple)) else item for item in items]  # compact conn format
+    keys = sorted(set([key for item in items for key in item]))
+    return offsets, {key: [item.get(key) for item in items] for key in keys}, len(items)
+
+
+def _h5CellsData(cells, connFormat=None):
+    import numpy as np
+    
+    # numeric arrays and columns (lists of values) of cells group; keys are paths within group
+    arrays = {'gid': np.array([c['gid'] for c in cells], dtype=np.int64)}
+    columns = {}
+    numRows = {'tags': len(cells)}
+    
+    tagKeys = sorted(set([key for c in cells for key in c['tags']]))
+    for key in tagKeys:
+        columns['tags/'+key] = [c['tags'].get(key) for c in cells]
+
+    # other cell attributes (eg. params of PointCells); secs not stored
+    numRows['attrs'] = len(cells)
+    attrKeys = sorted(set([key for c in cells for key in c if key not in ['gid', 'tags', 'conns', 'stims', 'secs', 'secLists']]))
+    for key in attrKeys:
+        columns['attrs/'+key] = [c.get(key) for c in cells]
+    
+    for table in ['conns', 'stims']:
+        offsets, tableColumns, numRows[table] = _h5TableColumns([c.get(table, []) for c in cells], connFormat if table == 'conns' else None)
+        arrays[table+'/offsets'] = offsets
+        columns.update({table+'/'+key: values for key, values in tableColumns.items()})
+
+    return arrays, columns, numRows
+
+
+def _saveH5CellsAttrs(group, connFormat=None):
+    import json
+
+    group.require_group('tags')
+    group.require_group('attrs')
+    group.attrs['secs'] = 'cellParams'  # secs given by cellParams rules (tags['label'])
+    group['conns'].attrs['compactConnFormat'] = json.dumps(connFormat or False)
+
+
+def _saveH5Cells(group, cells, connFormat=None):
+    cells = sorted(cells, key=lambda c: c['gid'])
+    connFormat = connFormat if isinstance(connFormat, list) else None
+    arrays, columns, _ = _h5CellsData(cells, connFormat)
+    for path, data in arrays.items():
+        _saveH5Dataset(group, path, data)
+    for path, values in columns.items():
+        table, key = path.split('/', 1)
+        _saveH5Column(group.require_group(table), key, values)
+    _saveH5CellsAttrs(group, connFormat)
+
+
+def _saveH5SimData(group, simData, recordStep=None):
+    spikes, traces, lfp, other = _h5SplitSimData(simData)
+    if recordStep: group.attrs['recordStep'] = recordStep
+
+    # spikes: CSR by gid (gids, offsets, times) + time-sorted view (spkt, spkid)
+    if spikes:
+        spikesGroup = group.create_group('spikes')
+        spikesGroup.attrs['kind'] = 'spikes'
+        for key, data in spikes.items():
+            _saveH5Dataset(spikesGroup, key, data)
+
+    # traces: 2D float32 array (cells x time) per variable; rows chunked so single cells can be read
+    for key, (gids, data) in traces.items():
+        traceGroup = group.require_group('traces')
+        traceGroup.attrs['kind'] = 'traces'
+        varGroup = traceGroup.create_group(key)
+        _saveH5Dataset(varGroup, 'gids', gids)
+        _saveH5Dataset(varGroup, 'data', data, chunks=(min(16, data.shape[0]), max(1, min(8192, data.shape[1]))))
+
+    # LFP: 2D float32 array (time x electrodes); chunked in time
+    if lfp is not None:
+        _saveH5Dataset(group, 'LFP', lfp, chunks=(min(4096, lfp.shape[0]), lfp.shape[1]))
+
+    # other data (eg. t, stims, avgRate)
+    _saveH5Dict(group, other)
+
+
+def _h5SplitSimData(simData, timeSorted=True):
+    import numpy as np
+    import re
+
+    other = dict(simData)  # keys removed as they are split
+
+    # spikes: CSR by gid (gids, offsets, times) + time-sorted view (spkt, spkid)
+    spikes = None
+    if 'spkt' in other and 'spkid' in other:
+        spkt = np.asarray(other.pop('spkt'), dtype=np.float64)
+        spkid = np.asarray(other.pop('spkid')).astype(np.int64)
+        timeDtype = np.float32 if len(spkt) == 0 or spkt.max() < 1e5 else np.float64  # float32 resolution < 0.01 ms up to 100 s
+        indexDtype = np.int32 if len(spkt) < np.iinfo(np.int32).max else np.int64
+        gidOrder = np.lexsort((spkt, spkid))
+        gids, counts = np.unique(spkid[gidOrder], return_counts=True)
+        offsets = np.zeros(len(gids)+1, dtype=indexDtype)
+        offsets[1:] = np.cumsum(counts)
+        spikes = {'gids': gids.astype(np.int32), 'offsets': offsets, 'times': spkt[gidOrder].astype(timeDtype)}
+        if timeSorted:
+            timeOrder = np.lexsort((spkid, spkt))
+            spikes.update({'spkt': spkt[timeOrder].astype(timeDtype), 'spkid': spkid[timeOrder].astype(np.int32)})
+
+    # traces: 2D float32 array (cells x time) per variable (dicts of equal length vectors with keys 'cell_<gid>')
+    traces = {}
+    for key in list(other.keys()):
+        val = other[key]
+        if not isinstance(val, dict) or len(val) == 0 or key == 'stims':
+            continue
+        if not all(isinstance(k, basestring) and re.match(r'^cell_\d+$', k) and np.ndim(v) == 1 for k, v in val.items()):
+            continue
+        if len(set([len(v) for v in val.values()])) > 1:
+            continue
+        cellKeys = sorted(val.keys(), key=lambda k: int(k.split('_')[1]))
+        gids = np.array([int(k.split('_')[1]) for k in cellKeys], dtype=np.int32)
+        traces[key] = (gids, np.array([np.asarray(val[k]) for k in cellKeys], dtype=np.float32))
+        other.pop(key)
+
+    # LFP: 2D float32 array (time x electrodes)
+    lfp = None
+    if 'LFP' in other and np.ndim(other['LFP']) == 2 and np.size(other['LFP']) > 0:
+        lfp = np.asarray(other.pop('LFP'), dtype=np.float32)
+
+    return spikes, traces, lfp, other
+
+
+def _saveH5Dict(group, data):
+    import numpy as np
+    import json
+    from .utils import NpSerializer
+
+    for key, val in data.items():
+        if isinstance(val, dict):
+            _saveH5Dict(group.create_group(str(key)), val)
+        else:
+            arr = np.asarray(val)
+            if arr.dtype.kind in 'biuf':
+                _saveH5Dataset(group, str(key), arr)
+            else:  # non-numeric data stored as json string
+                group.create_dataset(str(key), data=json.dumps(val, cls=NpSerializer)).attrs['kind'] = 'json'
 
 
 #------------------------------------------------------------------------------
@@ -49,6 +479,15 @@ def saveJSON(fileName, data):
 def saveData (include = None, filename = None):
     from .. import sim
 
+    # each node saves its own data (no gather)
+    if getattr(sim.cfg, 'saveDistributed', False):
+        if sim.cfg.saveHDF5:
+            filePath = distributedSaveHDF5(include, filename)
+        else:
+            filePath = distributedSave(include, filename)
+        _markJobSaved()
+        return filePath
+
     if sim.rank == 0 and not getattr(sim.net, 'allCells', None): needGather = True
     else: needGather = False
     if needGather: gather.gatherData()
@@ -104,10 +543,7 @@ def saveData (include = None, filename = None):
         if 'netPops' in include: net['pops'] = sim.net.allPops
         if net: dataSave['net'] = net
         if 'simConfig' in include: dataSave['simConfig'] = sim.cfg.__dict__
-        if 'simData' in include: 
-            if 'LFP' in sim.allSimData: 
-                sim.allSimData['LFP'] = sim.allSimData['LFP'].tolist() 
-            dataSave['simData'] = sim.allSimData
+        if 'simData' in include: dataSave['simData'] = sim.allSimData  # numpy arrays converted to lists only when saving to json
 
 
         if dataSave:
@@ -127,12 +563,10 @@ def saveData (include = None, filename = None):
                     pickle.dump(dataSave, fileObj)
                 print('Finished saving!')
 
-            # Save to dpk file
+            # Save to dpk file (compressed pickle)
             if sim.cfg.saveDpk:
-                import gzip
                 print(('Saving output as %s ... ' % (filePath+'.dpk')))
-                #fn=filePath #.split('.')
-                gzip.open(filePath, 'wb').write(pk.dumps(dataSave)) # write compressed string
+                sim.saveDpk(filePath+'.dpk', dataSave, codec=sim.cfg.saveDpkCodec, level=sim.cfg.saveDpkLevel, threads=sim.cfg.saveDpkThreads)
                 print('Finished saving!')
 
             # Save to json file
@@ -140,7 +574,7 @@ def saveData (include = None, filename = None):
                 # Make it work for Python 2+3 and with Unicode
                 print(('Saving output as %s ... ' % (filePath+'.json ')))
                 #dataSave = utils.replaceDictODict(dataSave)  # not required since json saves as dict
-                sim.saveJSON(filePath+'.json', dataSave)
+                sim.saveJSON(filePath+'.json', dataSave, index=True)
                 print('Finished saving!')
 
             # Save to mat file
@@ -150,12 +584,10 @@ def saveData (include = None, filename = None):
                 savemat(filePath+'.mat', utils.tupleToList(utils.replaceNoneObj(dataSave)))  # replace None and {} with [] so can save in .mat format
                 print('Finished saving!')
 
-            # Save to HDF5 file (uses very inefficient hdf5storage module which supports dicts)
+            # Save to HDF5 file (h5py; columnar cell tags and CSR conns)
             if sim.cfg.saveHDF5:
-                dataSaveUTF8 = utils._dict2utf8(utils.replaceNoneObj(dataSave)) # replace None and {} with [], and convert to utf
-                import hdf5storage
-                print(('Saving output as %s... ' % (filePath+'.hdf5')))
-                hdf5storage.writes(dataSaveUTF8, filename=filePath+'.hdf5')
+                print(('Saving output as %s... ' % (filePath+'.h5')))
+                sim.saveH5(filePath+'.h5', dataSave)
                 print('Finished saving!')
 
             # Save to CSV file (currently only saves spikes)
@@ -197,32 +629,412 @@ def saveData (include = None, filename = None):
                 del dataSave[key]
             del dataSave
 
+            _markJobSaved()
+
             # return full path
             import os
             return os.getcwd() + '/' + filePath
 
         else:
             print('Nothing to save')
+            _markJobSaved()
+
+
+def _markJobSaved():
+    import os
+    from .. import sim
+
+    # outputs of batch job (runCfg 'memoize') complete: key written at submission activated so they can be reused (see batch.utils.reuseCachedJob)
+    if sim.rank == 0 and os.path.isfile(sim.cfg.filename + '.hash.pending'):
+        os.rename(sim.cfg.filename + '.hash.pending', sim.cfg.filename + '.hash')
 
 
 #------------------------------------------------------------------------------
-# Save distributed data using HDF5 (only conns for now)
+# Save distributed data using HDF5 (each node writes its rows of cells, conns, stims, spikes and traces)
 #------------------------------------------------------------------------------
-def distributedSaveHDF5():
+def distributedSaveHDF5(include=None, filename=None):
     from .. import sim
     import h5py
+    import os
+    import numpy as np
 
     if sim.rank == 0: sim.timing('start', 'saveTimeHDF5')
+    if filename: sim.cfg.filename = filename
+    if not include: include = sim.cfg.saveDataInclude
 
-    sim.compactConnFormat()
-    conns = [[cell.gid]+conn for cell in sim.net.cells for conn in cell.conns]
-    conns = sim.copyRemoveItemObj(conns, keystart='h', newval=[]) 
-    connFormat = ['postGid']+sim.cfg.compactConnFormat
-    with h5py.File(sim.cfg.filename+'.h5', 'w') as hf:
-        hf.create_dataset('conns', data = conns)
-        hf.create_dataset('connsFormat', data = connFormat)
+    # file name shared by all nodes (timestamp set by rank 0)
+    if sim.rank == 0:
+        timestampStr = '-' + datetime.fromtimestamp(time()).strftime('%Y%m%d_%H%M%S') if sim.cfg.timestampFilename else ''
+        filePath = sim.cfg.filename + timestampStr
+        print(('Saving output of all nodes as %s ... ' % (filePath+'.h5')))
+    else:
+        filePath = None
+    filePath = sim.pc.py_broadcast(filePath, 0)
 
-    if sim.rank == 0: sim.timing('stop', 'saveTimeHDF5')
+    # flag to avoid saving conns data for each cell (same as in gatherData)
+    if not sim.cfg.saveCellConns:
+        for cell in sim.net.cells:
+            cell.conns = []
+    elif sim.cfg.compactConnFormat:
+        sim.compactConnFormat()
+    connFormat = sim.cfg.compactConnFormat if isinstance(sim.cfg.compactConnFormat, list) else None
+
+    # numeric arrays (rows of this node) and columns (lists of values) to encode once kinds in all nodes are known
+    arrays, columns, numRows = {}, {}, {}
+    if 'netCells' in include or 'net' in include:
+        cells = sorted([c.__getstate__() if sim.cfg.createNEURONObj else c.__dict__ for c in sim.net.cells], key=lambda c: c['gid'])
+        cellArrays, cellColumns, cellRows = _h5CellsData(cells, connFormat)
+        arrays.update({'net/cells/'+path: data for path, data in cellArrays.items()})
+        columns.update({'net/cells/'+path: values for path, values in cellColumns.items()})
+        numRows.update({'net/cells/'+table: n for table, n in cellRows.items()})
+    
+    lfp, other = None, {}
+    if 'simData' in include:
+        simDataVecs = ['spkt', 'spkid', 'stims'] + list(sim.cfg.recordTraces.keys())
+        if sim.cfg.recordDipoles: simDataVecs.append('dipole')
+        simData = gather._mergeSimData([sim.simData], simDataVecs, ['t'])
+        spikes, traces, lfp, other = _h5SplitSimData(simData, timeSorted=False)  # time-sorted view requires global sort
+        if spikes:
+            arrays.update({'simData/spikes/'+key: data for key, data in spikes.items()})
+        for key, (gids, data) in traces.items():
+            arrays['simData/traces/%s/gids' % (key)] = gids
+            arrays['simData/traces/%s/data' % (key)] = data
+
+    # kind of each column (int, float or category) based on values in all nodes
+    nodesKinds = sim.pc.py_alltoall([{'numRows': numRows, 'kinds': {path: _h5ColumnKind(values) for path, values in columns.items()}}]*sim.nhosts)
+    columnPaths = sorted(set([path for node in nodesKinds for path in node['kinds']]))
+    columnKinds = {}
+    for path in columnPaths:
+        table = path.rsplit('/', 1)[0]
+        kinds = [node['kinds'].get(path, 'missing' if node['numRows'].get(table) else None) for node in nodesKinds]
+        columnKinds[path] = _h5GlobalKind(kinds)
+    
+    # categories of categorical columns in all nodes
+    localCategories = {path: set(_h5JsonValues(columns.get(path, []))) - set([None]) for path in columnPaths if columnKinds[path] == 'category'}
+    nodesCategories = sim.pc.py_alltoall([localCategories]*sim.nhosts)
+    categories = {path: sorted(set.union(*[node[path] for node in nodesCategories])) for path in localCategories}
+    
+    for path in columnPaths:
+        table = path.rsplit('/', 1)[0]
+        if table in numRows:
+            arrays[path] = _h5EncodeColumn(columns.get(path, [None]*numRows[table]), columnKinds[path], categories.get(path))
+
+    # CSR offsets of this node shifted by number of items in previous nodes (leading 0 written by rank 0)
+    for path in arrays:
+        if path.endswith('/offsets'):
+            arrays[path] = arrays[path][1:]
+
+    # rows of each dataset in all nodes -> row offset of this node (exclusive prefix sum) and global shape
+    localShapes = {path: (data.shape, data.dtype.str, int(data[-1]) if path.endswith('/offsets') and len(data) else 0) for path, data in arrays.items()}
+    nodesShapes = sim.pc.py_alltoall([localShapes]*sim.nhosts)
+    datasets = {}
+    for path in sorted(set([path for node in nodesShapes for path in node])):
+        isOffsets = path.endswith('/offsets')
+        rowOffset, itemOffset, nodeRows = int(isOffsets), 0, []
+        for node in nodesShapes:
+            shape, dtype, numItems = node.get(path, ((0,), None, 0))
+            nodeRows.append((rowOffset, itemOffset, shape))
+            rowOffset += shape[0]
+            itemOffset += numItems
+        tail = [node[path][0][1:] for node in nodesShapes if path in node][0]
+        dtype = np.result_type(*[np.dtype(node[path][1]) for node in nodesShapes if path in node])
+        datasets[path] = {'shape': (rowOffset,) + tuple(tail), 'dtype': dtype, 'nodeRows': nodeRows}
+        if isOffsets and path in arrays:
+            arrays[path] = arrays[path] + nodeRows[sim.rank][1]
+
+    # write rows of each node: collectively in single file if h5py built with MPI; otherwise one file per node + virtual datasets
+    comm = _h5MPIComm()
+    if comm is not None:
+        with h5py.File(filePath+'.h5', 'w', driver='mpio', comm=comm) as hf:
+            for path, dataset in sorted(datasets.items()):
+                hdataset = hf.create_dataset(path, shape=dataset['shape'], dtype=dataset['dtype'])  # collective
+                if path in arrays and len(arrays[path]):
+                    start = dataset['nodeRows'][sim.rank][0]
+                    hdataset[start:start+len(arrays[path])] = arrays[path]
+    else:
+        nodeFile = lambda rank: '%s_node%d.h5' % (filePath, rank)
+        with h5py.File(nodeFile(sim.rank), 'w') as hf:
+            for path, data in arrays.items():
+                _saveH5Dataset(hf, path, data)
+        sim.pc.barrier()
+        if sim.rank == 0:
+            with h5py.File(filePath+'.h5', 'w') as hf:
+                for path, dataset in sorted(datasets.items()):
+                    layout = h5py.VirtualLayout(shape=dataset['shape'], dtype=dataset['dtype'])
+                    for rank, (start, _, shape) in enumerate(dataset['nodeRows']):
+                        if shape[0] > 0:
+                            source = h5py.VirtualSource(os.path.basename(nodeFile(rank)), path, shape=shape)  # relative to main file folder
+                            layout[start:start+shape[0]] = source
+                    hf.create_virtual_dataset(path, layout, fillvalue=0)
+
+    # LFP (sum of all nodes) and other simData (eg. t, stims) saved by rank 0, together with specs and column attributes
+    data = [None]*sim.nhosts
+    data[0] = {'LFP': lfp, 'other': other}
+    nodesOther = sim.pc.py_alltoall(data)
+    if sim.rank == 0:
+        with h5py.File(filePath+'.h5', 'a') as hf:
+            dataSave = {'netpyne_version': sim.version(show=False), 'netpyne_changeset': sim.gitChangeset(show=False)}
+            if getattr(sim.net.params, 'version', None): dataSave['netParams_version'] = sim.net.params.version
+            if 'netParams' in include:
+                sim.net.params.__dict__.pop('_labelid', None)
+                dataSave['net'] = {'params': utils.replaceFuncObj(sim.net.params.__dict__)}
+            if 'netPops' in include or 'net' in include:
+                dataSave.setdefault('net', {})['pops'] = {popLabel: pop.__getstate__() for popLabel, pop in sim.net.pops.items()}
+            if 'simConfig' in include: dataSave['simConfig'] = sim.cfg.__dict__
+            _saveH5Specs(hf, dataSave)
+
+            for path, kind in columnKinds.items():
+                hf[path].attrs['kind'] = kind
+                if kind == 'category':
+                    group, name = path.rsplit('/', 1)
+                    _saveH5Categories(hf[group], name, categories[path])
+            if 'net/cells' in hf:
+                _saveH5CellsAttrs(hf['net/cells'], connFormat)
+
+            if 'simData' in include:
+                group = hf.require_group('simData')
+                group.attrs['recordStep'] = sim.cfg.recordStep
+                for key in ['spikes', 'traces']:
+                    if key in group: group[key].attrs['kind'] = key
+                lfps = [node['LFP'] for node in nodesOther if node['LFP'] is not None]
+                if lfps:
+                    lfp = np.sum(lfps, axis=0)
+                    _saveH5Dataset(group, 'LFP', lfp, chunks=(min(4096, lfp.shape[0]), lfp.shape[1]))
+                other = {}
+                for node in nodesOther:
+                    for key, val in node['other'].items():
+                        if isinstance(val, dict):
+                            other.setdefault(key, {}).update(val)
+                        elif key not in other:  # eg. t (same in all nodes)
+                            other[key] = val
+                _saveH5Dict(group, other)
+
+        print('Finished saving!')
+        sim.timing('stop', 'saveTimeHDF5')
+        if sim.cfg.timing: print(('  Done; saving time = %0.2f s.' % sim.timingData['saveTimeHDF5']))
+    
+    sim.pc.barrier()
+    return os.path.abspath(filePath+'.h5')
+
+
+def _h5MPIComm():
+    from .. import sim
+    
+    # MPI communicator if h5py built with parallel HDF5 and mpi4py uses same processes as NEURON
+    try:
+        import h5py
+        from mpi4py import MPI
+        available = h5py.get_config().mpi and MPI.COMM_WORLD.Get_size() == sim.nhosts and MPI.COMM_WORLD.Get_rank() == sim.rank
+    except ImportError:
+        available = False
+    if sim.pc.allreduce(float(available), 3):  # min over nodes (all nodes must use same mode)
+        return MPI.COMM_WORLD
+
+
+#------------------------------------------------------------------------------
+# Save data of each node to its own shard file without gathering (rank 0 only saves manifest)
+#------------------------------------------------------------------------------
+def distributedSave (include=None, filename=None):
+    from .. import sim
+    import os
+    import pickle
+
+    sim.timing('start', 'saveTime')
+    if filename: sim.cfg.filename = filename
+    if not include: include = sim.cfg.saveDataInclude
+
+    # folder shared by all nodes (timestamp set by rank 0)
+    if sim.rank == 0:
+        timestampStr = '-' + datetime.fromtimestamp(time()).strftime('%Y%m%d_%H%M%S') if sim.cfg.timestampFilename else ''
+        folder = sim.cfg.filename + timestampStr + '_shards'
+        print(('Saving output of each node in %s ... ' % (folder)))
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+    else:
+        folder = None
+    folder = sim.pc.py_broadcast(folder, 0)
+
+    # flag to avoid saving sections/conns data for each cell (same as in gatherData)
+    if not sim.cfg.saveCellSecs:
+        for cell in sim.net.cells:
+            cell.secs = None
+            cell.secLists = None
+    if not sim.cfg.saveCellConns:
+        for cell in sim.net.cells:
+            cell.conns = []
+    elif sim.cfg.compactConnFormat:
+        sim.compactConnFormat()
+
+    # shard with data of this node (gids of node listed in shard, not in manifest, so manifest size doesn't grow with cells)
+    gids = [cell.gid for cell in sim.net.cells]
+    shard = {'gids': gids}
+    if 'netCells' in include or 'net' in include:
+        if sim.cfg.createNEURONObj:
+            shard['cells'] = [c.__getstate__() for c in sim.net.cells]
+        else:
+            shard['cells'] = [c.__dict__ for c in sim.net.cells]
+    if 'simData' in include:
+        simDataVecs = ['spkt', 'spkid', 'stims'] + list(sim.cfg.recordTraces.keys())
+        if sim.cfg.recordDipoles: simDataVecs.append('dipole')
+        shard['simData'] = gather._mergeSimData([sim.simData], simDataVecs, ['t'])  # numpy arrays; LFP of this node only (summed on load)
+
+    shardFile = 'node_%d.pkl' % (sim.rank)
+    with open(os.path.join(folder, shardFile), 'wb') as fileObj:
+        pickle.dump(shard, fileObj, protocol=pickle.HIGHEST_PROTOCOL)
+
+    # small summary of each node used to build manifest
+    nodeInfo = {'file': shardFile,
+                'numCells': len(gids),
+                'gidRange': [min(gids), max(gids)] if gids else None,  # bounds only (round-robin gid assignment)
+                'numConns': sum(len(cell.conns) for cell in sim.net.cells),
+                'numSpikes': int(sim.simData['spkt'].size()) if 'spkt' in sim.simData else 0}
+    data = [None]*sim.nhosts
+    data[0] = nodeInfo
+    nodesInfo = sim.pc.py_alltoall(data)
+
+    if sim.rank == 0:
+        # global row offsets of each node (exclusive prefix sum)
+        offsetKeys = {'numCells': 'cellsOffset', 'numConns': 'connsOffset', 'numSpikes': 'spikesOffset'}
+        offsets = {key: 0 for key in offsetKeys}
+        for info in nodesInfo:
+            for key, offsetKey in offsetKeys.items():
+                info[offsetKey] = offsets[key]
+                offsets[key] += info[key]
+
+        manifest = {'netpyne_version': sim.version(show=False),
+                    'netpyne_changeset': sim.gitChangeset(show=False),
+                    'nhosts': sim.nhosts,
+                    'include': list(include),
+                    'totals': offsets,
+                    'nodes': nodesInfo}
+        if 'netParams' in include:
+            sim.net.params.__dict__.pop('_labelid', None)
+            manifest['netParams'] = utils.replaceFuncObj(sim.net.params.__dict__)
+        if 'netPops' in include or 'net' in include:
+            manifest['netPops'] = {popLabel: pop.__getstate__() for popLabel, pop in sim.net.pops.items()}
+        if 'simConfig' in include:
+            manifest['simConfig'] = sim.cfg.__dict__
+        sim.saveJSON(os.path.join(folder, 'manifest.json'), manifest)
+        
+        print('Finished saving!')
+        if sim.cfg.timing:
+            sim.timing('stop', 'saveTime')
+            print(('  Done; saving time = %0.2f s.' % sim.timingData['saveTime']))
+
+    sim.pc.barrier()
+    return os.path.abspath(folder)
+
+
+#------------------------------------------------------------------------------
+# Send result to batch (cfg.resultsAddress) as soon as simulation ends: fitness
+# evaluated with cfg.resultsFitnessFunc, or gathered simData if not set
+#------------------------------------------------------------------------------
+def sendSimData(address=None, authKey=None):
+    from .. import sim
+    import os
+    import socket
+    import binascii
+    from multiprocessing import AuthenticationError
+    from multiprocessing.connection import Client
+
+    address = address or sim.cfg.resultsAddress
+    authKey = authKey or getattr(sim.cfg, 'resultsAuthKey', None)
+
+    result = {'simLabel': sim.cfg.simLabel}
+    if 'earlyStop' in sim.allSimData:  # batch sets default fitness
+        result['earlyStop'] = sim.allSimData['earlyStop']
+    elif getattr(sim.cfg, 'resultsFitnessFunc', None):
+        try:
+            result['fitness'] = _loadFunction(sim.cfg.resultsFitnessFunc)(sim.allSimData, **(getattr(sim.cfg, 'resultsFitnessFuncArgs', None) or {}))
+        except Exception as e:  # reported by batch instead of waiting for timeout
+            result['fitnessError'] = '%s: %s' % (type(e).__name__, e)
+    else:
+        result['simData'] = sim.allSimData
+    dataBytes = pk.dumps(result, protocol=pk.HIGHEST_PROTOCOL)
+    
+    # send pickle over authenticated connection to 'host:port' (key set by batch in cfg.resultsAuthKey)
+    filePath = os.path.join(sim.cfg.saveFolder, sim.cfg.simLabel) + '_results.pkl'
+    defaultTimeout = socket.getdefaulttimeout()
+    try:
+        host, port = address.rsplit(':', 1)
+        socket.setdefaulttimeout(10)
+        conn = Client((host, int(port)), authkey=binascii.unhexlify(authKey) if authKey else None)
+        conn.send_bytes(dataBytes)
+        conn.close()
+        print(('  Sent %s to %s' % ('simData' if 'simData' in result else 'result', address)))
+
+    # if batch not reachable (eg. job on different host) save to <saveFolder>/<simLabel>_results.pkl
+    except (socket.error, ValueError, EOFError, AuthenticationError) as e:
+        print(('  Could not send result to %s (%s); saving to %s' % (address, e, filePath)))
+        _saveResultFile(filePath, dataBytes)
+
+    # memoized job (key pending, see batch.utils.registerCachedJob): result also saved so job can be reused
+    else:
+        if os.path.isfile(sim.cfg.filename + '.hash.pending'):
+            _saveResultFile(filePath, dataBytes)
+    finally:
+        socket.setdefaulttimeout(defaultTimeout)
+
+
+def _saveResultFile(filePath, dataBytes):
+    import os
+
+    # renamed when complete (batch may be polling for the file)
+    with open(filePath + '.tmp', 'wb') as fileObj:
+        fileObj.write(dataBytes)
+    os.rename(filePath + '.tmp', filePath)
+
+
+#------------------------------------------------------------------------------
+# Reduce simData to compact metrics using cfg.resultsReducer (eg. 'module:function') and save to '<filename>_metrics.json'
+#------------------------------------------------------------------------------
+def reduceResults(reducer=None, local=False, combiner=None):
+    from .. import sim
+
+    reducer = _loadFunction(reducer or sim.cfg.resultsReducer)
+
+    # reduce data of each node (gather skipped); list of node metrics combined in rank 0 by cfg.resultsCombiner (saved as list if not set)
+    if local:
+        metrics = reducer(sim.simData)
+        nodesMetrics = sim.pc.py_alltoall([metrics] + [None]*(sim.nhosts-1))
+        if sim.rank != 0:
+            return
+        combiner = combiner or getattr(sim.cfg, 'resultsCombiner', None)
+        metrics = _loadFunction(combiner)(nodesMetrics) if combiner else nodesMetrics
+
+    # reduce gathered data
+    else:
+        if sim.rank != 0:
+            return
+        metrics = reducer(sim.allSimData)
+
+    sim.allMetrics = metrics
+    filePath = sim.cfg.filename + '_metrics.json'
+    print(('  Saving metrics to %s ... ' % (filePath)))
+    sim.saveJSON(filePath, {'simLabel': sim.cfg.simLabel, 'metrics': metrics})
+    return metrics
+
+
+def _loadFunction(function):
+    import os
+    import importlib
+
+    # function, 'module:function' or 'path/file.py:function'
+    if callable(function):
+        return function
+    moduleName, functionName = function.rsplit(':', 1)
+    if moduleName.endswith('.py'):
+        try:  # py3
+            import types
+            loader = importlib.machinery.SourceFileLoader(os.path.basename(moduleName)[:-3], moduleName)
+            module = types.ModuleType(loader.name)
+            loader.exec_module(module)
+        except AttributeError:  # py2
+            import imp
+            module = imp.load_source(os.path.basename(moduleName)[:-3], moduleName)
+    else:
+        module = importlib.import_module(moduleName)
+    return getattr(module, functionName)
 
 
 #------------------------------------------------------------------------------
@@ -245,81 +1057,72 @@ def compactConnFormat():
         cell.conns = newConns 
 
 #------------------------------------------------------------------------------
-# Gathers data in master and saves it mid run
+# Saves data recorded in each node since last interval (mid run; no gather)
 #------------------------------------------------------------------------------
-def intervalSave (t):
+def intervalSave (t, folder='temp'):
     from .. import sim
-    from ..specs import Dict
-    import pickle
-    
-    sim.pc.barrier()    
-    
-    gatherLFP=True
-    simDataVecs = ['spkt','spkid','stims']+list(sim.cfg.recordTraces.keys())
-    singleNodeVecs = ['t']
-        
-    netPopsCellGids = {popLabel: list(pop.cellGids) for popLabel,pop in sim.net.pops.items()}
-
-    # gather only sim data
-    nodeData = {'simData': sim.simData}
-    data = [None]*sim.nhosts
-    data[0] = {}
-    for k,v in nodeData.items():
-        data[0][k] = v
-    gather = sim.pc.py_alltoall(data)
-    sim.pc.barrier()
-    if sim.rank == 0: # simData
-        print('  Gathering only sim data in master...')
-        sim.allSimData = Dict()
-        for k in list(gather[0]['simData'].keys()):  # initialize all keys of allSimData dict
-            if gatherLFP and k == 'LFP':
-                sim.allSimData[k] = np.zeros((gather[0]['simData']['LFP'].shape))
-            else:
-                sim.allSimData[k] = {}
-        for key in singleNodeVecs: # store single node vectors (eg. 't')
-            sim.allSimData[key] = list(nodeData['simData'][key])
-        # fill in allSimData taking into account if data is dict of h.Vector (code needs improvement to be more generic)
-        for node in gather:  # concatenate data from each node
-            for key,val in node['simData'].items():  # update simData dics of dics of h.Vector
-                if key in simDataVecs:          # simData dicts that contain Vectors
-                    if isinstance(val, dict):
-                        for cell,val2 in val.items():
-                            if isinstance(val2,dict):
-                                sim.allSimData[key].update(Dict({cell:Dict()}))
-                                for stim,val3 in val2.items():
-                                    sim.allSimData[key][cell].update({stim:list(val3)}) # udpate simData dicts which are dicts of dicts of Vectors (eg. ['stim']['cell_1']['backgrounsd']=h.Vector)
-                            else:
-                                sim.allSimData[key].update({cell:list(val2)})  # udpate simData dicts which are dicts of Vectors (eg. ['v']['cell_1']=h.Vector)
-                    else:
-                        sim.allSimData[key] = list(sim.allSimData[key])+list(val) # udpate simData dicts which are Vectors
-                elif gatherLFP and key == 'LFP':
-                    sim.allSimData[key] += np.array(val)
-                elif key not in singleNodeVecs:
-                    sim.allSimData[key].update(val)           # update simData dicts which are not Vectors
-        
-        
-        if len(sim.allSimData['spkt']) > 0:
-            sim.allSimData['spkt'], sim.allSimData['spkid'] = zip(*sorted(zip(sim.allSimData['spkt'], sim.allSimData['spkid']))) # sort spks
-            sim.allSimData['spkt'], sim.allSimData['spkid'] = list(sim.allSimData['spkt']), list(sim.allSimData['spkid'])
-
-        name = 'temp/data_{:0.0f}.pkl'.format(t)
-        with open(name, 'wb') as f:
-            pickle.dump(dict(sim.allSimData), f, protocol=2)
-
-        # clean to avoid mem leaks
-        for node in gather:
-            if node:
-                node.clear()
-                del node
-        for item in data:
-            if item:
-                item.clear()
-                del item
+    import json, os
+    import numpy as np
+
+    # each node appends new data to its own binary file (float64 chunks) and index file (one json line per chunk);
+    # files are merged after the simulation by sim.fileGather()
+    dataFilename = os.path.join(folder, 'node_%d.dat' % (sim.rank))
+    indexFilename = os.path.join(folder, 'node_%d.idx' % (sim.rank))
+
+    # offsets of data already saved; reset if starting new set of files
+    if not os.path.exists(indexFilename) or not hasattr(sim, '_intervalSaveOffsets'):
+        sim._intervalSaveOffsets = {}
+    offsets = sim._intervalSaveOffsets
+
+    spikeVecs = ['spkt', 'spkid', 'stims']  # vectors of spikes are cleared after saving
+    traceVecs = list(sim.cfg.recordTraces.keys()) + (['t'] if sim.rank == 0 else [])  # recorded vectors keep growing
+    lfpArrays = ['LFP', 'LFPCells']  # preallocated arrays (time x electrodes)
+
+    def _iterVectors(data, path):
+        if isinstance(data, dict):
+            for k, v in data.items():
+                for item in _iterVectors(v, path + [k]):
+                    yield item
+        else:
+            yield path, data
+
+    chunks = []  # list of (key, array, extra index info)
+    for key in spikeVecs + traceVecs:
+        if key not in sim.simData:
+            continue
+        for path, vec in _iterVectors(sim.simData[key], [key]):
+            offset = offsets.get(tuple(path), 0) if key in traceVecs else 0
+            if len(vec) > offset:
+                chunks.append((path, np.array(vec.as_numpy()[offset:]), {}))
+                if key in traceVecs: 
+                    offsets[tuple(path)] = len(vec)
+
+    lastRow = int(round(t / sim.cfg.recordStep))
+    for key in lfpArrays:
+        if key not in sim.simData:
+            continue
+        arrays = sim.simData[key].items() if isinstance(sim.simData[key], dict) else [(None, sim.simData[key])]
+        for subkey, array in arrays:
+            path = [key] if subkey is None else [key, subkey]
+            firstRow = offsets.get(tuple(path), 0)
+            endRow = min(lastRow, array.shape[0])
+            if endRow > firstRow:
+                chunks.append((path, array[firstRow:endRow, :], {'row': firstRow, 'fullShape': list(array.shape)}))
+                offsets[tuple(path)] = endRow
+
+    with open(dataFilename, 'ab') as dataFile, open(indexFilename, 'a') as indexFile:
+        for path, array, info in chunks:
+            entry = {'key': path, 'offset': dataFile.tell(), 'shape': list(array.shape)}
+            entry.update(info)
+            np.ascontiguousarray(array, dtype=np.float64).tofile(dataFile)
+            indexFile.write(json.dumps(entry) + '\n')
+
+    # clear spike vectors to limit memory
+    for key in spikeVecs:
+        if key in sim.simData:
+            for path, vec in _iterVectors(sim.simData[key], [key]):
+                vec.resize(0)
 
-    sim.pc.barrier()
-    for k, v in sim.simData.items():
-        if k in ['spkt', 'spkid', 'stims']:
-            v.resize(0)
     
 #------------------------------------------------------------------------------
 # Save data in each node
@@ -349,11 +1152,14 @@ def saveInNode(gatherLFP=True, include=None, filename=None):
     if gatherLFP and sim.cfg.recordLFP and hasattr(sim.net, 'compartCells') and sim.cfg.createNEURONObj:
         for cell in sim.net.compartCells:
             try:
-                del cell.imembVec
-                del cell.imembPtr
                 del cell._segCoords
             except:
                 pass
+        for attr in ['imembVec', 'imembPtr', 'imembBuffer', 'imembBufferSteps']:
+            try:
+                delattr(sim.net, attr)
+            except:
+                pass
         for pop in list(sim.net.pops.values()):
             try:
                 del pop._morphSegCoords
@@ -369,23 +1175,7 @@ def saveInNode(gatherLFP=True, include=None, filename=None):
         sim.net.allCells = [c.__dict__ for c in sim.net.cells]
     sim.net.allPops = ODict()
     for popLabel,pop in sim.net.pops.items(): sim.net.allPops[popLabel] = pop.__getstate__() # can't use dict comprehension for OrderedDict
-    saveData = Dict()
-    for k in list(sim.simData.keys()):  # initialize all keys of allSimData dict
-        saveData[k] = Dict()
-    for key,val in sim.simData.items():  # update simData dics of dics of h.Vector
-            if key in simDataVecs+singleNodeVecs:          # simData dicts that contain Vectors
-                if isinstance(val,dict):
-                    for cell,val2 in val.items():
-                        if isinstance(val2,dict):
-                            saveData[key].update(Dict({cell:Dict()}))
-                            for stim,val3 in val2.items():
-                                saveData[key][cell].update({stim:list(val3)}) # udpate simData dicts which are dicts of dicts of Vectors (eg. ['stim']['cell_1']['backgrounsd']=h.Vector)
-                        else:
-                            saveData[key].update({cell:list(val2)})  # udpate simData dicts which are dicts of Vectors (eg. ['v']['cell_1']=h.Vector)
-                else:
-                    saveData[key] = list(saveData[key])+list(val) # udpate simData dicts which are Vectors
-            else:
-                saveData[key] = val           # update simData dicts which are not Vectors
+    saveData = gather._mergeSimData([sim.simData], simDataVecs, singleNodeVecs)
 
     if filename: sim.cfg.filename = filename
 
@@ -438,10 +1228,7 @@ def saveInNode(gatherLFP=True, include=None, filename=None):
     if 'netPops' in include: net['pops'] = sim.net.allPops
     if net: dataSave['net'] = net
     if 'simConfig' in include: dataSave['simConfig'] = sim.cfg.__dict__
-    if 'simData' in include: 
-        if 'LFP' in saveData: 
-            saveData['LFP'] = saveData['LFP'].tolist() 
-        dataSave['simData'] = saveData
+    if 'simData' in include: dataSave['simData'] = saveData  # numpy arrays converted to lists only when saving to json
 
 
     if dataSave:
@@ -461,12 +1248,10 @@ def saveInNode(gatherLFP=True, include=None, filename=None):
                 pickle.dump(dataSave, fileObj)
             print('Finished saving!')
 
-        # Save to dpk file
+        # Save to dpk file (compressed pickle)
         if sim.cfg.saveDpk:
-            import gzip
             print(('Saving output as %s ... ' % (filePath+'.dpk')))
-            #fn=filePath #.split('.')
-            gzip.open(filePath, 'wb').write(pk.dumps(dataSave)) # write compressed string
+            sim.saveDpk(filePath+'.dpk', dataSave, codec=sim.cfg.saveDpkCodec, level=sim.cfg.saveDpkLevel, threads=sim.cfg.saveDpkThreads)
             print('Finished saving!')
 
         # Save to json file
@@ -474,7 +1259,7 @@ def saveInNode(gatherLFP=True, include=None, filename=None):
             # Make it work for Python 2+3 and with Unicode
             print(('Saving output as %s ... ' % (filePath+'.json ')))
             #dataSave = utils.replaceDictODict(dataSave)  # not required since json saves as dict
-            sim.saveJSON(filePath+ str(sim.rank) + '.json', dataSave)
+            sim.saveJSON(filePath+ str(sim.rank) + '.json', dataSave, index=True)
             print('Finished saving!')
 
         # Save to mat file
@@ -484,12 +1269,10 @@ def saveInNode(gatherLFP=True, include=None, filename=None):
             savemat(filePath+'.mat', utils.tupleToList(utils.replaceNoneObj(dataSave)))  # replace None and {} with [] so can save in .mat format
             print('Finished saving!')
 
-        # Save to HDF5 file (uses very inefficient hdf5storage module which supports dicts)
+        # Save to HDF5 file (h5py; columnar cell tags and CSR conns)
         if sim.cfg.saveHDF5:
-            dataSaveUTF8 = utils._dict2utf8(utils.replaceNoneObj(dataSave)) # replace None and {} with [], and convert to utf
-            import hdf5storage
-            print(('Saving output as %s... ' % (filePath+'.hdf5')))
-            hdf5storage.writes(dataSaveUTF8, filename=filePath+'.hdf5')
+            print(('Saving output as %s... ' % (filePath+'.h5')))
+            sim.saveH5(filePath+'.h5', dataSave)
             print('Finished saving!')
 
         # Save to CSV file (currently only saves spikes)
@@ -226,14 +226,37 @@ def setupRecordLFP():
     
     if sim.cfg.createNEURONObj:
         for cell in sim.net.compartCells:
-            nseg = cell._segCoords['p0'].shape[1]
             sim.net.recXElectrode.calcTransferResistance(cell.gid, cell._segCoords)  # transfer resistance for each cell
-            cell.imembPtr = h.PtrVector(nseg)  # pointer vector
-            cell.imembPtr.ptr_update_callback(cell.setImembPtr)   # used for gathering an array of  i_membrane values from the pointer vector
-            cell.imembVec = h.Vector(nseg)
+
+        # stack transfer resistances of all cells in node so LFP is calculated with a single matrix product
+        tr = sim.net.recXElectrode.stackTransferResistances([cell.gid for cell in sim.net.compartCells], 
+                                                            sparseTol=getattr(sim.cfg, 'recordLFPSparseTol', 0))
+        nseg = tr.shape[1]
 
         sim.cvode.use_fast_imem(1)   # make i_membrane_ a range variable
-        
+
+        if nseg > 0:
+            sim.net.imembPtr = h.PtrVector(nseg)  # pointer vector with i_membrane_ of all segments in node (set up once)
+            sim.net.imembPtr.ptr_update_callback(_setImembPtr)   # update pointers if NEURON reallocates memory
+            sim.net.imembVec = h.Vector(nseg)  # used for gathering an array of i_membrane values from the pointer vector
+            _setImembPtr()
+
+            # buffer of i_membrane_ (segments x recording steps) so LFP is calculated with one matrix product per window
+            window = min(max(int(getattr(sim.cfg, 'recordLFPWindow', 1)), 1), max(saveSteps, 1))
+            sim.net.imembBuffer = np.zeros((nseg, window))
+            sim.net.imembBufferSteps = []  # LFP save step of each buffered column
+
+
+#------------------------------------------------------------------------------
+# Set pointers to i_membrane_ of all segments in node (used for LFP calc)
+#------------------------------------------------------------------------------
+def _setImembPtr():
+    from .. import sim
+
+    segRanges = sim.net.recXElectrode.segRanges
+    for cell in sim.net.compartCells:
+        cell.setImembPtr(sim.net.imembPtr, segRanges[cell.gid][0])
+
 
 #------------------------------------------------------------------------------
 # Setup Recording
@@ -322,9 +322,9 @@ def replaceNoneObj (obj):
         for key,val in obj.items():
             if isinstance(val, (list, dict, Dict, ODict)):
                 replaceNoneObj(val)
-            if val == None:
+            if val is None:
                 obj[key] = []
-            elif val == {}:
+            elif isinstance(val, dict) and len(val) == 0:
                 obj[key] = [] # also replace empty dicts with empty list
     return obj
 
@@ -495,6 +495,8 @@ def _dict2utf8 (obj):
                 obj[str(key).decode('utf8')] = obj[key]
                 obj.pop(key)
         return dict(list(map(_dict2utf8, iter(obj.items()))))
+    elif isinstance(obj, np.ndarray):
+        return obj
     elif isinstance(obj, collections.Iterable):
         return type(obj)(list(map(_dict2utf8, obj)))
     else:
@@ -511,35 +513,38 @@ def clearAll ():
     sim.pc.barrier()
     sim.pc.gid_clear()                    # clear previous gid settings
 
-    # clean cells and simData in all nodes
-    sim.clearObj([cell.__dict__ if hasattr(cell, '__dict__') else cell for cell in sim.net.cells])
-    if 'stims' in list(sim.simData.keys()):
-        sim.clearObj([stim for stim in sim.simData['stims']])
+    # clean cells and simData in all nodes (tolerates partially created network, eg. failed batch job)
+    net = getattr(sim, 'net', None)
+    sim.clearObj([cell.__dict__ if hasattr(cell, '__dict__') else cell for cell in getattr(net, 'cells', [])])
+    simData = getattr(sim, 'simData', None) or {}
+    if 'stims' in list(simData.keys()):
+        sim.clearObj([stim for stim in simData['stims']])
 
-    for key in list(sim.simData.keys()): del sim.simData[key]
-    for c in sim.net.cells: del c
-    for p in sim.net.pops: del p
-    del sim.net.params
+    for key in list(simData.keys()): del simData[key]
+    if hasattr(net, 'params'): del net.params
 
 
-    # clean cells and simData gathered in master node
+    # clean cells and simData gathered in master node (allSimData not created if gather skipped or job failed)
     if sim.rank == 0:
-        if hasattr(sim.net, 'allCells'):
-            sim.clearObj([cell.__dict__ if hasattr(cell, '__dict__') else cell for cell in sim.net.allCells])
-        if hasattr(sim, 'allSimData') and 'stims' in list(sim.allSimData.keys()):
-            sim.clearObj([stim for stim in sim.allSimData['stims']])
+        if hasattr(net, 'allCells'):
+            sim.clearObj([cell.__dict__ if hasattr(cell, '__dict__') else cell for cell in net.allCells])
+        allSimData = getattr(sim, 'allSimData', None) or {}
+        if 'stims' in list(allSimData.keys()):
+            sim.clearObj([stim for stim in allSimData['stims']])
 
-        for key in list(sim.allSimData.keys()): del sim.allSimData[key]
-        for c in sim.net.allCells: del c
-        for p in sim.net.allPops: del p
-        del sim.net.allCells
-        del sim.allSimData
+        for key in list(allSimData.keys()): del allSimData[key]
+        for attr in ['allCells', 'allPops']:
+            if hasattr(net, attr): delattr(net, attr)
+        if hasattr(sim, 'allSimData'): del sim.allSimData
 
         import matplotlib
         matplotlib.pyplot.clf()
         matplotlib.pyplot.close('all')
 
-    del sim.net
+    if hasattr(sim, 'net'): del sim.net
+
+    from ..cell.inputs import closeSpkTimesFiles
+    closeSpkTimesFiles()  # in case cell creation was interrupted
 
     import gc; gc.collect()
     
@@ -87,7 +87,7 @@ def createSimulateAnalyze (netParams=None, simConfig=None, output=False):
     if output: return (pops, cells, conns, stims, simData)
     
 #------------------------------------------------------------------------------
-# Wrapper to create, simulate, and analyse network, while saving to master in intervals
+# Wrapper to create, simulate, and analyse network, while saving data of each node in intervals
 #------------------------------------------------------------------------------
 def intervalCreateSimulateAnalyze (netParams=None, simConfig=None, output=False, interval=None):
     ''' Sequence of commands create, simulate and analyse network '''
@@ -271,7 +271,7 @@ class NetParams (object):
         # Save to json file
         if ext == 'json':
             print(('Saving netParams to %s ... ' % (filename)))
-            sim.saveJSON(filename, dataSave)
+            sim.saveJSON(filename, dataSave, indent=4)
 
     def addCellParams(self, label=None, params=None):
         if not label:
@@ -469,7 +469,7 @@ class NetParams (object):
                 pickle.dump(cellRule, fileObj)
         elif ext == 'json':
             import sim
-            sim.saveJSON(fileName, cellRule)
+            sim.saveJSON(fileName, cellRule, indent=4)
 
 
     def loadCellParamsRule(self, label, fileName):
@@ -45,6 +45,9 @@ class SimConfig (object):
         self.addSynMechs = True  # whether to add synaptich mechanisms or not
         self.includeParamsLabel = True  # include label of param rule that created that cell, conn or stim
         self.gatherOnlySimData = False  # omits gathering of net+cell data thus reducing gatherData time
+        self.gatherInclude = ['allCells']  # cells to gather (eg. ['allCells'], or list of pop labels and/or gids); selected in each node before gathering
+        self.gatherTimeRange = None  # time range [start, end] of recorded data to gather (None = full simulation)
+        self.gatherFloat32 = False  # store gathered traces and LFP as float32 numpy arrays (spike times always float64)
         self.compactConnFormat = False  # replace dict format with compact list format for conns (need to provide list of keys to include)
         self.connRandomSecFromList = True  # select random section (and location) from list even when synsPerConn=1 
         self.distributeSynsUniformly = True  # locate synapses at uniformly across section list; if false, place one syn per section in section list   
@@ -58,6 +61,8 @@ class SimConfig (object):
         self.timing = True  # show timing of each process
         self.saveTiming = False  # save timing data to pickle file
         self.printRunTime = False  # print run time at interval (in sec) specified here (eg. 0.1)
+        self.earlyStopFunc = None  # function or 'module:function' called with simData of each node and time every earlyStopInterval; simulation stopped if True in any node
+        self.earlyStopInterval = 100  # interval (in ms) to call earlyStopFunc
         self.printPopAvgRates = False  # print population avg firing rates after run
         self.printSynsAfterRule = False  # print total of connections after each conn rule is applied 
         self.verbose = False  # show detailed messages
@@ -70,6 +75,8 @@ class SimConfig (object):
         self.recordLFP = []  # list of 3D locations to record LFP from
         self.recordDipoles = False # record dipoles
         self.saveLFPCells = False  # Store LFP generate individually by each cell 
+        self.recordLFPWindow = 1  # number of recording steps to buffer membrane currents before calculating LFP with one matrix product
+        self.recordLFPSparseTol = 0  # drop LFP transfer resistances below this fraction of max value and store as sparse matrix (0 = dense)
         self.recordStep = 0.1 # Step size in ms to save data (eg. V traces, LFP, etc)
         self.recordTime = True  # record time step of recording
 
@@ -84,8 +91,18 @@ class SimConfig (object):
         self.saveMat = False # save to mat file
         self.saveCSV = False # save to txt file
         self.saveDpk = False # save to .dpk pickled file
-        self.saveHDF5 = False # save to HDF5 file
+        self.saveDpkCodec = 'gzip' # compression used for .dpk file ('gzip', 'zlib', 'lz4' or 'zstd'; non-gzip codecs compress blocks in parallel)
+        self.saveDpkLevel = None # compression level for .dpk file (None = codec default)
+        self.saveDpkThreads = None # number of threads used to compress .dpk blocks (None = number of cpus)
+        self.saveHDF5 = False # save to HDF5 file (h5py; columnar cell tags and CSR conns)
         self.saveDat = False # save traces to .dat file(s)
+        self.saveDistributed = False # skip gather; each node saves its data to a file in folder '<filename>_shards' (rank 0 also saves manifest.json)
+        self.resultsReducer = None # function or 'module:function' called with gathered simData (or simData of each node if gather skipped); returned metrics saved to '<filename>_metrics.json'
+        self.resultsCombiner = None # function or 'module:function' called with list of metrics of each node if gather skipped; list saved unchanged if None
+        self.resultsAddress = None # address 'host:port' to send fitness (or gathered simData) to (set by evol batch); if not reachable saved to '<simLabel>_results.pkl'
+        self.resultsFitnessFunc = None # 'module:function' evaluated with gathered simData; only fitness sent to resultsAddress (set by evol batch from fitnessFunc)
+        self.resultsFitnessFuncArgs = {} # keyword args of resultsFitnessFunc
+        self.resultsAuthKey = None # hex key to authenticate connection to resultsAddress (random key set by batch)
         self.backupCfgFile = [] # copy cfg file, list with [sourceFile,destFolder] (eg. ['cfg.py', 'backupcfg/'])
 
         # error checking
@@ -125,7 +142,7 @@ class SimConfig (object):
         if ext == 'json':
             from .. import sim
             print(('Saving simConfig to %s ... ' % (filename)))
-            sim.saveJSON(filename, dataSave)
+            sim.saveJSON(filename, dataSave, indent=4)
 
     def addAnalysis(self, func, params):
         self.analysis[func] =  params
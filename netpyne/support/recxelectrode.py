@@ -60,8 +60,16 @@ class RecXElectrode(object):
 
         self.nsites = self.pos.shape[1]
         self.transferResistances = {}   # V_e = transfer_resistance*Im
+        self.segRanges = {}  # first and last+1 segment index of each gid in stacked matrix
+        self.sparse = False  # whether stacked transfer resistance matrix is stored in sparse format
+        self.transferResistanceBlocks = {}  # sparse transfer resistances of each gid (only if sparse and cfg.saveLFPCells)
     
     def getTransferResistance(self, gid):
+        if self.sparse and gid in self.segRanges:
+            if gid in self.transferResistanceBlocks:
+                return self.transferResistanceBlocks[gid].toarray()
+            segStart, segEnd = self.segRanges[gid]
+            return self.transferResistanceMatrix[:, segStart:segEnd].toarray()
         return self.transferResistances[gid]
     
     def calcTransferResistance(self, gid, seg_coords):
@@ -74,32 +82,57 @@ class RecXElectrode(object):
                     # equivalent sigma value (~3) is 10x larger than Allen (0.3) 
                     # if use same sigma value, results are consistent
 
-        r05 = (seg_coords['p0'] + seg_coords['p1'])/2
-        dl = seg_coords['p1'] - seg_coords['p0']
+        p0 = np.asarray(seg_coords['p0'], dtype=float)
+        p1 = np.asarray(seg_coords['p1'], dtype=float)
+        r05 = (p0 + p1)/2
+        dl = p1 - p0
         
-        nseg = r05.shape[1]
-        
-        tr = np.zeros((self.nsites,nseg))
-        # tr_NEURON = np.zeros((self.nsites,nseg))  # used to compare with NEURON extracellular example
-
-        for j in range(self.nsites):   # calculate mapping for each site on the electrode
-            rel = np.expand_dims(self.pos[:, j], axis=1)   # coordinates of a j-th site on the electrode
-            rel_05 = rel - r05  # distance between electrode and segment centers
-            r2 = np.einsum('ij,ij->j', rel_05, rel_05)    # compute dot product column-wise, the resulting array has as many columns as original
-            
-            rlldl = np.einsum('ij,ij->j', rel_05, dl)    # compute dot product column-wise, the resulting array has as many columns as original
-            dlmag = np.linalg.norm(dl, axis=0)  # length of each segment
-            rll = abs(rlldl/dlmag)   # component of r parallel to the segment axis it must be always positive
-            rT2 = r2 - rll**2  # square of perpendicular component
-            up = rll + dlmag/2
-            low = rll - dlmag/2
-            num = up + np.sqrt(up**2 + rT2)
-            den = low + np.sqrt(low**2 + rT2)
-            tr[j, :] = np.log(num/den)/dlmag  # units of (1/um) use with imemb_ (total seg current)
+        # calculate mapping for all sites on the electrode at once (arrays of shape nsites x nseg)
+        rel_05 = self.pos[:, :, np.newaxis] - r05[:, np.newaxis, :]  # distance between electrode sites and segment centers
+        r2 = np.einsum('ijk,ijk->jk', rel_05, rel_05)    # squared distance between each site and segment center
+        rlldl = np.einsum('ijk,ik->jk', rel_05, dl)    # dot product with segment axis
+        dlmag = np.linalg.norm(dl, axis=0)  # length of each segment
+        rll = abs(rlldl/dlmag)   # component of r parallel to the segment axis it must be always positive
+        rT2 = r2 - rll**2  # square of perpendicular component
+        up = rll + dlmag/2
+        low = rll - dlmag/2
+        num = up + np.sqrt(up**2 + rT2)
+        den = low + np.sqrt(low**2 + rT2)
+        tr = np.log(num/den)/dlmag  # units of (1/um) use with imemb_ (total seg current)
 
-            # Consistent with NEURON extracellular recording example
-            # r = np.sqrt(rel_05[0,:]**2 + rel_05[1,:]**2 + rel_05[2,:]**2)
-            # tr_NEURON[j, :] = (rho / 4 / math.pi)*(1/r)*0.01
+        # Consistent with NEURON extracellular recording example (all sites at once)
+        # r = np.sqrt(r2)
+        # tr_NEURON = (rho / 4 / math.pi)*(1/r)*0.01
 
         tr *= 1/(4*math.pi*sigma)  # units: 1/um / (mS/mm) = mm/um / mS = 1e3 * kOhm = MOhm
         self.transferResistances[gid] = tr
+
+    def stackTransferResistances(self, gids, sparseTol=0):
+        """Stack transfer resistances of cells into single matrix (nsites x total nseg) so LFP can be computed 
+        with one matrix product; per gid transfer resistances are replaced by views of the stacked matrix.
+        If sparseTol > 0, values below sparseTol*max are dropped and the matrix is stored in sparse (CSR) format 
+        (plus one block per gid if cfg.saveLFPCells, so columns are not sliced at every LFP window)"""
+        trList = [self.transferResistances[gid] for gid in gids]
+        self.transferResistanceMatrix = np.hstack(trList) if trList else np.zeros((self.nsites, 0))
+        self.segRanges = {}
+
+        iseg = 0
+        for gid, tr in zip(gids, trList):
+            nseg = tr.shape[1]
+            self.transferResistances[gid] = self.transferResistanceMatrix[:, iseg:iseg+nseg]
+            self.segRanges[gid] = (iseg, iseg+nseg)
+            iseg += nseg
+
+        if sparseTol and self.transferResistanceMatrix.size > 0:
+            from scipy.sparse import csr_matrix
+            tr = self.transferResistanceMatrix
+            tr[np.abs(tr) < sparseTol * np.abs(tr).max()] = 0.0
+            self.transferResistanceMatrix = csr_matrix(tr)
+            self.sparse = True
+            if self.cfg.saveLFPCells:
+                trColumns = self.transferResistanceMatrix.tocsc()
+                self.transferResistanceBlocks = {gid: trColumns[:, iseg:jseg].tocsr() for gid, (iseg, jseg) in self.segRanges.items()}
+            for gid in gids:
+                del self.transferResistances[gid]  # obtained from sparse matrix via getTransferResistance()
+
+        return self.transferResistanceMatrix
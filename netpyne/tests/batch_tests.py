@@ -0,0 +1,565 @@
+"""
+batch_tests.py
+
+Tests of batch job execution and results: local worker pool, job queue, results server (fitness sent by jobs),
+asynchronous steady-state evolution, result reducers, merged results store, job memoization and model-based
+and multi-fidelity optimization helpers
+
+Run with: python -m unittest netpyne.tests.batch_tests
+"""
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+
+from future import standard_library
+standard_library.install_aliases()
+import os
+import sys
+import json
+import time
+import pickle
+import shutil
+import binascii
+import tempfile
+import unittest
+import numpy as np
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client
+from netpyne import sim, specs
+from netpyne.batch import Batch
+from netpyne.batch.batch import createResultsServer, receiveResults, runWorkerPool
+from netpyne.batch.utils import LocalJobQueue, mergeBatchResults, loadBatchResults, functionRef, jobKey, reuseCachedJob, \
+    registerCachedJob, _gaussianProcess, proposeCandidate, hyperbandFidelities, hyperbandSchedule
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# job script: writes cfg value to <simLabel>_out.json; exits with error (or kills worker) for some values
+JOB_SCRIPT = '''
+import os
+import json
+from netpyne import sim
+cfg, netParams = sim.readCmdLineArgs()
+if cfg.amp < 0:
+    raise ValueError('negative amp')
+if cfg.amp > 100:
+    os._exit(1)
+with open(os.path.join(cfg.saveFolder, cfg.simLabel + '_out.json'), 'w') as fileObj:
+    json.dump({'amp': cfg.amp, 'pid': os.getpid()}, fileObj)
+'''
+
+# evolutionary job script: sends fitness of simData (evaluated in job) to batch
+EVOL_SCRIPT = '''
+from netpyne import sim
+cfg, netParams = sim.readCmdLineArgs()
+sim.cfg = cfg
+sim.allSimData = {'x': [cfg.x, cfg.y]}
+sim.sendSimData()
+'''
+
+# mpi launcher of evolutionary jobs ('mpiexec -np 1 nrniv -python -mpi script args' run as 'python script args')
+MPI_SCRIPT = '''#!%s
+import os
+import sys
+args = sys.argv[sys.argv.index('-mpi')+1:]
+os.environ['PYTHONPATH'] = %r + os.pathsep + os.environ.get('PYTHONPATH', '')
+os.execv(sys.executable, [sys.executable] + args)
+'''
+
+
+# functions set as 'module:function' in cfg of jobs
+def fitness(simData, target=0.0):
+    if 'error' in simData:
+        raise ValueError(simData['error'])
+    return float(sum([(x - target)**2 for x in simData['x']]))
+
+
+def spikeCount(simData):
+    return {'numSpikes': len(simData['spkt']), 'pops': {'E': len([gid for gid in simData['spkid'] if gid < 2])}}
+
+
+def sumCounts(nodesMetrics):
+    return {'numSpikes': sum([metrics['numSpikes'] for metrics in nodesMetrics])}
+
+
+class BatchTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def path(self, *names):
+        return os.path.join(self.folder, *names)
+
+    def writeFile(self, name, text):
+        with open(self.path(name), 'w') as fileObj:
+            fileObj.write(text)
+        return self.path(name)
+
+    def writeJSON(self, name, data):
+        return self.writeFile(name, json.dumps(data))
+
+    def readJSON(self, name):
+        with open(self.path(name), 'r') as fileObj:
+            return json.load(fileObj)
+
+    def batchFiles(self, cfgText):
+        cfgFile = self.writeFile('cfg.py', 'from netpyne import specs\ncfg = specs.SimConfig()\n' + cfgText)
+        netParamsFile = self.writeFile('netParams.py', 'from netpyne import specs\nnetParams = specs.NetParams()\n')
+        return cfgFile, netParamsFile
+
+
+class TestWorkerPool(BatchTestCase):
+
+    def test_grid(self):
+        # grid jobs run by 2 worker processes (each worker runs several jobs)
+        cfgFile, netParamsFile = self.batchFiles('cfg.amp = 0.0\n')
+        batch = Batch(cfgFile, netParamsFile, params={'amp': [0.1, 0.2, 0.3, 0.4, 0.5]})
+        batch.batchLabel = 'pool'
+        batch.saveFolder = self.path('pool')
+        batch.runCfg = {'type': 'pool', 'workers': 2, 'script': self.writeFile('job.py', JOB_SCRIPT)}
+        batch.run()
+
+        outputs = [self.readJSON('pool/pool_%d_out.json' % (i)) for i in range(5)]
+        self.assertEqual([output['amp'] for output in outputs], [0.1, 0.2, 0.3, 0.4, 0.5])
+        self.assertLessEqual(len(set([output['pid'] for output in outputs])), 2)
+        self.assertNotIn(os.getpid(), [output['pid'] for output in outputs])
+
+    def runJobs(self, amps, workers=2):
+        script = self.writeFile('job.py', JOB_SCRIPT)
+        netParamsFile = self.batchFiles('')[1]
+        jobs = []
+        for i, amp in enumerate(amps):
+            cfg = specs.SimConfig()
+            cfg.amp, cfg.simLabel, cfg.saveFolder = amp, 'job_%d' % (i), self.folder
+            cfg.save(self.path('job_%d_cfg.json' % (i)))
+            jobs.append((script, self.path('job_%d_cfg.json' % (i)), netParamsFile, self.path('job_%d' % (i))))
+        runWorkerPool(jobs, workers)
+
+    def test_failedJob(self):
+        # exception in job reported in .err; worker runs next jobs
+        self.runJobs([0.1, -1.0, 0.3], workers=1)
+        self.assertEqual([os.path.isfile(self.path('job_%d_out.json' % (i))) for i in range(3)], [True, False, True])
+        with open(self.path('job_1.err'), 'r') as fileObj:
+            self.assertIn('negative amp', fileObj.read())
+
+    def test_brokenPool(self):
+        # job that kills its worker is skipped; other jobs (started or queued in broken pool) are rerun
+        self.runJobs([0.1, 0.2, 1000.0, 0.4, 0.5, 0.6])
+        self.assertEqual([os.path.isfile(self.path('job_%d_out.json' % (i))) for i in range(6)], [True, True, False, True, True, True])
+
+
+class TestLocalJobQueue(unittest.TestCase):
+
+    def command(self, duration):
+        return [sys.executable, '-c', 'import time; time.sleep(%f)' % (duration)]
+
+    def test_cores(self):
+        # jobs start only when enough cores are free
+        queue = LocalJobQueue(totalCores=4, pollInterval=0.01)
+        procs = [queue.submit(self.command(0.3), cores) for cores in [2, 2, 3, 1]]
+        self.assertIsNotNone(procs[0].poll())  # 3rd job waited for 1st and 2nd
+        self.assertIsNotNone(procs[1].poll())
+        self.assertIsNone(procs[2].poll())
+        self.assertEqual(queue.usedCores(), 4)
+        queue.wait()
+        self.assertEqual(queue.usedCores(), 0)
+        self.assertEqual([proc.returncode for proc in procs], [0, 0, 0, 0])
+
+    def test_tooManyCores(self):
+        # job requiring more cores than available runs alone
+        queue = LocalJobQueue(totalCores=2, pollInterval=0.01)
+        first = queue.submit(self.command(0.2), 1)
+        second = queue.submit(self.command(0.2), 8)
+        self.assertIsNotNone(first.poll())
+        self.assertEqual(queue.usedCores(), 2)
+        queue.wait()
+        self.assertEqual(second.returncode, 0)
+
+
+class TestResultsServer(unittest.TestCase):
+
+    def setUp(self):
+        self.results, self.address, self.authKey = createResultsServer()
+        self.folder = tempfile.mkdtemp()
+        self.cfg = getattr(sim, 'cfg', None)
+        sim.cfg = specs.SimConfig()
+        sim.cfg.simLabel, sim.cfg.saveFolder = 'job', self.folder
+        sim.cfg.resultsAddress, sim.cfg.resultsAuthKey = self.address, self.authKey
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+        sim.cfg = self.cfg
+
+    def send(self, result, authKey):
+        host, port = self.address.split(':')
+        conn = Client((host, int(port)), authkey=binascii.unhexlify(authKey))
+        conn.send_bytes(pickle.dumps(result))
+        conn.close()
+
+    def test_roundTrip(self):
+        self.send({'simLabel': 'job_0', 'fitness': 1.5}, self.authKey)
+        self.send({'simLabel': 'job_1', 'fitness': 2.5}, self.authKey)
+        results = []
+        for i in range(10):
+            results.extend(receiveResults(self.results, 1))
+            if len(results) == 2: break
+        self.assertEqual(sorted([(result['simLabel'], result['fitness']) for result in results]), [('job_0', 1.5), ('job_1', 2.5)])
+        self.assertEqual(receiveResults(self.results, 0.05), [])
+
+    def test_badAuthKey(self):
+        # connection with wrong key rejected (result not unpickled); server keeps accepting jobs with key
+        with self.assertRaises(AuthenticationError):
+            self.send({'simLabel': 'job_0', 'fitness': 0.0}, binascii.hexlify(os.urandom(32)).decode())
+        self.send({'simLabel': 'job_1', 'fitness': 1.0}, self.authKey)
+        self.assertEqual(receiveResults(self.results, 5), [{'simLabel': 'job_1', 'fitness': 1.0}])
+
+    def test_sendFitness(self):
+        # job evaluates fitness and sends only fitness (not simData)
+        sim.cfg.resultsFitnessFunc, sim.cfg.resultsFitnessFuncArgs = 'netpyne.tests.batch_tests:fitness', {'target': 1.0}
+        sim.allSimData = {'x': [1.0, 3.0], 'spkt': list(range(1000))}
+        sim.sendSimData()
+        self.assertEqual(receiveResults(self.results, 5), [{'simLabel': 'job', 'fitness': 4.0}])
+
+    def test_sendFitnessError(self):
+        sim.cfg.resultsFitnessFunc = 'netpyne.tests.batch_tests:fitness'
+        sim.allSimData = {'error': 'no spikes'}
+        sim.sendSimData()
+        self.assertEqual(receiveResults(self.results, 5), [{'simLabel': 'job', 'fitnessError': 'ValueError: no spikes'}])
+
+    def test_sendSimData(self):
+        sim.cfg.resultsFitnessFunc = None
+        sim.allSimData = {'x': [1.0, 3.0]}
+        sim.sendSimData()
+        self.assertEqual(receiveResults(self.results, 5), [{'simLabel': 'job', 'simData': {'x': [1.0, 3.0]}}])
+
+    def test_sendUnreachable(self):
+        # result saved to <simLabel>_results.pkl if batch rejects connection
+        sim.cfg.resultsFitnessFunc = 'netpyne.tests.batch_tests:fitness'
+        sim.cfg.resultsAuthKey = binascii.hexlify(os.urandom(32)).decode()
+        sim.allSimData = {'x': [2.0]}
+        sim.sendSimData()
+        with open(os.path.join(self.folder, 'job_results.pkl'), 'rb') as fileObj:
+            self.assertEqual(pickle.load(fileObj), {'simLabel': 'job', 'fitness': 4.0})
+
+    def test_collectJobs(self):
+        # fitness of results sent by jobs; default fitness if fitnessFunc failed or job timed out
+        batch = Batch()
+        batch.resultsServer = self.results
+        running = {'a': ([0.1], os.path.join(self.folder, 'a'), time.time(), None),
+                   'b': ([0.2], os.path.join(self.folder, 'b'), time.time(), None),
+                   'c': ([0.3], os.path.join(self.folder, 'c'), time.time() - 100, None),
+                   'd': ([0.4], os.path.join(self.folder, 'd'), time.time(), None)}
+        self.send({'simLabel': 'a', 'fitness': 2.0}, self.authKey)
+        self.send({'simLabel': 'b', 'fitnessError': 'ValueError: no spikes'}, self.authKey)
+        time.sleep(0.2)
+        args = {'type': 'pool', 'maxiter_wait': 10, 'time_sleep': 1, 'fitnessFunc': fitness}
+        finished = batch.collectJobs(running, {}, args)
+        self.assertEqual(sorted([(jobName, fitness) for jobName, candidate, fitness in finished]), [('a', 2.0), ('b', float('inf')), ('c', float('inf'))])
+        self.assertEqual(list(running.keys()), ['d'])
+
+    def test_collectPartialOutput(self):
+        # output file being written (not parsed yet) retried on next poll instead of setting default fitness
+        batch = Batch()
+        batch.resultsServer = self.results
+        jobPath = os.path.join(self.folder, 'a')
+        running = {'a': ([0.1], jobPath, time.time(), None)}
+        with open(jobPath + '.json', 'w') as fileObj:
+            fileObj.write('{"simData": {"x": [1.0, ')
+        args = {'type': 'pool', 'maxiter_wait': 10, 'time_sleep': 0.05, 'fitnessFunc': fitness}
+        self.assertEqual(batch.collectJobs(running, {}, args), [])
+        self.assertEqual(list(running.keys()), ['a'])
+        with open(jobPath + '.json', 'w') as fileObj:
+            fileObj.write('{"simData": {"x": [1.0, 3.0]}}')
+        self.assertEqual(batch.collectJobs(running, {}, args), [('a', [0.1], 10.0)])
+
+    def test_collectReused(self):
+        # memoized job saves sent result, so job reused by resumed optimization is collected without waiting for timeout
+        from netpyne.sim.save import _markJobSaved
+        from netpyne.batch.utils import JOB_RESULT_EXTS
+        cache, key, jobPath = os.path.join(self.folder, '_jobCache'), jobKey('{"amp": 0.1}'), os.path.join(self.folder, 'job')
+        registerCachedJob(cache, key, jobPath)
+        with open(jobPath + '.h5', 'w') as fileObj:
+            fileObj.write('')
+        sim.cfg.filename, sim.rank = jobPath, 0
+        _markJobSaved()
+        self.assertFalse(reuseCachedJob(cache, key, os.path.join(self.folder, 'job_1'), JOB_RESULT_EXTS))  # fitness can't be loaded from .h5
+
+        registerCachedJob(cache, key, jobPath)
+        sim.cfg.resultsFitnessFunc = 'netpyne.tests.batch_tests:fitness'
+        sim.allSimData = {'x': [2.0]}
+        sim.sendSimData()
+        _markJobSaved()
+        self.assertEqual(receiveResults(self.results, 5), [{'simLabel': 'job', 'fitness': 4.0}])
+        self.assertTrue(reuseCachedJob(cache, key, os.path.join(self.folder, 'job_1'), JOB_RESULT_EXTS))
+
+        batch = Batch()
+        batch.resultsServer = self.results
+        running = {'job_1': ([0.1], os.path.join(self.folder, 'job_1'), time.time(), None)}
+        args = {'type': 'pool', 'maxiter_wait': 10, 'time_sleep': 0.05, 'fitnessFunc': fitness}
+        self.assertEqual(batch.collectJobs(running, {}, args), [('job_1', [0.1], 4.0)])
+
+
+class TestAsyncEvolution(BatchTestCase):
+
+    def test_asyncSteadyState(self):
+        # candidates evaluated by jobs run with (fake) mpi command; fitness sent by jobs
+        cfgFile, netParamsFile = self.batchFiles('cfg.x = 0.0\ncfg.y = 0.0\n')
+        mpiCommand = self.writeFile('mpiexec', MPI_SCRIPT % (sys.executable, ROOT))
+        os.chmod(mpiCommand, 0o755)
+        batch = Batch(cfgFile, netParamsFile, seed=1)
+        batch.batchLabel = 'evol'
+        batch.saveFolder = self.path('evol')
+        batch.method = 'evol'
+        batch.params = [{'label': 'x', 'values': [-1.0, 1.0]}, {'label': 'y', 'values': [0.0, 2.0]}]
+        batch.evolCfg = {'evolAlgorithm': 'asyncSteadyState', 'fitnessFunc': fitness, 'fitnessFuncArgs': {'target': 0.5},
+                         'pop_size': 4, 'max_evaluations': 8, 'num_workers': 2, 'mutation_rate': 0.4, 'crossover': 0.5}
+        batch.runCfg = {'type': 'mpi_direct', 'script': self.writeFile('job.py', EVOL_SCRIPT), 'mpiCommand': mpiCommand, 'totalCores': 2, 'time_sleep': 0.1}
+        with self.assertRaises(SystemExit):
+            batch.run()
+
+        with open(self.path('evol', 'evol_stats_indiv.cvs'), 'r') as fileObj:
+            individuals = [line.split(', ', 3) for line in fileObj.read().splitlines()[1:]]
+        self.assertEqual(len(individuals), 8)
+        for gen, cand, fit, candidate in individuals:
+            x, y = json.loads(candidate)
+            self.assertTrue(-1.0 <= x <= 1.0 and 0.0 <= y <= 2.0)
+            self.assertAlmostEqual(float(fit), (x - 0.5)**2 + (y - 0.5)**2)
+        with open(self.path('evol', 'evol_stats.cvs'), 'r') as fileObj:
+            self.assertEqual(len(fileObj.read().splitlines()), 3)  # header and 2 generations
+
+
+    def test_saveDistributed(self):
+        # jobs that skip gathering can't send fitness (rejected instead of timing out)
+        batch = Batch()
+        batch.method, batch.cfg = 'evol', specs.SimConfig()
+        batch.cfg.saveDistributed = True
+        with self.assertRaises(ValueError):
+            batch.initJobs({'type': 'mpi_direct', 'fitnessFunc': fitness})
+        self.assertFalse(hasattr(batch, 'resultsServer'))
+
+
+class TestReduceResults(BatchTestCase):
+
+    def setUp(self):
+        BatchTestCase.setUp(self)
+        self.cfg = getattr(sim, 'cfg', None)
+        sim.cfg = specs.SimConfig()
+        sim.cfg.simLabel, sim.cfg.filename = 'job', self.path('job')
+        sim.simData = sim.allSimData = {'spkt': [1.0, 2.0, 3.0], 'spkid': [0, 1, 5]}
+        sim.pc, sim.rank, sim.nhosts = sim.h.ParallelContext(), 0, 1
+
+    def tearDown(self):
+        BatchTestCase.tearDown(self)
+        sim.cfg = self.cfg
+
+    def test_reducer(self):
+        metrics = sim.reduceResults('netpyne.tests.batch_tests:spikeCount')
+        self.assertEqual(metrics, {'numSpikes': 3, 'pops': {'E': 2}})
+        self.assertEqual(self.readJSON('job_metrics.json'), {'simLabel': 'job', 'metrics': metrics})
+
+    def test_combiner(self):
+        # metrics of each node combined by cfg.resultsCombiner (list of node metrics if not set)
+        self.assertEqual(sim.reduceResults(spikeCount, local=True), [{'numSpikes': 3, 'pops': {'E': 2}}])
+        sim.cfg.resultsCombiner = 'netpyne.tests.batch_tests:sumCounts'
+        self.assertEqual(sim.reduceResults(spikeCount, local=True), {'numSpikes': 3})
+        self.assertEqual(self.readJSON('job_metrics.json')['metrics'], {'numSpikes': 3})
+
+    def test_functionRef(self):
+        self.assertEqual(functionRef(spikeCount), 'netpyne.tests.batch_tests:spikeCount')
+        self.assertEqual(functionRef('analysis.py:rate'), 'analysis.py:rate')
+        self.assertEqual(functionRef(None), None)
+        with self.assertRaises(ValueError):
+            functionRef(lambda simData: 0)
+
+
+class TestMergeResults(BatchTestCase):
+
+    def setUp(self):
+        BatchTestCase.setUp(self)
+        # 2x11 grid: params amp and nested IClamp1.dur; metrics and spikes saved by some jobs
+        self.writeJSON('grid_batch.json', {'batch': {'params': [{'label': 'amp'}, {'label': ['IClamp1', 'dur']}]}})
+        self.jobs = [(i, j) for i in range(2) for j in range(11)]
+        for i, j in self.jobs:
+            simLabel = 'grid_%d_%d' % (i, j)
+            self.writeJSON(simLabel + '_cfg.json', {'simConfig': {'amp': 0.1*i, 'IClamp1': {'dur': 10*j}}})
+            self.writeJSON(simLabel + '_metrics.json', {'metrics': {'rate': float(i+j), 'pops': {'E': {'rate': float(j)}}}})
+            if j % 3:
+                self.writeJSON(simLabel + '.json', {'simData': {'spkt': [float(k) for k in range(j)], 'spkid': [i]*j}})
+        self.writeJSON('grid_0_2_cfg.json.bak', {})
+        self.writeJSON('other_0_cfg.json', {'simConfig': {}})
+
+    def test_layout(self):
+        import h5py
+        filename = mergeBatchResults(self.folder, 'grid', include=['params', 'metrics', 'spikes'], workers=2)
+        self.assertEqual(filename, self.path('grid_results.h5'))
+        with h5py.File(filename, 'r') as hf:
+            self.assertEqual(json.loads(hf.attrs['paramLabels']), ['amp', ['IClamp1', 'dur']])
+            self.assertEqual(hf['index'][:].tolist(), [list(job) for job in self.jobs])  # sorted by grid indices
+            self.assertEqual(sorted(hf['params'].keys()), ['IClamp1.dur', 'amp'])
+            self.assertEqual(sorted(hf['metrics'].keys()), ['pops.E.rate', 'rate'])
+            self.assertEqual(hf['spikes/offsets'][:].tolist(), np.cumsum([0] + [j if j % 3 else 0 for i, j in self.jobs]).tolist())
+            self.assertEqual(hf['spikes/spkt'].dtype, np.float32)
+
+    def test_load(self):
+        results = loadBatchResults(mergeBatchResults(self.folder, 'grid', include=['params', 'metrics', 'spikes'], workers=1), spikes=True)
+        self.assertEqual(results['simLabel'], ['grid_%d_%d' % job for job in self.jobs])
+        np.testing.assert_allclose(results['params']['amp'], [0.1*i for i, j in self.jobs])
+        self.assertEqual(list(results['params']['IClamp1.dur']), [10*j for i, j in self.jobs])
+        np.testing.assert_allclose(results['metrics']['rate'], [i+j for i, j in self.jobs])
+        np.testing.assert_allclose(results['metrics']['pops.E.rate'], [j for i, j in self.jobs])
+        for (i, j), (spkt, spkid) in zip(self.jobs, results['spikes']):
+            np.testing.assert_array_equal(spkt, range(j) if j % 3 else [])
+            np.testing.assert_array_equal(spkid, [i]*j if j % 3 else [])
+
+    def test_withoutSpikes(self):
+        results = loadBatchResults(mergeBatchResults(self.folder, 'grid', workers=1), spikes=True)
+        self.assertNotIn('spikes', results)
+        self.assertEqual(len(results['params']['amp']), len(self.jobs))
+
+
+class TestMemoization(BatchTestCase):
+
+    def batch(self):
+        cfgFile, netParamsFile = self.batchFiles('')
+        batch = Batch(cfgFile, netParamsFile)
+        batch.cfg = specs.SimConfig()
+        batch.cfg.amp = 0.1
+        return batch
+
+    def test_key(self):
+        # key changes with resolved cfg, netParams and mod files (not with labels/paths of job)
+        batch = self.batch()
+        key = batch.cfgKey()
+        batch.cfg.simLabel, batch.cfg.saveFolder = 'other', 'otherFolder'
+        self.assertEqual(batch.cfgKey(), key)
+        batch.cfg.amp = 0.2
+        self.assertNotEqual(batch.cfgKey(), key)
+        batch.cfg.amp = 0.1
+        self.assertEqual(batch.cfgKey(), key)
+        with open(batch.netParamsFile, 'a') as fileObj:
+            fileObj.write('netParams.sizeX = 50\n')
+        self.assertNotEqual(batch.cfgKey(), key)
+        key = batch.cfgKey()
+        modFile = self.writeFile('pas2.mod', 'NEURON { SUFFIX pas2 }\n')
+        self.assertNotEqual(batch.cfgKey(), key)
+        key = batch.cfgKey()
+        with open(modFile, 'a') as fileObj:
+            fileObj.write('PARAMETER { g = 0.001 }\n')
+        self.assertNotEqual(batch.cfgKey(), key)
+        self.assertNotEqual(batch.cfgKey([batch.cfgFile]), batch.cfgKey())
+
+    def saveJob(self, jobPath):
+        # job saves output and marks it as complete (see sim.saveData)
+        from netpyne.sim.save import _markJobSaved
+        self.writeJSON(os.path.basename(jobPath) + '.json', {'simData': {'spkt': [1.0]}})
+        cfg, sim.cfg, sim.rank = getattr(sim, 'cfg', None), specs.SimConfig(), 0
+        sim.cfg.filename = jobPath
+        try:
+            _markJobSaved()
+        finally:
+            sim.cfg = cfg
+
+    def test_reuse(self):
+        # outputs reused (linked to new job) only after job saved them
+        cache, key, jobPath = self.path('_jobCache'), jobKey('{"amp": 0.1}'), self.path('job_0')
+        registerCachedJob(cache, key, jobPath)
+        self.assertTrue(os.path.isfile(jobPath + '.hash.pending'))
+        self.assertFalse(reuseCachedJob(cache, key, self.path('job_1')))
+        self.saveJob(jobPath)
+        self.assertFalse(os.path.isfile(jobPath + '.hash.pending'))
+        self.assertTrue(reuseCachedJob(cache, key, self.path('job_1')))
+        self.assertEqual(self.readJSON('job_1.json'), {'simData': {'spkt': [1.0]}})
+        self.assertFalse(reuseCachedJob(cache, jobKey('{"amp": 0.2}'), self.path('job_2')))
+
+    def test_interrupted(self):
+        # outputs written by job interrupted before marking them saved (or by previous job at same path) not reused
+        cache, key, jobPath = self.path('_jobCache'), jobKey('{"amp": 0.1}'), self.path('job_0')
+        registerCachedJob(cache, key, jobPath)
+        self.writeJSON('job_0.json', {'simData': {}})
+        self.assertFalse(reuseCachedJob(cache, key, self.path('job_1')))
+        self.saveJob(jobPath)
+        registerCachedJob(cache, jobKey('{"amp": 0.2}'), jobPath)  # job with other cfg submitted at same path
+        self.assertFalse(os.path.isfile(jobPath + '.json'))
+        self.assertFalse(reuseCachedJob(cache, key, self.path('job_1')))
+
+
+class TestSurrogates(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.X = rng.uniform(size=(12, 2))
+        self.y = np.sum((self.X - [0.3, 0.7])**2, 1)
+
+    def test_gaussianProcess(self):
+        # posterior interpolates observed points (small noise) with small uncertainty
+        yNorm = (self.y - self.y.mean()) / self.y.std()
+        mu, sigma = _gaussianProcess(self.X, yNorm)(self.X)
+        np.testing.assert_allclose(mu, yNorm, atol=0.05)
+        self.assertLess(sigma.max(), 0.1)
+        mu, sigma = _gaussianProcess(self.X, yNorm)(np.array([[5.0, 5.0]]))  # far from observed: prior
+        self.assertAlmostEqual(mu[0], 0.0, 3)
+        self.assertAlmostEqual(sigma[0], 1.0, 3)
+
+    def test_proposeCandidate(self):
+        # proposals in [0,1]^d (scaled to param bounds by batch); same proposal for same seed
+        for surrogate in ['gp', 'tpe']:
+            proposals = [proposeCandidate(self.X, self.y, np.random.RandomState(seed), surrogate) for seed in range(5)]
+            for proposal in proposals:
+                self.assertEqual(proposal.shape, (2,))
+                self.assertTrue(np.all(proposal >= 0) and np.all(proposal <= 1))
+            np.testing.assert_array_equal(proposals[0], proposeCandidate(self.X, self.y, np.random.RandomState(0), surrogate))
+            self.assertLess(np.sum((np.mean(proposals, 0) - [0.3, 0.7])**2), 0.1)  # near minimum
+
+    def test_pending(self):
+        # pending points (jobs running) avoided by gp proposals
+        proposal = proposeCandidate(self.X, self.y, np.random.RandomState(1), 'gp')
+        pending = [proposal]
+        proposal2 = proposeCandidate(self.X, self.y, np.random.RandomState(1), 'gp', pending=pending)
+        self.assertGreater(np.linalg.norm(proposal2 - proposal), 1e-3)
+
+    def test_nonFinite(self):
+        # failed jobs (infinite fitness) set to worst fitness
+        y = self.y.copy()
+        y[[0, 5]] = float('inf')
+        for surrogate in ['gp', 'tpe']:
+            proposal = proposeCandidate(self.X, y, np.random.RandomState(0), surrogate)
+            self.assertTrue(np.all(np.isfinite(proposal)) and np.all(proposal >= 0) and np.all(proposal <= 1))
+
+    def test_invalidSurrogate(self):
+        with self.assertRaises(ValueError):
+            proposeCandidate(self.X, self.y, np.random.RandomState(0), 'random')
+
+
+class TestHyperband(unittest.TestCase):
+
+    def test_fidelities(self):
+        np.testing.assert_allclose(hyperbandFidelities('duration', 3, 3, value=900.0), [100.0, 300.0, 900.0])
+        self.assertEqual(hyperbandFidelities('numCells', 4, 2, value=80), [10, 20, 40, 80])
+        np.testing.assert_allclose(hyperbandFidelities('scale', 3, 3, fidelityRange=[0.25, 1.0]), [0.25, 0.5, 1.0])
+        self.assertEqual(hyperbandFidelities('duration', 1, 3, value=500.0), [500.0])
+
+    def test_dtFidelities(self):
+        # low fidelity is coarser dt (larger time step)
+        np.testing.assert_allclose(hyperbandFidelities('dt', 3, 3, value=0.025), [0.225, 0.075, 0.025])
+        np.testing.assert_allclose(hyperbandFidelities('dt', 3, 2, fidelityRange=[0.1, 0.025]), [0.1, 0.05, 0.025])
+
+    def test_schedule(self):
+        # brackets from most candidates at lowest fidelity; best 1/eta promoted to next rung
+        self.assertEqual(hyperbandSchedule(3, 3), [(2, [0, 1, 2], [9, 3, 1]), (1, [1, 2], [5, 1]), (0, [2], [3])])
+        self.assertEqual(hyperbandSchedule(4, 2), [(3, [0, 1, 2, 3], [8, 4, 2, 1]), (2, [1, 2, 3], [6, 3, 1]), (1, [2, 3], [4, 2]), (0, [3], [4])])
+        for numRungs, eta in [(3, 3), (4, 2), (5, 3)]:
+            for bracket, rungs, numCandidates in hyperbandSchedule(numRungs, eta):
+                self.assertEqual(rungs[-1], numRungs-1)
+                self.assertEqual(len(rungs), bracket+1)
+                self.assertEqual(numCandidates[1:], [max(1, int(n / eta)) for n in numCandidates[:-1]])
+
+    def test_successiveHalving(self):
+        self.assertEqual(hyperbandSchedule(3, 3, hyperband=False), [(2, [0, 1, 2], [9, 3, 1])])
+        self.assertEqual(hyperbandSchedule(3, 2, hyperband=False, numCandidates=20), [(2, [0, 1, 2], [20, 10, 5])])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,276 @@
+"""
+gather_tests.py
+
+Tests of gathering simData from nodes: merge of node data (_mergeSimData), typed buffer gather (_gatherSimData) and
+selection of cells gathered from node files (fileGather); nodes are run one after the other in a single process
+
+Run with: python -m unittest netpyne.tests.gather_tests
+"""
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+
+from future import standard_library
+standard_library.install_aliases()
+import pickle
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from neuron import h
+from netpyne import sim, specs
+from netpyne.sim.gather import _mergeSimData, _gatherSimData, _gatherVector, fileGather
+
+SIMDATA_VECS = ['spkt', 'spkid', 'stims', 'V_soma']
+SINGLE_NODE_VECS = ['t']
+
+
+class FakeParallelContext(object):
+    ''' Replaces sim.pc to run the collectives of several nodes in one process: nodes other than 0 are run first and
+    their contributions to node 0 recorded, then node 0 receives them in the same order of calls '''
+
+    def __init__(self, nhosts):
+        self.nhosts = nhosts
+        self.sent = {rank: [] for rank in range(1, nhosts)}
+        self.calls = 0
+
+    def setRank(self, rank):
+        sim.rank, sim.nhosts = rank, self.nhosts
+        self.calls = 0
+
+    def _collect(self, value):
+        # list of values sent by each node to node 0 (None in other nodes)
+        if sim.rank != 0:
+            self.sent[sim.rank].append(value)
+            return None
+        received = [value] + [self.sent[rank][self.calls] for rank in range(1, self.nhosts)]
+        self.calls += 1
+        return received
+
+    def py_alltoall(self, data):
+        received = self._collect(pickle.loads(pickle.dumps(data[0])))  # sent pickled
+        return received if received is not None else [data[sim.rank]]*self.nhosts  # other nodes only receive their own data
+
+    def alltoall(self, src, cnts, dest):
+        received = self._collect(np.array(src.as_numpy()[:int(cnts.x[0])]))
+        dest.resize(0)
+        if received is not None:
+            dest.append(h.Vector(np.concatenate(received)))
+
+    def allreduce(self, value, op):
+        received = self._collect(value)
+        if received is None:
+            return value
+        return {1: sum, 2: max, 3: min}[op](received)
+
+    def barrier(self):
+        pass
+
+
+def _nodesSimData():
+    # data of 3 nodes: spikes (unsorted, with same times in different nodes), traces, stims, LFP and t (node 0)
+    rng = np.random.RandomState(2)
+    t = np.arange(0, 10.5, 0.5)
+    nodes = []
+    for inode, gids in enumerate([[0, 3], [1, 4], [2]]):
+        spkt = np.round(rng.uniform(0, 10, 6 + inode) * 4) / 4  # repeated times
+        spkt[0] = 5.0
+        nodeSimData = {'spkt': spkt, 'spkid': rng.choice(gids, len(spkt)).astype(float),
+                       'V_soma': {'cell_%d' % gid: np.sin(t + gid) for gid in gids},
+                       'stims': {'cell_%d' % gid: ({'bkg': np.sort(rng.uniform(0, 10, 3))} if gid % 2 == 0 else {}) for gid in gids},
+                       'LFP': np.outer(np.arange(len(t)-1), np.ones(2)) * (inode+1)}
+        if inode == 0:
+            nodeSimData['t'] = t
+        nodes.append(nodeSimData)
+    return nodes
+
+
+def _initSim(**cfgArgs):
+    cfg = specs.SimConfig()
+    cfg.duration = 10.0
+    cfg.recordStep = 0.5
+    cfg.recordTraces = {'V_soma': {'sec': 'soma', 'loc': 0.5, 'var': 'v'}}
+    cfg.timing = False
+    cfg.checkErrors = False
+    for key, value in cfgArgs.items():
+        setattr(cfg, key, value)
+    sim.initialize(specs.NetParams(), cfg)
+
+
+class GatherTestCase(unittest.TestCase):
+
+    def setUp(self):
+        _initSim()
+        self.nodes = _nodesSimData()
+        self.pc = sim.pc
+
+    def tearDown(self):
+        sim.pc, sim.rank, sim.nhosts = self.pc, 0, 1
+
+    def assertMerged(self, allSimData, nodes):
+        # spikes of all nodes sorted by time, then gid
+        spikes = sorted([(t, gid) for node in nodes for t, gid in zip(node['spkt'], node['spkid'])])
+        np.testing.assert_array_equal(allSimData['spkt'], [t for t, gid in spikes])
+        np.testing.assert_array_equal(allSimData['spkid'], [gid for t, gid in spikes])
+
+        # traces and stims of cells of each node; t of node 0; sum of LFP of nodes
+        self.assertEqual(sorted(allSimData['V_soma'].keys()), sorted([cell for node in nodes for cell in node['V_soma']]))
+        for node in nodes:
+            for cell, trace in node['V_soma'].items():
+                np.testing.assert_array_almost_equal(allSimData['V_soma'][cell], trace, 6)
+            for cell, stims in node['stims'].items():
+                self.assertEqual(sorted(allSimData['stims'][cell].keys()), sorted(stims.keys()))
+                for label, times in stims.items():
+                    np.testing.assert_array_equal(allSimData['stims'][cell][label], times)
+        np.testing.assert_array_equal(allSimData['t'], nodes[0]['t'])
+        np.testing.assert_array_almost_equal(allSimData['LFP'], sum([node['LFP'] for node in nodes]), 5)
+
+
+#------------------------------------------------------------------------------
+# Merge of simData of nodes (sim.gather._mergeSimData)
+#------------------------------------------------------------------------------
+class TestMergeSimData(GatherTestCase):
+
+    def test_merge(self):
+        allSimData = _mergeSimData(self.nodes, SIMDATA_VECS, SINGLE_NODE_VECS)
+        self.assertMerged(allSimData, self.nodes)
+        for key in ['spkt', 'spkid', 't', 'LFP']:
+            self.assertIsInstance(allSimData[key], np.ndarray)
+            self.assertEqual(allSimData[key].dtype, np.float64)
+        self.assertEqual(allSimData['V_soma']['cell_0'].dtype, np.float64)
+
+    def test_float32(self):
+        # traces and LFP stored as float32; spike times, stims and t kept as float64
+        sim.cfg.gatherFloat32 = True
+        allSimData = _mergeSimData(self.nodes, SIMDATA_VECS, SINGLE_NODE_VECS)
+        self.assertMerged(allSimData, self.nodes)
+        self.assertEqual(allSimData['V_soma']['cell_0'].dtype, np.float32)
+        self.assertEqual(allSimData['LFP'].dtype, np.float32)
+        for key in ['spkt', 'spkid', 't']:
+            self.assertEqual(allSimData[key].dtype, np.float64)
+        self.assertEqual(allSimData['stims']['cell_0']['bkg'].dtype, np.float64)
+
+    def test_vectors(self):
+        # h.Vectors recorded in single node; merged arrays do not depend on vector memory (vectors resized after gather)
+        node = self.nodes[0]
+        vectors = {'spkt': h.Vector(node['spkt']), 'spkid': h.Vector(node['spkid']), 't': h.Vector(node['t']),
+                   'V_soma': {cell: h.Vector(trace) for cell, trace in node['V_soma'].items()},
+                   'stims': {cell: {label: h.Vector(times) for label, times in stims.items()} for cell, stims in node['stims'].items()},
+                   'LFP': node['LFP']}
+        allSimData = _mergeSimData([vectors], SIMDATA_VECS, SINGLE_NODE_VECS)
+        for key in ['spkt', 'spkid', 't']:
+            vectors[key].resize(0)
+            vectors[key].append(h.Vector(1000, -1))
+        vectors['V_soma']['cell_0'].resize(0)
+        self.assertMerged(allSimData, [node])
+
+
+#------------------------------------------------------------------------------
+# Gather of typed buffers of nodes (sim.gather._gatherSimData)
+#------------------------------------------------------------------------------
+class TestGatherSimData(GatherTestCase):
+
+    def gather(self, nodes):
+        # each node packs its h.Vectors (run in reverse order so node 0 receives data of other nodes)
+        sim.pc = FakeParallelContext(len(nodes))
+        for rank in reversed(range(len(nodes))):
+            sim.pc.setRank(rank)
+            node = nodes[rank]
+            sim.simData = specs.Dict({'spkt': h.Vector(node['spkt']), 'spkid': h.Vector(node['spkid']), 'LFP': node['LFP'],
+                                      'V_soma': specs.Dict({cell: h.Vector(trace) for cell, trace in node['V_soma'].items()}),
+                                      'stims': specs.Dict({cell: specs.Dict({label: h.Vector(times) for label, times in stims.items()})
+                                                           for cell, stims in node['stims'].items()})})
+            if 't' in node:
+                sim.simData['t'] = h.Vector(node['t'])
+            nodesSimData = _gatherSimData(SIMDATA_VECS, SINGLE_NODE_VECS)
+            if rank != 0:
+                self.assertIsNone(nodesSimData)
+        return nodesSimData
+
+    def test_vector(self):
+        # values of each node (including empty vector) split by size
+        sim.pc = FakeParallelContext(3)
+        values = [np.arange(4.0), np.zeros(0), np.arange(2.0) + 0.5]
+        for rank in [2, 1, 0]:
+            sim.pc.setRank(rank)
+            vectors = _gatherVector(h.Vector(values[rank]))
+        self.assertEqual(len(vectors), 3)
+        for vector, expected in zip(vectors, values):
+            np.testing.assert_array_equal(vector, expected)
+
+    def test_unpack(self):
+        nodesSimData = self.gather(self.nodes)
+        self.assertEqual(len(nodesSimData), len(self.nodes))
+        for nodeSimData, node in zip(nodesSimData, self.nodes):
+            self.assertEqual(sorted(nodeSimData.keys()), sorted(node.keys()))
+            np.testing.assert_array_equal(nodeSimData['spkt'], node['spkt'])
+            np.testing.assert_array_equal(nodeSimData['spkid'], node['spkid'])
+            np.testing.assert_array_equal(nodeSimData['LFP'], node['LFP'])
+            for cell, trace in node['V_soma'].items():
+                np.testing.assert_array_equal(nodeSimData['V_soma'][cell], trace)
+            self.assertEqual(sorted(nodeSimData['stims'].keys()), sorted(node['stims'].keys()))  # including cells without stims
+            for cell, stims in node['stims'].items():
+                self.assertEqual(sorted(nodeSimData['stims'][cell].keys()), sorted(stims.keys()))
+                for label, times in stims.items():
+                    np.testing.assert_array_equal(nodeSimData['stims'][cell][label], times)
+
+    def test_merge(self):
+        self.assertMerged(_mergeSimData(self.gather(self.nodes), SIMDATA_VECS, SINGLE_NODE_VECS), self.nodes)
+
+    def test_noSpikes(self):
+        for node in self.nodes[1:]:
+            node['spkt'], node['spkid'] = np.zeros(0), np.zeros(0)
+        self.assertMerged(_mergeSimData(self.gather(self.nodes), SIMDATA_VECS, SINGLE_NODE_VECS), self.nodes)
+
+
+#------------------------------------------------------------------------------
+# Selection of cells (cfg.gatherInclude) in node files merged by rank 0 (sim.fileGather)
+#------------------------------------------------------------------------------
+class TestFileGather(GatherTestCase):
+
+    def setUp(self):
+        super(TestFileGather, self).setUp()
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        super(TestFileGather, self).tearDown()
+        shutil.rmtree(self.folder)
+
+    def cells(self, node, pop):
+        return [sim.CompartCell(gid=int(cell.split('_')[1]), tags={'pop': pop, 'cellModel': 'HH'}, create=False, associateGid=False)
+                for cell in node['V_soma']]
+
+    def fileGather(self, nodes, cellsPop):
+        # each node saves its data (sim.intervalSave) and runs fileGather (other nodes first)
+        sim.pc = FakeParallelContext(len(nodes))
+        for rank in reversed(range(len(nodes))):
+            sim.pc.setRank(rank)
+            node = nodes[rank]
+            sim.net.cells = self.cells(node, cellsPop[rank])
+            sim.simData = specs.Dict({'spkt': h.Vector(node['spkt']), 'spkid': h.Vector(node['spkid']),
+                                      'V_soma': specs.Dict({cell: h.Vector(trace) for cell, trace in node['V_soma'].items()})})
+            if 't' in node:
+                sim.simData['t'] = h.Vector(node['t'])
+            sim.intervalSave(sim.cfg.duration, folder=self.folder)
+        for rank in reversed(range(len(nodes))):
+            sim.pc.setRank(rank)
+            sim.net.cells = self.cells(nodes[rank], cellsPop[rank])
+            allSimData = fileGather(folder=self.folder)
+        return allSimData
+
+    def test_selectionInOtherNode(self):
+        # cells of pop 'I' only in node 1, and gid 3 of node 0
+        sim.cfg.gatherInclude = ['I', 3]
+        nodes = self.nodes[:2]
+        allSimData = self.fileGather(nodes, ['E', 'I'])
+        self.assertEqual(sorted(allSimData['V_soma'].keys()), ['cell_1', 'cell_3', 'cell_4'])
+        spikes = sorted([(t, gid) for node in nodes for t, gid in zip(node['spkt'], node['spkid']) if gid in [1, 3, 4]])
+        np.testing.assert_array_equal(allSimData['spkt'], [t for t, gid in spikes])
+        np.testing.assert_array_equal(allSimData['spkid'], [gid for t, gid in spikes])
+        self.assertEqual(sim.numCells, 3)
+        self.assertEqual(sorted([cell['gid'] for cell in sim.net.allCells]), [1, 3, 4])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+"""
+inputs_tests.py
+
+Tests of precomputed spike times of VecStim populations read from files ('spkTimesFile'): .h5 and .npy (+ _offsets.npy)
+files in CSR format, rows of each gid truncated at tstop, and VecStim cells created from them
+
+Run with: python -m unittest netpyne.tests.inputs_tests
+"""
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+
+from future import standard_library
+standard_library.install_aliases()
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from neuron import h
+from netpyne import sim, specs
+from netpyne.cell import inputs
+from netpyne.cell.inputs import loadSpkTimesFromFile, closeSpkTimesFiles
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+# spike times of gids 0-3 (gid 2 without spikes)
+SPIKE_TIMES = [[5.0, 12.5, 40.0], [1.0], [], [20.0, 30.0, 50.0, 90.0]]
+
+
+class TestSpkTimesFile(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.offsets = np.cumsum([0] + [len(times) for times in SPIKE_TIMES])
+        self.times = np.concatenate([np.array(times) for times in SPIKE_TIMES])
+
+    def tearDown(self):
+        closeSpkTimesFiles()
+        shutil.rmtree(self.folder)
+
+    def writeNpy(self, name='spikes'):
+        filename = os.path.join(self.folder, name + '.npy')
+        np.save(filename, self.times)
+        np.save(os.path.join(self.folder, name + '_offsets.npy'), self.offsets)
+        return filename
+
+    def writeH5(self, name='spikes'):
+        filename = os.path.join(self.folder, name + '.h5')
+        with h5py.File(filename, 'w') as fileObj:
+            fileObj.create_dataset('offsets', data=self.offsets)
+            fileObj.create_dataset('times', data=self.times)
+        return filename
+
+    def assertRows(self, filename):
+        for gid, times in enumerate(SPIKE_TIMES):
+            np.testing.assert_array_equal(loadSpkTimesFromFile(filename, gid, 100.0), times)
+        np.testing.assert_array_equal(loadSpkTimesFromFile(filename, 3, 50.0), [20.0, 30.0, 50.0])  # up to tstop
+        np.testing.assert_array_equal(loadSpkTimesFromFile(filename, 0, 1.0), [])
+
+    def test_npy(self):
+        self.assertRows(self.writeNpy())
+
+    @unittest.skipIf(h5py is None, 'h5py not installed')
+    def test_h5(self):
+        filename = self.writeH5()
+        self.assertRows(filename)
+        fileObj = inputs._spkTimesFiles[filename][2]
+        self.assertTrue(fileObj.id.valid)
+        closeSpkTimesFiles()
+        self.assertFalse(fileObj.id.valid)
+        self.assertEqual(inputs._spkTimesFiles, {})
+
+    def test_gidNotInFile(self):
+        self.assertEqual(len(loadSpkTimesFromFile(self.writeNpy(), len(SPIKE_TIMES), 100.0)), 0)
+
+    def test_missingFile(self):
+        # failure cached so the file is only tried (and the error printed) once
+        filename = os.path.join(self.folder, 'missing.npy')
+        self.assertIsNone(loadSpkTimesFromFile(filename, 0, 100.0))
+        self.assertIsNone(inputs._spkTimesFiles[filename])
+        self.writeNpy('missing')
+        self.assertIsNone(loadSpkTimesFromFile(filename, 0, 100.0))
+        closeSpkTimesFiles()
+        self.assertEqual(inputs._spkTimesFiles, {})
+
+    @unittest.skipIf(not hasattr(h, 'VecStim'), 'VecStim mechanism not compiled (nrnivmodl vecevent.mod)')
+    def test_vecStims(self):
+        # VecStim pop reads the spikes of each of its gids; files closed once cells are created
+        netParams = specs.NetParams()
+        netParams.popParams['S'] = {'cellModel': 'VecStim', 'numCells': len(SPIKE_TIMES), 'spkTimesFile': self.writeNpy()}
+        cfg = specs.SimConfig()
+        cfg.duration = 60.0
+        cfg.verbose = False
+        sim.create(netParams, cfg)
+        self.assertEqual(inputs._spkTimesFiles, {})
+        for cell in sim.net.cells:
+            self.assertEqual(list(cell.hSpkTimes), [t for t in SPIKE_TIMES[cell.gid] if t <= cfg.duration])
+
+
+if __name__ == '__main__':
+    unittest.main()
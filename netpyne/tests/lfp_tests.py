@@ -0,0 +1,174 @@
+"""
+lfp_tests.py
+
+Tests of LFP calculation: LFP (and LFP of each cell) calculated from the stacked transfer resistance matrix of all cells
+in node compared with the sum of np.dot(tr, im) of each cell at every recording step
+
+Run with: python -m unittest netpyne.tests.lfp_tests
+"""
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+
+from future import standard_library
+standard_library.install_aliases()
+import math
+import unittest
+import numpy as np
+from neuron import h
+from netpyne import sim, specs
+
+DURATION = 30.0
+RECORD_STEP = 1.0  # LFP calculated every int(cfg.recordStep) ms (see sim.preRun)
+ELECTRODES = [[50, 50, 50], [50, 300, 50], [200, 500, 100], [-100, 1000, 0]]
+
+
+def _netParams():
+    netParams = specs.NetParams()
+    netParams.sizeX, netParams.sizeY, netParams.sizeZ = 200, 600, 200
+    netParams.popParams['E'] = {'cellType': 'PYR', 'numCells': 4, 'cellModel': 'HH'}
+    netParams.cellParams['PYR'] = {'conds': {'cellType': 'PYR'}, 'secs': {
+        'soma': {'geom': {'diam': 18.8, 'L': 18.8, 'Ra': 123.0}, 'mechs': {'hh': {'gnabar': 0.12, 'gkbar': 0.036, 'gl': 0.003, 'el': -70}}},
+        'dend': {'geom': {'diam': 2.0, 'L': 300.0, 'Ra': 150.0, 'nseg': 7}, 'mechs': {'pas': {'g': 0.0001, 'e': -70}},
+                 'topol': {'parentSec': 'soma', 'parentX': 1.0, 'childX': 0}}}}
+    netParams.stimSourceParams['IClamp'] = {'type': 'IClamp', 'del': 2.0, 'dur': 15.0, 'amp': 0.4}
+    netParams.stimTargetParams['IClamp->E'] = {'source': 'IClamp', 'sec': 'soma', 'loc': 0.5, 'conds': {'pop': 'E'}}
+    return netParams
+
+
+def _transferResistance(pos, segCoords):
+    # transfer resistances of cell segments calculated for each electrode site (as before they were stacked)
+    sigma = 0.3
+    r05 = (segCoords['p0'] + segCoords['p1'])/2
+    dl = segCoords['p1'] - segCoords['p0']
+    tr = np.zeros((pos.shape[1], r05.shape[1]))
+    for j in range(pos.shape[1]):
+        rel_05 = np.expand_dims(pos[:, j], axis=1) - r05
+        r2 = np.einsum('ij,ij->j', rel_05, rel_05)
+        rlldl = np.einsum('ij,ij->j', rel_05, dl)
+        dlmag = np.linalg.norm(dl, axis=0)
+        rll = abs(rlldl/dlmag)
+        rT2 = r2 - rll**2
+        up = rll + dlmag/2
+        low = rll - dlmag/2
+        tr[j, :] = np.log((up + np.sqrt(up**2 + rT2)) / (low + np.sqrt(low**2 + rT2)))/dlmag
+    return tr / (4*math.pi*sigma)
+
+
+class TestLFP(unittest.TestCase):
+
+    def runSim(self, **cfgArgs):
+        ''' simulate network recording LFP; returns simData and LFP (and LFP of each cell) calculated with
+        np.dot(tr, im) of each cell when sim.calculateLFP is called '''
+        cfg = specs.SimConfig()
+        cfg.duration = DURATION
+        cfg.recordStep = RECORD_STEP
+        cfg.recordLFP = ELECTRODES
+        cfg.saveLFPCells = True
+        cfg.checkErrors = False
+        for key, value in cfgArgs.items():
+            setattr(cfg, key, value)
+        sim.initialize(_netParams(), cfg)
+        sim.net.createPops()
+        sim.net.createCells()
+        sim.net.addStims()
+        sim.setupRecording()
+
+        saveSteps = int(np.ceil(DURATION/RECORD_STEP))
+        lfp = np.zeros((saveSteps, len(ELECTRODES)))
+        lfpCells = {cell.gid: np.zeros((saveSteps, len(ELECTRODES))) for cell in sim.net.compartCells}
+        trCells = {cell.gid: _transferResistance(sim.net.recXElectrode.pos, cell._segCoords) for cell in sim.net.compartCells}
+        sparseTol = getattr(sim.cfg, 'recordLFPSparseTol', 0)
+        if sparseTol:  # values below sparseTol * max of all cells dropped
+            trMax = max([np.abs(tr).max() for tr in trCells.values()])
+            for tr in trCells.values():
+                tr[np.abs(tr) < sparseTol * trMax] = 0.0
+
+        calculateLFP = sim.calculateLFP
+        def referenceLFP():
+            calculateLFP()
+            saveStep = int(np.floor(h.t / RECORD_STEP))
+            for cell in sim.net.compartCells:
+                im = np.array([seg.i_membrane_ for sec in cell.secs.values() for seg in sec['hObj']])  # in nA
+                ecp = np.dot(trCells[cell.gid], im)
+                lfpCells[cell.gid][saveStep-1, :] = ecp
+                lfp[saveStep-1, :] += ecp
+        sim.calculateLFP = referenceLFP  # called by recordLFPHandler at each recording step
+        try:
+            sim.runSim()
+        finally:
+            sim.calculateLFP = calculateLFP
+
+        self.assertGreater(np.count_nonzero(np.abs(lfp).max(1)), sim.cfg.duration/RECORD_STEP/2)  # recorded steps
+        return sim.simData, lfp, lfpCells
+
+    def assertLFP(self, simData, lfp, lfpCells, rtol=1e-9):
+        atol = rtol * np.abs(lfp).max()
+        np.testing.assert_allclose(simData['LFP'], lfp, rtol, atol)
+        self.assertEqual(sorted(simData['LFPCells'].keys()), sorted(lfpCells.keys()))
+        for gid, cellLFP in lfpCells.items():
+            np.testing.assert_allclose(simData['LFPCells'][gid], cellLFP, rtol, atol)
+
+    def test_stacked(self):
+        self.assertLFP(*self.runSim())
+
+    def test_stackedMatrix(self):
+        # transfer resistances of each cell are column blocks of stacked matrix (nsites x segments of node)
+        self.runSim(duration=5.0)
+        electrode = sim.net.recXElectrode
+        tr = electrode.transferResistanceMatrix
+        self.assertEqual(tr.shape, (len(ELECTRODES), sum([len(list(sec['hObj'])) for cell in sim.net.compartCells for sec in cell.secs.values()])))
+        for cell in sim.net.compartCells:
+            segStart, segEnd = electrode.segRanges[cell.gid]
+            np.testing.assert_array_almost_equal(electrode.getTransferResistance(cell.gid), _transferResistance(electrode.pos, cell._segCoords), 12)
+            np.testing.assert_array_equal(tr[:, segStart:segEnd], electrode.getTransferResistance(cell.gid))
+
+    def test_withoutLFPCells(self):
+        simData, lfp, lfpCells = self.runSim(saveLFPCells=False)
+        np.testing.assert_allclose(simData['LFP'], lfp, 1e-9, 1e-9 * np.abs(lfp).max())
+        self.assertEqual(len(simData.get('LFPCells', {})), 0)
+
+    def test_windowShorterThanSimulation(self):
+        # LFP calculated every 7 steps (last window calculated at the end of the simulation)
+        simData, lfp, lfpCells = self.runSim(recordLFPWindow=7)
+        self.assertEqual(sim.net.imembBuffer.shape[1], 7)
+        self.assertEqual(len(sim.net.imembBufferSteps), 0)
+        self.assertLFP(simData, lfp, lfpCells)
+
+    def test_windowLongerThanSimulation(self):
+        # buffer limited to number of saved steps; LFP calculated once
+        simData, lfp, lfpCells = self.runSim(recordLFPWindow=1000)
+        self.assertEqual(sim.net.imembBuffer.shape[1], int(np.ceil(DURATION/RECORD_STEP)))
+        self.assertLFP(simData, lfp, lfpCells)
+
+    def test_windowWithoutLFPCells(self):
+        simData, lfp, lfpCells = self.runSim(recordLFPWindow=4, saveLFPCells=False)
+        np.testing.assert_allclose(simData['LFP'], lfp, 1e-9, 1e-9 * np.abs(lfp).max())
+
+    def test_sparse(self):
+        from scipy.sparse import issparse
+        simData, lfp, lfpCells = self.runSim(recordLFPSparseTol=0.05)
+        electrode = sim.net.recXElectrode
+        self.assertTrue(issparse(electrode.transferResistanceMatrix))
+        self.assertLess(electrode.transferResistanceMatrix.nnz, np.prod(electrode.transferResistanceMatrix.shape))
+        self.assertEqual(sorted(electrode.transferResistanceBlocks.keys()), sorted(lfpCells.keys()))  # precomputed for saveLFPCells
+        self.assertLFP(simData, lfp, lfpCells)
+
+    def test_sparseWindow(self):
+        simData, lfp, lfpCells = self.runSim(recordLFPSparseTol=0.05, recordLFPWindow=7)
+        self.assertLFP(simData, lfp, lfpCells)
+
+    def test_sparseWithoutLFPCells(self):
+        simData, lfp, lfpCells = self.runSim(recordLFPSparseTol=0.05, recordLFPWindow=1000, saveLFPCells=False)
+        self.assertEqual(len(sim.net.recXElectrode.transferResistanceBlocks), 0)
+        np.testing.assert_allclose(simData['LFP'], lfp, 1e-9, 1e-9 * np.abs(lfp).max())
+
+    def test_sparseSmallTolerance(self):
+        # same LFP as dense matrix if no values dropped
+        simData, lfp, lfpCells = self.runSim(recordLFPSparseTol=1e-12)
+        self.assertLFP(simData, lfp, lfpCells)
+
+
+if __name__ == '__main__':
+    unittest.main()
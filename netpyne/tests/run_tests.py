@@ -0,0 +1,70 @@
+"""
+run_tests.py
+
+Tests of running the simulation in intervals with cfg.earlyStopFunc: stop time (end of the interval in which the
+function returned True) saved in simData['earlyStop'], and not set if the simulation ran until cfg.duration
+
+Run with: python -m unittest netpyne.tests.run_tests
+"""
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+
+from future import standard_library
+standard_library.install_aliases()
+import unittest
+from neuron import h
+from netpyne import sim, specs
+
+
+def _netParams():
+    netParams = specs.NetParams()
+    netParams.popParams['E'] = {'cellType': 'PYR', 'numCells': 2, 'cellModel': 'HH'}
+    netParams.cellParams['PYR'] = {'conds': {'cellType': 'PYR'}, 'secs': {
+        'soma': {'geom': {'diam': 18.8, 'L': 18.8, 'Ra': 123.0}, 'mechs': {'hh': {'gnabar': 0.12, 'gkbar': 0.036, 'gl': 0.003, 'el': -70}}}}}
+    netParams.stimSourceParams['IClamp'] = {'type': 'IClamp', 'del': 2.0, 'dur': 80.0, 'amp': 0.4}
+    netParams.stimTargetParams['IClamp->E'] = {'source': 'IClamp', 'sec': 'soma', 'loc': 0.5, 'conds': {'pop': 'E'}}
+    return netParams
+
+
+class TestEarlyStop(unittest.TestCase):
+
+    def runSim(self, stopTime, duration=100.0, interval=25.0):
+        ''' simulate network stopped (by cfg.earlyStopFunc) once t >= stopTime; returns gathered simData'''
+        cfg = specs.SimConfig()
+        cfg.duration = duration
+        cfg.earlyStopFunc = lambda simData, t: t >= stopTime
+        cfg.earlyStopInterval = interval
+        cfg.verbose = False
+        sim.createSimulate(_netParams(), cfg)
+        sim.gatherData()
+        return sim.allSimData
+
+    def test_stopped(self):
+        # function called every 25 ms, so stopped at end of interval after 60 ms
+        simData = self.runSim(60.0)
+        self.assertAlmostEqual(simData['earlyStop'], 75.0)
+        self.assertAlmostEqual(h.t, 75.0)
+
+    def test_notStopped(self):
+        simData = self.runSim(1000.0)
+        self.assertNotIn('earlyStop', simData)
+        self.assertAlmostEqual(h.t, 100.0)
+
+    def test_stoppedAtEnd(self):
+        # True returned once simulation finished is not an early stop
+        simData = self.runSim(100.0)
+        self.assertNotIn('earlyStop', simData)
+        self.assertAlmostEqual(h.t, 100.0)
+
+    def test_reset(self):
+        # stop time of previous simulation not kept
+        self.runSim(30.0)
+        self.assertAlmostEqual(sim.earlyStopTime, 50.0)
+        sim.runSimWithIntervalFunc(25.0, lambda t: False)
+        self.assertIsNone(sim.earlyStopTime)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,414 @@
+"""
+saveload_tests.py
+
+Save and load round-trip tests of output formats: .h5 (net and simData), .dpk, .json and indexed .json (.json.idx),
+distributed shards (sim.distributedSave), .h5 written by all nodes (sim.distributedSaveHDF5) and interval node files
+(sim.intervalSave)
+
+Run with: python -m unittest netpyne.tests.saveload_tests
+"""
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+
+from future import standard_library
+standard_library.install_aliases()
+import os
+import json
+import pickle
+import numbers
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from neuron import h
+from netpyne import sim, specs
+from netpyne.sim import save
+from netpyne.sim.load import _loadFile, _loadDpk, _loadH5, _loadH5NetNode, _loadH5SimDataFile, _loadJSONIndex, _jsonIndexGids, \
+    _loadJSONCells, _loadJSONSimDataFile, _loadShards
+from netpyne.sim.gather import _loadNodeFiles, _filterSimData
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+DURATION = 100.0
+RECORD_STEP = 0.5
+NUM_CELLS = 12
+TRACE_GIDS = [0, 3, 9]
+INCLUDE = ['I', 3]  # pop 'I' (gids 8-11) and gid 3
+INCLUDE_GIDS = set([3, 8, 9, 10, 11])
+TIME_RANGE = [20.0, 30.2]
+
+
+def _cells():
+    cells = []
+    for gid in range(NUM_CELLS):
+        pop = 'E' if gid < 8 else 'I'
+        tags = {'pop': pop, 'cellType': 'PYR' if pop == 'E' else 'BAS', 'cellModel': 'HH', 'x': 10.0*gid, 'y': 5.0, 'z': 1.5*gid}
+        conns = [{'preGid': (gid+k) % NUM_CELLS, 'sec': 'soma', 'loc': 0.5, 'synMech': 'exc' if k % 2 else 'inh', 'weight': 0.01*k, 'delay': 1.0+k}
+                 for k in range(1, gid % 4 + 1)]
+        stims = [{'source': 'bkg', 'type': 'NetStim', 'rate': 10.0, 'noise': 0.5, 'weight': 0.1}] if pop == 'E' else []
+        cells.append({'gid': gid, 'tags': tags, 'conns': conns, 'stims': stims})
+    return cells
+
+
+def _pops(cells):
+    return {pop: {'tags': {'pop': pop, 'cellModel': 'HH'}, 'cellGids': [c['gid'] for c in cells if c['tags']['pop'] == pop]} for pop in ['E', 'I']}
+
+
+def _simData():
+    rng = np.random.RandomState(1)
+    t = np.arange(0, DURATION + RECORD_STEP/2, RECORD_STEP)  # recorded at t=0 (len(t) = duration/recordStep + 1)
+    return {'spkt': np.sort(rng.uniform(0, DURATION, 200)),
+            'spkid': rng.randint(0, NUM_CELLS, 200).astype(float),
+            't': t,
+            'V_soma': {'cell_%d' % gid: np.sin(t/10.0 + gid) for gid in TRACE_GIDS},
+            'LFP': np.outer(np.arange(1, len(t)) * RECORD_STEP, np.ones(3)),  # row k recorded at t=(k+1)*recordStep (value = time)
+            'avgRate': 1.5}
+
+
+def _initSim(**cfgArgs):
+    cfg = specs.SimConfig()
+    cfg.duration = DURATION
+    cfg.recordStep = RECORD_STEP
+    cfg.recordTraces = {'V_soma': {'sec': 'soma', 'loc': 0.5, 'var': 'v'}}
+    cfg.timing = False
+    cfg.checkErrors = False
+    for key, value in cfgArgs.items():
+        setattr(cfg, key, value)
+    sim.initialize(specs.NetParams(), cfg)
+
+
+class SaveLoadTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        _initSim(filename=os.path.join(self.folder, 'model_output'))
+        self.cells, self.simData = _cells(), _simData()
+        self.pops = _pops(self.cells)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def path(self, filename):
+        return os.path.join(self.folder, filename)
+
+    def assertDataEqual(self, loaded, expected, places=7):
+        # nested dicts/lists compared as numpy arrays where numeric (loaded files may store lists, arrays or float32)
+        if isinstance(expected, dict):
+            self.assertEqual(set(loaded.keys()), set(expected.keys()))
+            for key in expected:
+                self.assertDataEqual(loaded[key], expected[key], places)
+        elif (isinstance(expected, np.ndarray) and expected.dtype.kind in 'biuf') or \
+                (isinstance(expected, (list, tuple)) and len(expected) and all(isinstance(v, numbers.Number) for v in expected)):
+            np.testing.assert_array_almost_equal(np.asarray(loaded, dtype=float), np.asarray(expected, dtype=float), places)
+        elif isinstance(expected, (list, tuple)):
+            self.assertEqual(len(loaded), len(expected))
+            for loadedItem, expectedItem in zip(loaded, expected):
+                self.assertDataEqual(loadedItem, expectedItem, places)
+        elif isinstance(expected, float):
+            self.assertAlmostEqual(loaded, expected, places)
+        else:
+            self.assertEqual(loaded, expected)
+
+    def assertSelected(self, simData, places=7):
+        # spikes, traces, t and LFP of INCLUDE cells within TIME_RANGE
+        spkMask = np.isin(self.simData['spkid'], list(INCLUDE_GIDS)) & (self.simData['spkt'] >= TIME_RANGE[0]) & (self.simData['spkt'] <= TIME_RANGE[1])
+        np.testing.assert_array_almost_equal(np.asarray(simData['spkt'], dtype=float), self.simData['spkt'][spkMask], min(places, 3))
+        np.testing.assert_array_equal(np.asarray(simData['spkid'], dtype=float), self.simData['spkid'][spkMask])
+
+        t = self.simData['t']
+        stepMask = (t >= TIME_RANGE[0]) & (t <= TIME_RANGE[1])
+        self.assertEqual(sorted(simData['V_soma'].keys()), ['cell_3', 'cell_9'])
+        for cellKey, trace in simData['V_soma'].items():
+            np.testing.assert_array_almost_equal(np.asarray(trace, dtype=float), self.simData['V_soma'][cellKey][stepMask], min(places, 5))
+        np.testing.assert_array_almost_equal(np.asarray(simData['t'], dtype=float), t[stepMask])
+
+        # LFP rows recorded at same times as t within time range (row k recorded at t=(k+1)*recordStep)
+        np.testing.assert_array_almost_equal(np.asarray(simData['LFP'], dtype=float)[:, 0], t[stepMask])
+
+
+#------------------------------------------------------------------------------
+# .h5 files (sim.saveH5)
+#------------------------------------------------------------------------------
+@unittest.skipIf(h5py is None, 'h5py not installed')
+class TestH5(SaveLoadTestCase):
+
+    def saveH5(self):
+        filename = self.path('model_output.h5')
+        sim.saveH5(filename, {'simConfig': {'recordStep': RECORD_STEP}, 'net': {'cells': self.cells, 'pops': self.pops}, 'simData': self.simData})
+        return filename
+
+    def test_net(self):
+        data = _loadH5(self.saveH5())
+        self.assertEqual(data['simConfig'], {'recordStep': RECORD_STEP})
+        self.assertEqual(data['net']['pops'], self.pops)
+        self.assertDataEqual(data['net']['cells'], self.cells)
+
+    def test_netCompactConnFormat(self):
+        sim.cfg.compactConnFormat = ['preGid', 'sec', 'loc', 'synMech', 'weight', 'delay']
+        for cell in self.cells:
+            cell['conns'] = [[conn[key] for key in sim.cfg.compactConnFormat] for conn in cell['conns']]
+        data = _loadH5(self.saveH5())
+        self.assertDataEqual(data['net']['cells'], self.cells)
+
+    def test_netNodeRows(self):
+        # each node reads its blocks of rows; rank 0 also reads gid and tags of all cells
+        filename = self.saveH5()
+        sim.nhosts = 3
+        rows = []
+        for rank in range(sim.nhosts):
+            sim.rank = rank
+            net = _loadH5NetNode(filename, blocksPerNode=2, allCellsTags=(rank == 0))
+            self.assertDataEqual(net['cells'], [self.cells[row] for row in net['rows']])
+            if rank == 0:
+                self.assertEqual(net['allCells'], [{'gid': c['gid'], 'tags': c['tags']} for c in self.cells])
+            else:
+                self.assertIsNone(net['allCells'])
+            rows.extend(net['rows'])
+        self.assertEqual(sorted(rows), list(range(NUM_CELLS)))
+
+    def test_simData(self):
+        sim.loadSimData(self.saveH5())
+        self.assertDataEqual(sim.allSimData, self.simData, places=3)  # spike times and traces stored as float32
+
+    def test_simDataSelection(self):
+        sim.loadSimData(self.saveH5(), include=INCLUDE, timeRange=TIME_RANGE)
+        self.assertSelected(sim.allSimData, places=3)
+
+    def test_simDataKeys(self):
+        data = _loadH5SimDataFile(self.saveH5(), keys=['spkt', 'avgRate'])
+        self.assertEqual(sorted(data.keys()), ['avgRate', 'spkid', 'spkt'])
+
+
+#------------------------------------------------------------------------------
+# .dpk files (sim.saveDpk)
+#------------------------------------------------------------------------------
+class TestDpk(SaveLoadTestCase):
+
+    def roundTrip(self, codec):
+        data = {'net': {'cells': self.cells, 'pops': self.pops}, 'simData': self.simData}
+        filename = self.path('model_output_%s.dpk' % (codec))
+        sim.saveDpk(filename, data, codec=codec, blockSize=1024, threads=2)  # multiple blocks compressed in parallel
+        self.assertDataEqual(_loadDpk(filename, threads=2), data)
+        self.assertDataEqual(_loadFile(filename), data)
+
+    def test_gzip(self):
+        self.roundTrip('gzip')
+
+    def test_zlib(self):
+        self.roundTrip('zlib')
+
+    def test_lz4(self):
+        try:
+            import lz4.frame
+        except ImportError:
+            self.skipTest('lz4 not installed')
+        self.roundTrip('lz4')
+
+    def test_zstd(self):
+        try:
+            import zstandard
+        except ImportError:
+            self.skipTest('zstandard not installed')
+        self.roundTrip('zstd')
+
+    def test_unknownCodec(self):
+        self.assertRaises(ValueError, save._dpkCodec, 'unknown', fallback=False)
+
+
+#------------------------------------------------------------------------------
+# .json files (sim.saveJSON)
+#------------------------------------------------------------------------------
+class TestJSON(SaveLoadTestCase):
+
+    def roundTrip(self, indent=None):
+        data = {'net': {'cells': self.cells, 'pops': self.pops}, 'simData': self.simData}
+        filename = self.path('model_output.json')
+        sim.saveJSON(filename, data, indent=indent)
+        with open(filename, 'r') as fileObj:
+            text = fileObj.read()
+        self.assertDataEqual(json.loads(text), data)
+        return text
+
+    def test_compact(self):
+        self.assertNotIn('\n', self.roundTrip())  # streamed without indentation
+
+    def test_indent(self):
+        self.assertIn('\n    "', self.roundTrip(indent=4))
+
+
+#------------------------------------------------------------------------------
+# .json files with sidecar index (sim.saveJSON(..., index=True))
+#------------------------------------------------------------------------------
+class TestIndexedJSON(SaveLoadTestCase):
+
+    def setUp(self):
+        super(TestIndexedJSON, self).setUp()
+        self.filename = self.path('model_output.json')
+        cellsPerBlock = save.JSON_CELLS_PER_BLOCK
+        save.JSON_CELLS_PER_BLOCK = 4  # several blocks of cells
+        try:
+            sim.saveJSON(self.filename, {'simConfig': {'recordStep': RECORD_STEP}, 'net': {'cells': self.cells, 'pops': self.pops},
+                                         'simData': self.simData}, index=True)
+        finally:
+            save.JSON_CELLS_PER_BLOCK = cellsPerBlock
+
+    def test_file(self):
+        with open(self.filename, 'r') as fileObj:
+            data = json.load(fileObj)
+        self.assertDataEqual(data['net']['cells'], self.cells)
+        self.assertDataEqual(data['simData'], self.simData)
+
+    def test_index(self):
+        index = _loadJSONIndex(self.filename)
+        self.assertEqual([block[:2] for block in index['cells']], [[0, 3], [4, 7], [8, 11]])
+        self.assertEqual(index['popGids'], {'E': [[0, 7]], 'I': [[8, 11]]})
+        self.assertEqual(_jsonIndexGids(index, INCLUDE), INCLUDE_GIDS)
+
+        # index ignored if file changed
+        with open(self.filename, 'ab') as fileObj:
+            fileObj.write(b' ')
+        self.assertIsNone(_loadJSONIndex(self.filename))
+
+    def test_cells(self):
+        self.assertDataEqual(_loadJSONCells(self.filename, INCLUDE_GIDS), [c for c in self.cells if c['gid'] in INCLUDE_GIDS])
+        tags, conns = sim.ijsonLoad(self.filename, tagsGidRange=[1, 2], loadConns=False)
+        self.assertEqual(tags, {1: self.cells[1]['tags'], 2: self.cells[2]['tags']})
+
+    def test_simData(self):
+        sim.loadSimData(self.filename)
+        self.assertDataEqual(sim.allSimData, self.simData)
+
+    def test_simDataSelection(self):
+        sim.loadSimData(self.filename, include=INCLUDE, timeRange=TIME_RANGE)
+        self.assertSelected(sim.allSimData)
+
+    def test_simDataKeys(self):
+        data = _loadJSONSimDataFile(self.filename, keys=['spkt', 'avgRate'])
+        self.assertEqual(sorted(data.keys()), ['avgRate', 'spkid', 'spkt'])
+
+
+#------------------------------------------------------------------------------
+# Distributed shards (sim.distributedSave)
+#------------------------------------------------------------------------------
+class TestDistributedSave(SaveLoadTestCase):
+
+    def setUp(self):
+        super(TestDistributedSave, self).setUp()
+        for label, pop in self.pops.items():
+            sim.net.pops[label] = sim.Pop(label, dict(pop['tags']))
+            sim.net.pops[label].cellGids = pop['cellGids']
+        for cellData in self.cells:
+            cell = sim.CompartCell(gid=cellData['gid'], tags=dict(cellData['tags']), create=False, associateGid=False)
+            cell.conns = [specs.Dict(conn) for conn in cellData['conns']]
+            cell.stims = [specs.Dict(stim) for stim in cellData['stims']]
+            sim.net.cells.append(cell)
+        sim.simData['spkt'], sim.simData['spkid'] = h.Vector(self.simData['spkt']), h.Vector(self.simData['spkid'])
+        sim.simData['t'] = h.Vector(self.simData['t'])
+        sim.simData['V_soma'] = specs.Dict({cellKey: h.Vector(trace) for cellKey, trace in self.simData['V_soma'].items()})
+        sim.simData['LFP'] = self.simData['LFP']
+        sim.simData['avgRate'] = self.simData['avgRate']
+
+    def test_shards(self):
+        folder = sim.distributedSave()
+        self.assertEqual(folder, os.path.abspath(sim.cfg.filename + '_shards'))
+
+        # manifest has gid range of each node; gids in shards
+        with open(os.path.join(folder, 'manifest.json'), 'r') as fileObj:
+            manifest = json.load(fileObj)
+        self.assertEqual(manifest['nodes'][0]['numCells'], NUM_CELLS)
+        self.assertEqual(manifest['nodes'][0]['gidRange'], [0, NUM_CELLS-1])
+        self.assertNotIn('gids', manifest['nodes'][0])
+        with open(os.path.join(folder, manifest['nodes'][0]['file']), 'rb') as fileObj:
+            self.assertEqual(pickle.load(fileObj)['gids'], list(range(NUM_CELLS)))
+
+        data = _loadFile(folder)
+        self.assertEqual(sorted(data['net']['pops'].keys()), ['E', 'I'])
+        self.assertEqual([c['gid'] for c in data['net']['cells']], list(range(NUM_CELLS)))
+        self.assertDataEqual([c['conns'] for c in data['net']['cells']], [c['conns'] for c in self.cells])
+        self.assertDataEqual(data['simData'], self.simData)
+
+    def test_shardsOfNodes(self):
+        folder = sim.distributedSave(include=['simData'])
+        self.assertDataEqual(_loadShards(folder, nodes=[0])['simData'], self.simData)
+        self.assertNotIn('simData', _loadShards(folder, nodes=[1]))
+
+    @unittest.skipIf(h5py is None, 'h5py not installed')
+    def test_hdf5(self):
+        # one node: rows written to node file and combined with virtual datasets (h5py without MPI)
+        filename = sim.distributedSaveHDF5()
+        self.assertEqual(filename, os.path.abspath(sim.cfg.filename + '.h5'))
+        data = _loadH5(filename)
+        self.assertDataEqual(data['net']['cells'], self.cells)
+        sim.loadSimData(filename)
+        self.assertDataEqual(sim.allSimData, self.simData, places=3)  # spike times and traces stored as float32
+
+    @unittest.skipIf(h5py is None, 'h5py not installed')
+    def test_hdf5WithoutMPI(self):
+        # collective writes only if h5py built with MPI support (and mpi4py available) in all nodes
+        getConfig = h5py.get_config
+        class Config(object):
+            mpi = False
+        h5py.get_config = lambda: Config()
+        try:
+            self.assertIsNone(save._h5MPIComm())
+        finally:
+            h5py.get_config = getConfig
+
+
+#------------------------------------------------------------------------------
+# Interval node files (sim.intervalSave) merged after the simulation (see sim.fileGather)
+#------------------------------------------------------------------------------
+class TestIntervalSave(SaveLoadTestCase):
+
+    def setUp(self):
+        super(TestIntervalSave, self).setUp()
+        self.nodeFolder = self.path('interval')
+        os.mkdir(self.nodeFolder)
+        sim.net.cells = [sim.CompartCell(gid=c['gid'], tags=dict(c['tags']), create=False, associateGid=False) for c in self.cells]
+
+    def recordUntil(self, t):
+        # data recorded up to t (spike vectors cleared by intervalSave; traces, t and LFP keep growing)
+        spkt, spkid, times = self.simData['spkt'], self.simData['spkid'], self.simData['t']
+        start = getattr(self, 'recordedTime', -1)
+        mask = (spkt > start) & (spkt <= t)
+        if 'spkt' not in sim.simData:
+            sim.simData['spkt'], sim.simData['spkid'], sim.simData['t'] = h.Vector(), h.Vector(), h.Vector()
+            sim.simData['V_soma'] = specs.Dict({cellKey: h.Vector() for cellKey in self.simData['V_soma']})
+            sim.simData['LFP'] = np.zeros(self.simData['LFP'].shape)
+        sim.simData['spkt'].append(h.Vector(spkt[mask]))
+        sim.simData['spkid'].append(h.Vector(spkid[mask]))
+        stepMask = (times > start) & (times <= t)
+        sim.simData['t'].append(h.Vector(times[stepMask]))
+        for cellKey, trace in self.simData['V_soma'].items():
+            sim.simData['V_soma'][cellKey].append(h.Vector(trace[stepMask]))
+        rows = slice(int(round(max(start, 0) / RECORD_STEP)), int(round(t / RECORD_STEP)))
+        sim.simData['LFP'][rows, :] = self.simData['LFP'][rows, :]
+        self.recordedTime = t
+
+    def saveIntervals(self):
+        for t in [30.0, 70.0, DURATION]:
+            self.recordUntil(t)
+            sim.intervalSave(t, folder=self.nodeFolder)
+            self.assertEqual(sim.simData['spkt'].size(), 0)
+
+    def test_nodeFiles(self):
+        self.saveIntervals()
+        simData = _loadNodeFiles(self.nodeFolder)
+        expected = dict(self.simData)
+        expected.pop('avgRate')
+        self.assertDataEqual(simData, expected)
+
+    def test_nodeFilesSelection(self):
+        self.saveIntervals()
+        sim.cfg.gatherInclude, sim.cfg.gatherTimeRange = INCLUDE, TIME_RANGE
+        simData = _filterSimData(_loadNodeFiles(self.nodeFolder), ['spkt', 'spkid', 'stims', 'V_soma'], ['t'])
+        self.assertSelected(simData)
+
+
+if __name__ == '__main__':
+    unittest.main()
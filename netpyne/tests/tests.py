@@ -33,7 +33,7 @@ VALID_GEOMETRIES_SUBSET = ['L', 'diam', 'Ra']
 PT_3D = 'pt3d'
 VALID_TOPOLOGY_PARAMS = ['parentSec', 'parentX','childX']
 PULSE_KEYS = ['start','end','rate','noise']
-POP_STIM_KEYS = ['seeds','start','end','rate','noise','spkTimes','pulses']
+POP_STIM_KEYS = ['seeds','start','end','rate','noise','spkTimes','spkTimesFile','pulses']
 
 MESSAGE_TYPE_WARNING = "WARNING"
 MESSAGE_TYPE_ERROR = "ERROR"
@@ -386,9 +386,9 @@ class TestTypeObj(object):
                     if not isinstance(paramValues['number'], numbers.Real):
                         stimValid = False
                         errorMessages.append("popParams->'number': Must be a float if specified. Value provided is:" + str(paramValues['number']))
-                if paramValues['cellModel'] != 'VecStim' and any([x in paramValues for x in ['spkTimes', 'pulses']]):
+                if paramValues['cellModel'] != 'VecStim' and any([x in paramValues for x in ['spkTimes', 'spkTimesFile', 'pulses']]):
                         stimValid = False
-                        errorMessages.append("popParams: 'spkTimes' or 'pulses' can be provided if 'cellModel' is 'VecStim' ")
+                        errorMessages.append("popParams: 'spkTimes', 'spkTimesFile' or 'pulses' can be provided if 'cellModel' is 'VecStim' ")
                 if 'spkTimes' in paramValues:
                     if not isinstance(paramValues['spkTimes'], list):
                         stimValid = False
@@ -82,7 +82,11 @@ else:
         # dependencies). You can install these using the following syntax,
         # for example:
         # $ pip install -e .[dev,test]
-        extras_require={},
+        extras_require={
+            'h5': ['h5py'],  # .h5 output and network files, spkTimesFile, merged batch results
+            'batch': ['inspyred'],  # evolutionary batch optimization
+            'compression': ['zstandard', 'lz4'],  # .dpk codecs other than gzip
+        },
 
        # If there are data files included in your packages that need to be
         # installed, specify them here.  If using Python 2.6 or less, then these